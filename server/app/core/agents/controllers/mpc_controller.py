@@ -1,8 +1,8 @@
 import pandas as pd
 from v0.agents.MPC import best_MPC_action
-from v0.utils import house_solar_gain
 
 from app.core.agents.controllers.controller import Controller
+from app.utils.utils import compute_solar_gain
 
 global_mpc_memory = [None, None]
 
@@ -52,7 +52,7 @@ class MPCController(Controller):
             rolling_horizon = self.rolling_horizon
             if self.solar_gain:
                 solar_gain = [
-                    house_solar_gain(
+                    compute_solar_gain(
                         df["datetime"][0], self.window_area, self.shading_coeff
                     )
                 ] * rolling_horizon
@@ -0,0 +1,365 @@
+from copy import deepcopy
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.environment.cluster.vectorized_cluster import VectorizedCluster
+from app.core.environment.environment import draw_od_temp, draw_start_date
+from app.core.environment.environment_properties import (
+    BUILDING_OBS_KEYS,
+    ENV_OBS_KEYS,
+    EnvironmentProperties,
+)
+from app.core.environment.episode_planner import EpisodePlanner
+from app.core.environment.power_grid.interpolation import (
+    BuildingTables,
+    PowerInterpolator,
+    sample_interp_houses,
+)
+from app.core.environment.power_grid.power_grid import (
+    compute_grid_signal,
+    draw_artificial_ratio,
+)
+from app.core.environment.power_grid.signal_calculator import SignalCalculator
+from app.core.environment.power_grid.surrogate import SurrogatePowerInterpolator
+from app.core.environment.random_streams import (
+    RandomStreams,
+    resolve_seed,
+    spawn_streams,
+)
+from app.core.environment.rewards_calculator import RewardsCalculator
+
+
+class BatchedEnvironment:
+    """
+    Several independent copies (replicas) of the Environment, stepped together.
+
+    The K clusters are stacked along the leading axis of a single VectorizedCluster, so that every building of
+    every replica is advanced in one vectorized call. Each replica has its own start date, noise, outdoors
+    temperature, regulation signal and episode counter, and is reset on its own when its episode is done.
+    The API mirrors Environment.reset/step, with arrays of shape (nb_replicas, nb_agents) instead of
+    dictionnaries. Messages between agents are not part of the observations. The replica replica_id draws from the
+    random streams of the environment first_env_id + replica_id, so it follows the same trajectory as
+    Environment(env_props, first_env_id + replica_id).
+
+    Attributes:
+        init_props (EnvironmentProperties): The initial properties of the environments.
+        nb_replicas (int): The number of replicas.
+        nb_agents (int): The number of buildings in each replica.
+        episode_length (Optional[int]): Number of time steps after which a replica is done and reset, None to never reset.
+        seed (int): The root seed of the random streams, init_props.seed or the seed drawn when it is None (see resolve_seed).
+        streams (List[RandomStreams]): The random streams of each replica.
+        cluster (VectorizedCluster): The stacked clusters of buildings.
+        date_times (List[datetime]): The current date and time of each replica.
+        current_od_temp (np.ndarray): The current outdoor temperature of each replica.
+        base_power (np.ndarray): The base power of each replica's power grid.
+        current_signal (np.ndarray): The current regulation signal of each replica's power grid.
+        artificial_ratio (np.ndarray): The artificial signal ratio of each replica's power grid, multiplied by a new random factor at each reset of the replica, as PowerGrid.reset.
+        time_since_last_interp (np.ndarray): Seconds since the base power of each replica was interpolated.
+        power_interpolator (BasePowerInterpolator): Interpolator of the base power, in interpolation and surrogate modes.
+        building_tables (List[BuildingTables]): Reduced interpolation tables of the buildings of each replica, in interpolation mode.
+        signal_calculators (List[SignalCalculator]): The signal calculator of each replica.
+        planners (List[Optional[EpisodePlanner]]): The episode planner of each replica, when init_props.plan_horizon is positive.
+        elapsed_steps (np.ndarray): The number of time steps since the last reset of each replica.
+        rewards_calculator (RewardsCalculator): An object representing the rewards calculator.
+    """
+
+    def __init__(
+        self,
+        env_props: EnvironmentProperties,
+        nb_replicas: int,
+        episode_length: Optional[int] = None,
+        first_env_id: int = 0,
+    ) -> None:
+        """
+        Initialize a new instance of the BatchedEnvironment class.
+
+        Parameters:
+            env_props: EnvironmentProperties, the properties shared by all the replicas.
+            nb_replicas: int, the number of replicas.
+            episode_length: Optional[int], number of time steps after which a replica is reset.
+            first_env_id: int, the environment id of the first replica, to split the environments of a seed between several BatchedEnvironment.
+        """
+        self.init_props = deepcopy(env_props)
+        base_power_props = self.init_props.power_grid_prop.base_power_props
+        if base_power_props.mode == "surrogate":
+            self.power_interpolator = SurrogatePowerInterpolator(
+                base_power_props, self.init_props.cluster_prop.house_prop
+            )
+        elif base_power_props.mode == "interpolation":
+            self.power_interpolator = PowerInterpolator(
+                base_power_props, self.init_props.cluster_prop.house_prop
+            )
+        elif base_power_props.mode != "constant":
+            raise ValueError(
+                "Unknown base power mode: {}".format(base_power_props.mode)
+            )
+        self.nb_replicas = nb_replicas
+        self.nb_agents = self.init_props.cluster_prop.nb_agents
+        self.episode_length = episode_length
+        self.seed = resolve_seed(self.init_props.seed)
+        self.streams: List[RandomStreams] = spawn_streams(
+            self.seed, range(first_env_id, first_env_id + nb_replicas)
+        )
+        self.cluster = VectorizedCluster(
+            self.init_props.cluster_prop,
+            nb_replicas,
+            self.streams,
+            self.init_props.time_step,
+        )
+        self.rewards_calculator = RewardsCalculator(
+            self.init_props.reward_prop, self.init_props.cluster_prop.house_prop
+        )
+        # Kept across resets, as the properties of the PowerGrid
+        self.artificial_ratio = np.full(
+            nb_replicas, self.init_props.power_grid_prop.artificial_ratio
+        )
+        self.reset()
+
+    def reset(self) -> Dict[str, np.ndarray]:
+        """
+        Reset every replica.
+
+        Returns:
+            obs: Dict[str, np.ndarray], the observations, each of shape (nb_replicas, nb_agents).
+        """
+        self.date_times = [self.init_props.start_datetime] * self.nb_replicas
+        self.current_od_temp = np.zeros(self.nb_replicas)
+        self.base_power = np.zeros(self.nb_replicas)
+        self.current_signal = np.zeros(self.nb_replicas)
+        self.signal_calculators: List[SignalCalculator] = [None] * self.nb_replicas
+        self.elapsed_steps = np.zeros(self.nb_replicas, dtype=int)
+        self.time_since_last_interp = np.zeros(self.nb_replicas, dtype=int)
+        self.building_tables: List[BuildingTables] = [None] * self.nb_replicas
+        self.planners: List[Optional[EpisodePlanner]] = [None] * self.nb_replicas
+        self.reset_replicas(range(self.nb_replicas))
+        return self.get_obs()
+
+    def reset_replicas(self, replica_ids: Sequence[int]) -> None:
+        """
+        Reset some of the replicas, following the same steps as Environment.reset.
+
+        Parameters:
+            replica_ids: Sequence[int], the replicas to reset.
+        """
+        replica_ids = list(replica_ids)
+        self.cluster.reset_buildings(replica_ids)
+        for replica_id in replica_ids:
+            self.date_times[replica_id] = draw_start_date(
+                self.init_props, self.streams[replica_id].date
+            )
+        self.cluster.apply_noise(replica_ids)
+        if self.init_props.plan_horizon > 0:
+            for replica_id in replica_ids:
+                self.planners[replica_id] = EpisodePlanner(
+                    self.init_props,
+                    self.date_times[replica_id],
+                    self.streams[replica_id].od_temp,
+                )
+        self.compute_od_temp(replica_ids)
+
+        power_grid_prop = self.init_props.power_grid_prop
+        for replica_id in replica_ids:
+            self.artificial_ratio[replica_id] = draw_artificial_ratio(
+                self.artificial_ratio[replica_id],
+                power_grid_prop.artificial_signal_ratio_range,
+                self.streams[replica_id].power_grid,
+            )
+            self.signal_calculators[replica_id] = SignalCalculator(
+                power_grid_prop.signal_properties,
+                self.nb_agents,
+                self.streams[replica_id].power_grid,
+            )
+            if self.planners[replica_id] is not None:
+                self.planners[replica_id].signal_calculator = self.signal_calculators[
+                    replica_id
+                ]
+        self.time_since_last_interp[replica_ids] = (
+            power_grid_prop.base_power_props.interp_update_period + 1
+        )
+        if power_grid_prop.base_power_props.mode == "interpolation":
+            cluster = self.cluster
+            for replica_id in replica_ids:
+                self.building_tables[replica_id] = self.power_interpolator.build_tables(
+                    cluster.Ua[replica_id],
+                    cluster.Cm[replica_id],
+                    cluster.Ca[replica_id],
+                    cluster.Hm[replica_id],
+                    cluster.cooling_capacity[replica_id],
+                )
+        self.power_grid_step(replica_ids)
+        self.elapsed_steps[replica_ids] = 0
+
+    def step(
+        self, actions: np.ndarray
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        """
+        Advance every replica by one time step. Replicas whose episode is done are reset.
+
+        Parameters:
+            actions: np.ndarray, boolean array of shape (nb_replicas, nb_agents).
+
+        Returns:
+            - obs: Dict[str, np.ndarray], the observations, each of shape (nb_replicas, nb_agents). For the replicas that are done, these are the observations after reset.
+            - rewards: np.ndarray, the rewards, of shape (nb_replicas, nb_agents).
+            - dones: np.ndarray, boolean array of shape (nb_replicas,), the replicas whose episode ended with this step.
+        """
+        # Step in time
+        time_step = self.init_props.time_step
+        self.date_times = [date_time + time_step for date_time in self.date_times]
+        # Cluster step
+        self.cluster.advance(
+            self.current_od_temp,
+            np.asarray(actions, dtype=bool),
+            self.date_times,
+            time_step,
+        )
+
+        # Compute outdoor temperature before power grid step
+        self.compute_od_temp()
+
+        # Compute reward with the old grid signal
+        rewards = self.rewards_calculator.compute_rewards_array(
+            self.cluster.indoor_temp,
+            self.cluster.target_temp,
+            self.cluster.deadband,
+            self.cluster.current_power_consumption,
+            self.current_signal,
+        )
+
+        # Power grid step
+        self.power_grid_step()
+
+        self.elapsed_steps += 1
+        if self.episode_length is None:
+            dones = np.zeros(self.nb_replicas, dtype=bool)
+        else:
+            dones = self.elapsed_steps >= self.episode_length
+        if np.any(dones):
+            self.reset_replicas(np.flatnonzero(dones))
+
+        return self.get_obs(), rewards, dones
+
+    def get_obs(self) -> Dict[str, np.ndarray]:
+        """
+        Return the current observations of every replica.
+
+        Returns:
+            obs: Dict[str, np.ndarray], the observations, each of shape (nb_replicas, nb_agents), with the same keys as EnvironmentObsDict (except datetime and message).
+        """
+        obs: Dict[str, np.ndarray] = {
+            key: getattr(self.cluster, key).copy() for key in BUILDING_OBS_KEYS
+        }
+        shape = (self.nb_replicas, self.nb_agents)
+        for key, values in zip(
+            ENV_OBS_KEYS,
+            (
+                self.cluster.current_power_consumption,
+                self.current_od_temp,
+                self.current_signal,
+            ),
+        ):
+            obs[key] = np.broadcast_to(values[:, np.newaxis], shape).copy()
+        return obs
+
+    def compute_od_temp(self, replica_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Compute the outdoors temperature of the replicas, with the model of Environment.compute_od_temp.
+
+        Parameters:
+            replica_ids: Optional[Sequence[int]], the replicas to update (all when None).
+        """
+        if replica_ids is None:
+            replica_ids = range(self.nb_replicas)
+        replica_ids = list(replica_ids)
+        if self.init_props.plan_horizon > 0:
+            self.current_od_temp[replica_ids] = [
+                self.planners[replica_id].get_od_temp(self.date_times[replica_id])
+                for replica_id in replica_ids
+            ]
+            return
+        self.current_od_temp[replica_ids] = [
+            draw_od_temp(
+                self.init_props.temp_prop,
+                self.date_times[replica_id],
+                self.streams[replica_id].od_temp,
+            )
+            for replica_id in replica_ids
+        ]
+
+    def power_grid_step(self, replica_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Compute the base power and the regulation signal of the replicas, as PowerGrid.step.
+
+        Parameters:
+            replica_ids: Optional[Sequence[int]], the replicas to update (all when None).
+        """
+        if replica_ids is None:
+            replica_ids = range(self.nb_replicas)
+        base_power_props = self.init_props.power_grid_prop.base_power_props
+        for replica_id in replica_ids:
+            if base_power_props.mode == "constant":
+                self.base_power[replica_id] = (
+                    base_power_props.avg_power_per_hvac * self.nb_agents
+                )
+            else:
+                self.time_since_last_interp[
+                    replica_id
+                ] += self.init_props.time_step.seconds
+                if (
+                    self.time_since_last_interp[replica_id]
+                    >= base_power_props.interp_update_period
+                ):
+                    self.base_power[replica_id] = self.interpolate_power(replica_id)
+                    self.time_since_last_interp[replica_id] = 0
+            self.current_signal[replica_id] = compute_grid_signal(
+                self.signal_calculators[replica_id],
+                self.planners[replica_id],
+                self.base_power[replica_id],
+                self.date_times[replica_id],
+                self.artificial_ratio[replica_id],
+                self.cluster.max_power[replica_id],
+            )
+
+    def interpolate_power(self, replica_id: int) -> float:
+        """
+        Interpolate the base power of a replica from a sample of its buildings, as PowerInterpolator.interpolate_power.
+
+        Parameters:
+            replica_id: int, the replica.
+
+        Returns:
+            base_power: float, the interpolated base power of the replica.
+        """
+        house_ids, multi_factor = sample_interp_houses(
+            self.nb_agents,
+            self.init_props.power_grid_prop.base_power_props.interp_nb_agents,
+            self.streams[replica_id].interpolation,
+        )
+        cluster = self.cluster
+        return self.power_interpolator.interpolate_sample(
+            self.date_times[replica_id],
+            self.current_od_temp[replica_id],
+            tuple(
+                getattr(cluster, key)[replica_id, house_ids]
+                for key in (
+                    "Ua",
+                    "Cm",
+                    "Ca",
+                    "Hm",
+                    "indoor_temp",
+                    "mass_temp",
+                    "target_temp",
+                    "cooling_capacity",
+                )
+            ),
+            self.building_tables[replica_id],
+            house_ids,
+            multi_factor,
+        )
+
+    @property
+    def date_time(self) -> List[datetime]:
+        """Alias of date_times, mirroring Environment.date_time."""
+        return self.date_times
@@ -0,0 +1,173 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+# Origin of the timestamps of the clock (naive, as the datetimes of the environment)
+EPOCH = datetime(1970, 1, 1)
+SECONDS_IN_DAY = 86400
+
+
+@dataclass(frozen=True)
+class CalendarFields:
+    """
+    Calendar fields of a time step, computed once from the integer clock and shared by every consumer of the step.
+
+    The fields named as the attributes of datetime (month, day, hour, minute, second) make the object usable in
+    place of a datetime by the functions which only read them, such as compute_solar_gain.
+
+    Attributes:
+        timestamp (int): Seconds since EPOCH.
+        year, month, day, hour, minute, second (int): As the attributes of datetime.
+        day_of_year (int): Day of the year, starting at 1 (as timetuple().tm_yday).
+        seconds_of_day (int): Seconds since midnight.
+        local_time_of_day (float): time.mktime(date_time.timetuple()) % 86400, the time of the Perlin signal.
+        sin_day, cos_day, sin_hr, cos_hr (float): Cyclic encodings of the day of the year and of the hour.
+    """
+
+    timestamp: int
+    year: int
+    month: int
+    day: int
+    hour: int
+    minute: int
+    second: int
+    day_of_year: int
+    seconds_of_day: int
+    local_time_of_day: float
+    sin_day: float
+    cos_day: float
+    sin_hr: float
+    cos_hr: float
+
+    def to_datetime(self) -> datetime:
+        """Return the datetime of the time step."""
+        return EPOCH + timedelta(seconds=self.timestamp)
+
+
+# A datetime, or the calendar fields of a time step of the integer clock
+DateTimeLike = Union[datetime, CalendarFields]
+
+
+def to_timestamp(date_time: datetime) -> int:
+    """Return the number of whole seconds between EPOCH and date_time."""
+    return (date_time - EPOCH) // timedelta(seconds=1)
+
+
+@lru_cache(maxsize=1024)
+def get_day_fields(day_number: int) -> Tuple[int, int, int, int]:
+    """
+    Compute the fields which only depend on the day, once per day.
+
+    Parameters:
+        day_number: int, days since EPOCH.
+
+    Returns:
+        (year, month, day, day_of_year)
+    """
+    midnight = EPOCH + timedelta(days=day_number)
+    return (
+        midnight.year,
+        midnight.month,
+        midnight.day,
+        midnight.timetuple().tm_yday,
+    )
+
+
+@lru_cache(maxsize=64)
+def get_calendar_fields(timestamp: int) -> CalendarFields:
+    """
+    Compute the calendar fields of a timestamp.
+
+    The local time of day is computed with time.mktime, as from the datetime, so that it follows the daylight saving
+    time changes of the local time zone.
+
+    Parameters:
+        timestamp: int, seconds since EPOCH.
+
+    Returns:
+        fields: CalendarFields, the calendar fields.
+    """
+    day_number, seconds_of_day = divmod(timestamp, SECONDS_IN_DAY)
+    year, month, day, day_of_year = get_day_fields(day_number)
+    hour, seconds_of_hour = divmod(seconds_of_day, 3600)
+    minute, second = divmod(seconds_of_hour, 60)
+    # The time tuple of datetime.timetuple: EPOCH is a Thursday (weekday 3), and the DST flag is unknown
+    weekday = (day_number + 3) % 7
+    local_time = time.mktime(
+        (year, month, day, hour, minute, second, weekday, day_of_year, -1)
+    )
+    return CalendarFields(
+        timestamp=timestamp,
+        year=year,
+        month=month,
+        day=day,
+        hour=hour,
+        minute=minute,
+        second=second,
+        day_of_year=day_of_year,
+        seconds_of_day=seconds_of_day,
+        local_time_of_day=local_time % SECONDS_IN_DAY,
+        sin_day=float(np.sin(day_of_year * 2 * np.pi / 365)),
+        cos_day=float(np.cos(day_of_year * 2 * np.pi / 365)),
+        sin_hr=float(np.sin(hour * 2 * np.pi / 24)),
+        cos_hr=float(np.cos(hour * 2 * np.pi / 24)),
+    )
+
+
+def calendar_fields(date_time: DateTimeLike) -> CalendarFields:
+    """Return the calendar fields of date_time, which can already be CalendarFields."""
+    if isinstance(date_time, CalendarFields):
+        return date_time
+    return get_calendar_fields(to_timestamp(date_time))
+
+
+class Clock:
+    """
+    Integer clock of an environment, in seconds since EPOCH.
+
+    The calendar fields are computed once per step, and the datetime is only built when asked for (by the UI and the
+    observation dictionnaries).
+
+    Attributes:
+        timestamp (int): The current time, in seconds since EPOCH.
+        time_step_seconds (int): The length of each time step, in seconds.
+        fields (CalendarFields): The calendar fields of the current time.
+    """
+
+    def __init__(self, start_date_time: datetime, time_step: timedelta) -> None:
+        """
+        Initialize the clock.
+
+        Parameters:
+            start_date_time: datetime, the start date and time (whole seconds).
+            time_step: timedelta, the length of each time step (whole seconds).
+        """
+        self.time_step_seconds = time_step // timedelta(seconds=1)
+        self.set(start_date_time)
+
+    def set(self, date_time: datetime) -> None:
+        """Set the clock to date_time."""
+        self.set_timestamp(to_timestamp(date_time))
+
+    def set_timestamp(self, timestamp: int) -> None:
+        """Set the clock to a timestamp, in seconds since EPOCH."""
+        self.timestamp = timestamp
+        self.fields = get_calendar_fields(timestamp)
+        self._date_time: Optional[datetime] = None
+
+    def advance(self) -> None:
+        """Advance the clock by one time step."""
+        self.timestamp += self.time_step_seconds
+        self.fields = get_calendar_fields(self.timestamp)
+        self._date_time = None
+
+    @property
+    def date_time(self) -> datetime:
+        """The current datetime, built at the first access of each step."""
+        if self._date_time is None:
+            self._date_time = self.fields.to_datetime()
+        return self._date_time
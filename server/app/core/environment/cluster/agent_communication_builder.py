@@ -1,5 +1,5 @@
-import random
 from copy import deepcopy
+from dataclasses import dataclass
 from typing import Dict, List
 
 import numpy as np
@@ -9,6 +9,98 @@ from app.core.environment.cluster.cluster_properties import (
 )
 
 
+@dataclass(frozen=True)
+class CommunicationGraph:
+    """
+    Communication graph in compressed sparse row (CSR) format: the agents sending a message to agent i are
+    indices[indptr[i]:indptr[i + 1]], in the order of the communication link list.
+
+    Attributes:
+        indptr: np.ndarray
+            Integer array of shape (nb_agents + 1,), offsets of the senders of each agent in indices.
+        indices: np.ndarray
+            Integer array of shape (nb_links,), ids of the senders.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @classmethod
+    def from_link_list(
+        cls, agent_communicators: Dict[int, List[int]], nb_agents: int
+    ) -> "CommunicationGraph":
+        """
+        Build the graph from a dictionary of communication links, as returned by AgentCommunicationBuilder.get_comm_link_list.
+
+        Parameters:
+            - agent_communicators: The ids of the agents sending a message to each agent. Missing agents receive no message.
+            - nb_agents: The number of agents.
+        """
+        senders = [
+            agent_communicators.get(agent_id, []) for agent_id in range(nb_agents)
+        ]
+        indptr = np.zeros(nb_agents + 1, dtype=int)
+        np.cumsum([len(ids) for ids in senders], out=indptr[1:])
+        indices = np.fromiter(
+            (sender for ids in senders for sender in ids), dtype=int, count=indptr[-1]
+        )
+        return cls(indptr=indptr, indices=indices)
+
+    @classmethod
+    def from_matrix(cls, senders: np.ndarray) -> "CommunicationGraph":
+        """
+        Build the graph from an integer array of shape (nb_agents, nb_messages), the senders of each agent.
+        """
+        nb_agents, nb_messages = senders.shape
+        return cls(
+            indptr=np.arange(nb_agents + 1) * nb_messages,
+            indices=senders.reshape(-1),
+        )
+
+    @property
+    def nb_agents(self) -> int:
+        """Number of agents in the graph."""
+        return len(self.indptr) - 1
+
+    def senders(self, agent_id: int) -> np.ndarray:
+        """Return the ids of the agents sending a message to agent_id."""
+        return self.indices[self.indptr[agent_id] : self.indptr[agent_id + 1]]
+
+    def to_matrix(self) -> np.ndarray:
+        """
+        Return the senders as an array of shape (nb_agents, nb_messages), when every agent receives the same number of messages.
+        """
+        degrees = np.diff(self.indptr)
+        if self.nb_agents and np.any(degrees != degrees[0]):
+            raise ValueError(
+                "Every agent must receive the same number of messages to build a sender matrix"
+            )
+        return self.indices.reshape(self.nb_agents, -1)
+
+    def gather_messages(self, columns: Dict[str, np.ndarray]) -> List[List[dict]]:
+        """
+        Build the messages received by each agent. The message of each sender is built once and gathered for every
+        receiver with a single fancy-index, then copied so that every receiver gets its own message dictionary.
+
+        Parameters:
+            - columns: The value of each message field for every sender, as arrays of shape (nb_agents,).
+
+        Returns:
+            For each agent, the list of message dictionaries it receives.
+        """
+        keys = list(columns.keys())
+        sender_messages = np.empty(self.nb_agents, dtype=object)
+        sender_messages[:] = [
+            dict(zip(keys, row))
+            for row in zip(*(values.tolist() for values in columns.values()))
+        ]
+        messages = [
+            message.copy() for message in sender_messages[self.indices].tolist()
+        ]
+        bounds = self.indptr.tolist()
+        return [messages[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
 class AgentCommunicationBuilder:
     """
     Builds a communication graph between agents. The communication graph determines the agents with whom a
@@ -30,6 +122,8 @@ class AgentCommunicationBuilder:
             The total number of agents.
         agent_ids: List[int]
             The list of IDs of all agents.
+        rng: np.random.Generator
+            The generator of the random links.
 
     """
 
@@ -37,6 +131,7 @@ class AgentCommunicationBuilder:
         self,
         agents_comm_props: AgentsCommunicationProperties,
         nb_agents: int,
+        rng: np.random.Generator,
     ) -> None:
         """
         Initialize an instance of the AgentCommunicationBuilder class.
@@ -44,6 +139,7 @@ class AgentCommunicationBuilder:
         Parameters:
             - agents_comm_props: An instance of the AgentsCommunicationProperties class which stores the properties of the communication between agents.
             - nb_agents: The number of agents in the simulation.
+            - rng: The generator of the random links (the communication stream of the environment).
         """
         self.agents_comm_props = agents_comm_props
         self.nb_comm = np.minimum(
@@ -52,6 +148,7 @@ class AgentCommunicationBuilder:
         )
         self.nb_agents = nb_agents
         self.agent_ids = list(range(nb_agents))
+        self.rng = rng
 
     def get_comm_link_list(self) -> Dict[int, List[int]]:
         """
@@ -60,6 +157,21 @@ class AgentCommunicationBuilder:
         mode = getattr(self, self.agents_comm_props.mode)
         return mode()
 
+    def get_comm_graph(self) -> CommunicationGraph:
+        """
+        Return the communication graph in CSR format. In random_sample mode, a new sample is drawn for every agent.
+        """
+        if self.agents_comm_props.mode == "random_sample":
+            if self.agents_comm_props.batched_sampling:
+                return CommunicationGraph.from_matrix(self.get_random_sample_matrix())
+            agent_communicators = {
+                agent_id: self.get_random_sample(agent_id)
+                for agent_id in self.agent_ids
+            }
+        else:
+            agent_communicators = self.get_comm_link_list()
+        return CommunicationGraph.from_link_list(agent_communicators, self.nb_agents)
+
     def neighbours(self) -> Dict[int, List[int]]:
         """
         Get the neighbours of each agent in a circular fashion,
@@ -200,4 +312,36 @@ class AgentCommunicationBuilder:
         """
         possible_ids = deepcopy(self.agent_ids)
         possible_ids.remove(agent_id)
-        return random.sample(possible_ids, k=self.nb_comm)
+        return self.rng.choice(possible_ids, self.nb_comm, replace=False).tolist()
+
+    def get_random_sample_matrix(self) -> np.ndarray:
+        """
+        Draw the random samples of every agent at once: `nb_comm` distinct agent IDs per agent, excluding the agent
+        itself.
+
+        Returns:
+            np.ndarray: An integer array of shape (nb_agents, nb_comm), the IDs selected for each agent.
+        """
+        nb_comm = int(self.nb_comm)
+        nb_candidates = self.nb_agents - 1
+        if 2 * nb_comm > nb_candidates:
+            # Dense case: first nb_comm entries of a random permutation of the other agents
+            samples = np.argsort(
+                self.rng.random((self.nb_agents, nb_candidates)), axis=1
+            )[:, :nb_comm]
+        else:
+            # Sparse case: draw with replacement and redraw the rows containing duplicates
+            samples = self.rng.integers(nb_candidates, size=(self.nb_agents, nb_comm))
+            rows = np.arange(self.nb_agents)
+            while len(rows):
+                sorted_samples = np.sort(samples[rows], axis=1)
+                duplicates = np.any(
+                    sorted_samples[:, 1:] == sorted_samples[:, :-1], axis=1
+                )
+                rows = rows[duplicates]
+                samples[rows] = self.rng.integers(
+                    nb_candidates, size=(len(rows), nb_comm)
+                )
+        # Skip the agent itself: candidates are numbered among the other agents
+        agent_ids = np.arange(self.nb_agents)[:, np.newaxis]
+        return samples + (samples >= agent_ids)
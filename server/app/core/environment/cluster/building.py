@@ -1,18 +1,31 @@
-import random
 from copy import deepcopy
-from datetime import datetime, timedelta
-
-import numpy as np
+from datetime import timedelta
+from typing import Optional, Tuple
 
+from app.core.environment.clock import DateTimeLike
 from app.core.environment.cluster.hvac import HVAC
+from app.core.environment.cluster.thermal_coefficients import (
+    ThermalCoefficients,
+    get_scalar_thermal_coefficients,
+)
 from app.core.environment.environment_properties import (
-    BuildingMessage,
     BuildingProperties,
     EnvironmentObsDict,
 )
 from app.core.environment.simulatable import Simulatable
 from app.utils.utils import compute_solar_gain
 
+# Properties of the building modified by the noise of the cluster (see Cluster.apply_noise)
+NOISY_PROPS: Tuple[str, ...] = (
+    "init_air_temp",
+    "init_mass_temp",
+    "target_temp",
+    "Ua",
+    "Ca",
+    "Cm",
+    "Hm",
+)
+
 
 class Building(Simulatable):
     """
@@ -25,6 +38,9 @@ class Building(Simulatable):
         hvac (HVAC): HVAC object.
         max_consumption (float): Maximum power consumption of the HVAC system in Watts.
         current_solar_gain (float): Current solar gain of the building in Watts.
+        time_step (Optional[timedelta]): Time step of the environment, None when unknown.
+        thermal_coeffs (Optional[ThermalCoefficients]): Cached coefficients of the thermal model, built by reset and Cluster.set_params when the time step is known, else at the first step.
+        static_obs (EnvironmentObsDict): The part of the observation which is constant during an episode (BUILDING_STATIC_OBS_KEYS), updated by reset and Cluster.set_params.
     """
 
     init_props: BuildingProperties
@@ -33,17 +49,26 @@ class Building(Simulatable):
     hvac: HVAC
     max_consumption: float
     current_solar_gain: float
-
-    def __init__(self, building_props: BuildingProperties) -> None:
+    time_step: Optional[timedelta]
+    thermal_coeffs: Optional[ThermalCoefficients]
+    static_obs: EnvironmentObsDict
+
+    def __init__(
+        self,
+        building_props: BuildingProperties,
+        time_step: Optional[timedelta] = None,
+    ) -> None:
         """
         Constructor for the Building class.
 
         Parameters:
             building_props: A BuildingProperties object that contains the properties of the building.
+            time_step: Optional[timedelta], time step of the environment, used to build the thermal coefficients.
         Returns:
             None
         """
         self.init_props = deepcopy(building_props)
+        self.time_step = time_step
         self.reset()
 
     def reset(self) -> EnvironmentObsDict:
@@ -54,14 +79,37 @@ class Building(Simulatable):
             An EnvironmentObsDict object that contains the state of the building.
         """
         self.hvac = HVAC(self.init_props.hvac_prop)
+        self.reset_state()
+        return self.get_obs()
+
+    def recycle(self, building_props: BuildingProperties) -> None:
+        """
+        Reset the building for a new episode without constructing new objects: the properties modified by
+        Cluster.apply_noise are set back to their values in building_props, in place, and the HVAC is recycled.
+
+        Parameters:
+            building_props: BuildingProperties, the properties before noise (the ones given to the constructor).
+        """
+        for name in NOISY_PROPS:
+            setattr(self.init_props, name, getattr(building_props, name))
+        self.hvac.recycle(building_props.hvac_prop)
+        self.reset_state()
+
+    def reset_state(self) -> None:
+        """Set the state of the building to its initial values, with the current HVAC and properties."""
         self.max_consumption = self.hvac.init_props.max_consumption
         self.current_solar_gain = 0.0
         self.current_mass_temp = self.init_props.init_mass_temp
         self.indoor_temp = self.init_props.init_air_temp
-        return self.get_obs()
+        self.build_thermal_coefficients()
+        self.static_obs = self.get_static_obs()
 
     def step(
-        self, od_temp: float, time_step: timedelta, date_time: datetime, action: bool
+        self,
+        od_temp: float,
+        time_step: timedelta,
+        date_time: DateTimeLike,
+        action: bool,
     ) -> None:
         """Take a time step for the building.
 
@@ -71,9 +119,9 @@ class Building(Simulatable):
         self
         od_temp: float, current outdoors temperature in Celsius
         time_step: timedelta, time step duration
-        date_time: datetime, current date and time
+        date_time: DateTimeLike, current date and time
         """
-        self.hvac.step(action, time_step)
+        self.hvac.advance(action, time_step)
         self.update_temperature(od_temp, time_step, date_time)
 
     def get_obs(self) -> EnvironmentObsDict:
@@ -83,7 +131,25 @@ class Building(Simulatable):
         Returns:
             An EnvironmentObsDict object that contains the current observation of the building.
         """
-        state_dict: EnvironmentObsDict = self.hvac.get_obs()
+        state_dict: EnvironmentObsDict = self.hvac.get_dynamic_obs()
+        state_dict.update(self.static_obs)
+        state_dict.update(
+            {
+                "indoor_temp": self.indoor_temp,
+                "mass_temp": self.current_mass_temp,
+                "solar_gain": self.current_solar_gain,
+            }
+        )
+        return state_dict
+
+    def get_static_obs(self) -> EnvironmentObsDict:
+        """
+        Generate the part of the building observation which is constant during an episode.
+
+        Returns:
+            An EnvironmentObsDict object with the fields of BUILDING_STATIC_OBS_KEYS.
+        """
+        state_dict: EnvironmentObsDict = self.hvac.get_static_obs()
         state_dict.update(
             {
                 "target_temp": self.init_props.target_temp,
@@ -92,54 +158,29 @@ class Building(Simulatable):
                 "Ca": self.init_props.Ca,
                 "Cm": self.init_props.Cm,
                 "Hm": self.init_props.Hm,
-                "indoor_temp": self.indoor_temp,
-                "mass_temp": self.current_mass_temp,
-                "solar_gain": self.current_solar_gain,
             }
         )
         return state_dict
 
-    def message(self, thermal_message: bool, hvac_message: bool) -> BuildingMessage:
+    def get_dynamic_obs_values(self) -> Tuple[float, ...]:
         """
-        Message sent by the building to other agents.
-
-        Parameters:
-            thermal_message: A boolean indicating whether to include thermal properties in the message.
-            hvac_message: A boolean indicating whether to include HVAC properties in the message.
+        Return the part of the observation of the building which changes at each step, as a tuple.
 
         Returns:
-            A BuildingMessage object that contains the message to be sent by the building.
+            The values of the fields of BUILDING_DYNAMIC_OBS_KEYS, in the same order.
         """
-        message: BuildingMessage = {
-            "seconds_since_off": self.hvac.seconds_since_off,
-            "curr_consumption": self.hvac.get_power_consumption(),
-            "max_consumption": self.hvac.init_props.max_consumption,
-            "lockout_duration": self.hvac.init_props.lockout_duration,
-            "current_temp_diff_to_target": self.indoor_temp
-            - self.init_props.target_temp,
-        }
-
-        if hvac_message:
-            message.update(
-                {
-                    "cop": self.hvac.init_props.cop,
-                    "latent_cooling_fraction": self.hvac.init_props.latent_cooling_fraction,
-                    "cooling_capacity": self.hvac.init_props.cooling_capacity,
-                }
-            )
-        if thermal_message:
-            message.update(
-                {
-                    "Ca": self.init_props.Ca,
-                    "Ua": self.init_props.Ua,
-                    "Cm": self.init_props.Cm,
-                    "Hm": self.init_props.Hm,
-                }
-            )
-        return message
+        hvac = self.hvac
+        return (
+            hvac.turned_on,
+            hvac.seconds_since_off,
+            hvac.lockout,
+            self.indoor_temp,
+            self.current_mass_temp,
+            self.current_solar_gain,
+        )
 
     def update_temperature(
-        self, od_temp: float, time_step: timedelta, date_time: datetime
+        self, od_temp: float, time_step: timedelta, date_time: DateTimeLike
     ) -> None:
         """
         Update the temperature of the house.
@@ -149,20 +190,14 @@ class Building(Simulatable):
         self
         od_temp: float, current outdoors temperature in Celsius
         time_step: timedelta, time step duration
-        date_time: datetime, current date and time
+        date_time: DateTimeLike, current date and time
 
 
         ---
         Model taken from http://gridlab-d.shoutwiki.com/wiki/Residential_module_user's_guide
         """
-        # TODO: Make it prettier
-        time_step_sec = time_step.seconds
-        Hm, Ca, Ua, Cm = (
-            self.init_props.Hm,
-            self.init_props.Ca,
-            self.init_props.Ua,
-            self.init_props.Cm,
-        )
+        coeffs = self.get_thermal_coefficients(time_step)
+        Hm, Ca, Ua = coeffs.Hm, coeffs.Ca, coeffs.Ua
 
         # Convert Celsius temperatures in Kelvin
         od_temp_K = od_temp + 273
@@ -185,16 +220,11 @@ class Building(Simulatable):
         # Heat from inside devices (oven, windows, etc)
         Qm = 0
 
-        # Variables and time constants
-        a = Cm * Ca / Hm
-        b = Cm * (Ua + Hm) / Hm + Ca
+        # Variables
         c = Ua
         d = Qm + Qa + Ua * od_temp_K
         g = Qm / Hm
 
-        r1 = (-b + np.sqrt(b**2 - 4 * a * c)) / (2 * a)
-        r2 = (-b - np.sqrt(b**2 - 4 * a * c)) / (2 * a)
-
         dTA0dt = (
             Hm * current_mass_temp_K / Ca
             - (Ua + Hm) * current_temp_K / Ca
@@ -202,69 +232,56 @@ class Building(Simulatable):
             + Qa / Ca
         )
 
-        A1 = (r2 * current_temp_K - dTA0dt - r2 * d / c) / (r2 - r1)
+        A1 = (coeffs.r2 * current_temp_K - dTA0dt - coeffs.r2 * d / c) / (
+            coeffs.r2 - coeffs.r1
+        )
         A2 = current_temp_K - d / c - A1
-        A3 = r1 * Ca / Hm + (Ua + Hm) / Hm
-        A4 = r2 * Ca / Hm + (Ua + Hm) / Hm
 
         # Updating the temperature
-        new_current_temp_k = (
-            A1 * np.exp(r1 * time_step_sec) + A2 * np.exp(r2 * time_step_sec) + d / c
-        )
+        new_current_temp_k = A1 * coeffs.exp_r1 + A2 * coeffs.exp_r2 + d / c
         new_current_mass_temp_k = (
-            A1 * A3 * np.exp(r1 * time_step_sec)
-            + A2 * A4 * np.exp(r2 * time_step_sec)
-            + g
-            + d / c
+            A1 * coeffs.A3 * coeffs.exp_r1 + A2 * coeffs.A4 * coeffs.exp_r2 + g + d / c
         )
 
         self.indoor_temp = new_current_temp_k - 273
         self.current_mass_temp = new_current_mass_temp_k - 273
 
-    def apply_noise(self) -> None:
-        """Applies noise to the initial building properties gave in config."""
-        # TODO: make this prettier
-        # Gaussian noise: target temp
-        self.init_props.init_air_temp += abs(
-            random.gauss(0, self.init_props.noise_prop.std_start_temp)
+    def build_thermal_coefficients(self) -> None:
+        """Compute the cached thermal coefficients from the current properties, or drop them if the time step is unknown."""
+        if self.time_step is None:
+            self.thermal_coeffs = None
+            return
+        self.thermal_coeffs = get_scalar_thermal_coefficients(
+            self.init_props.Ua,
+            self.init_props.Ca,
+            self.init_props.Cm,
+            self.init_props.Hm,
+            self.time_step.seconds,
         )
 
-        self.init_props.init_mass_temp += abs(
-            random.gauss(0, self.init_props.noise_prop.std_start_temp)
-        )
-        self.init_props.target_temp += abs(
-            random.gauss(0, self.init_props.noise_prop.std_target_temp)
-        )
+    def get_thermal_coefficients(self, time_step: timedelta) -> ThermalCoefficients:
+        """
+        Return the cached coefficients of the thermal model, computing them again if the thermal properties or the time step changed.
+
+        Parameters:
+            time_step: timedelta, time step duration
 
-        # Factor noise: house wall conductance, house thermal mass, air thermal mass, house mass surface conductance
-        factor_ua = random.triangular(
-            self.init_props.noise_prop.factor_thermo_low,
-            self.init_props.noise_prop.factor_thermo_high,
-            1,
-        )  # low, high, mode ->  low <= N <= high, with max prob at mode.
-        self.init_props.Ua = factor_ua
-
-        factor_cm = random.triangular(
-            self.init_props.noise_prop.factor_thermo_low,
-            self.init_props.noise_prop.factor_thermo_high,
-            1,
-        )  # low, high, mode ->  low <= N <= high, with max prob at mode.
-        self.init_props.Cm *= factor_cm
-
-        factor_ha = random.triangular(
-            self.init_props.noise_prop.factor_thermo_low,
-            self.init_props.noise_prop.factor_thermo_high,
-            1,
-        )  # low, high, mode ->  low <= N <= high, with max prob at mode.
-        self.init_props.Ca *= factor_ha
-
-        factor_hm = random.triangular(
-            self.init_props.noise_prop.factor_thermo_low,
-            self.init_props.noise_prop.factor_thermo_high,
-            1,
-        )  # low, high, mode ->  low <= N <= high, with max prob at mode.
-        self.init_props.Hm *= factor_hm
-        self.hvac.apply_noise()
+        Returns:
+            The ThermalCoefficients of the building.
+        """
+        Ua, Ca, Cm, Hm = (
+            self.init_props.Ua,
+            self.init_props.Ca,
+            self.init_props.Cm,
+            self.init_props.Hm,
+        )
+        if self.thermal_coeffs is None or not self.thermal_coeffs.matches(
+            Ua, Ca, Cm, Hm, time_step.seconds
+        ):
+            self.thermal_coeffs = get_scalar_thermal_coefficients(
+                Ua, Ca, Cm, Hm, time_step.seconds
+            )
+        return self.thermal_coeffs
 
     def get_power_consumption(self) -> float:
         """Return current power consumption of Building."""
@@ -1,18 +1,78 @@
 from copy import deepcopy
-from datetime import datetime, timedelta
-from typing import Dict, List
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
+
+from app.core.environment.clock import DateTimeLike
 from app.core.environment.cluster.agent_communication_builder import (
     AgentCommunicationBuilder,
+    CommunicationGraph,
 )
-from app.core.environment.cluster.building import Building
+from app.core.environment.cluster.building import NOISY_PROPS, Building
+from app.core.environment.cluster.cluster_properties import MessageProperties
+from app.core.environment.cluster.noise import apply_batched_noise
+from app.core.environment.cluster.thermal_coefficients import ThermalCoefficients
 from app.core.environment.environment_properties import (
+    BUILDING_DYNAMIC_OBS_KEYS,
+    BUILDING_STATIC_OBS_KEYS,
+    OBS_COLUMNS,
     BuildingMessage,
     ClusterPropreties,
     EnvironmentObsDict,
 )
+from app.core.environment.random_streams import (
+    RandomStreams,
+    resolve_seed,
+    spawn_streams,
+)
 from app.core.environment.simulatable import Simulatable
 
+# Columns of the observation arrays written once per episode, and at each step
+STATIC_OBS_COLUMNS: List[int] = [OBS_COLUMNS[key] for key in BUILDING_STATIC_OBS_KEYS]
+DYNAMIC_OBS_COLUMNS: List[int] = [OBS_COLUMNS[key] for key in BUILDING_DYNAMIC_OBS_KEYS]
+# Properties of the buildings and of their HVAC drawn by apply_noise, exported by get_params
+PARAM_KEYS: Tuple[str, ...] = NOISY_PROPS + ("cooling_capacity",)
+# Properties of the buildings and of their HVAC read by compute_message_columns
+BUILDING_MESSAGE_KEYS: Tuple[str, ...] = ("target_temp", "Ua", "Ca", "Cm", "Hm")
+HVAC_MESSAGE_KEYS: Tuple[str, ...] = (
+    "cop",
+    "cooling_capacity",
+    "latent_cooling_fraction",
+    "lockout_duration",
+)
+
+
+def compute_message_columns(
+    message_prop: MessageProperties, state: Dict[str, np.ndarray]
+) -> Dict[str, np.ndarray]:
+    """
+    Message sent by each building, as one array per message field.
+
+    Parameters:
+        message_prop: MessageProperties, whether the messages include the thermal and HVAC properties.
+        state: Dict[str, np.ndarray], one array per building field (seconds_since_off, turned_on, indoor_temp,
+            target_temp, lockout_duration, cop, cooling_capacity, latent_cooling_fraction, Ua, Ca, Cm, Hm).
+
+    Returns:
+        The arrays of the fields of BuildingMessage, in the order of the messages.
+    """
+    max_consumption = state["cooling_capacity"] / state["cop"]
+    columns = {
+        "seconds_since_off": state["seconds_since_off"],
+        "curr_consumption": np.where(state["turned_on"], max_consumption, 0.0),
+        "max_consumption": max_consumption,
+        "lockout_duration": state["lockout_duration"],
+        "current_temp_diff_to_target": state["indoor_temp"] - state["target_temp"],
+    }
+    if message_prop.hvac:
+        for key in ("cop", "latent_cooling_fraction", "cooling_capacity"):
+            columns[key] = state[key]
+    if message_prop.thermal:
+        for key in ("Ca", "Ua", "Cm", "Hm"):
+            columns[key] = state[key]
+    return columns
+
 
 class Cluster(Simulatable):
     """
@@ -29,10 +89,14 @@ class Cluster(Simulatable):
             A list of buildings in the cluster.
         agent_communicators : Dict[int, List[int]]
             A dictionary representing the communication links between agents.
-        id_houses_messages : List[int]
-            A list of ids of the houses for which messages will be sent.
         communication_builder : AgentCommunicationBuilder
             An object used for building communication links between agents.
+        comm_graph : CommunicationGraph
+            The communication links between agents in CSR format.
+        time_step : Optional[timedelta]
+            The time step of the environment, given to the buildings to build their thermal coefficients.
+        streams : RandomStreams
+            The random streams of the environment, whose noise and communication generators are used by the cluster.
     """
 
     init_props: ClusterPropreties
@@ -40,12 +104,29 @@ class Cluster(Simulatable):
     max_power: float
     buildings: List[Building]
     agent_communicators: Dict[int, List[int]]
-    id_houses_messages: List[int]
     communication_builder: AgentCommunicationBuilder
+    comm_graph: CommunicationGraph
+    time_step: Optional[timedelta]
+    streams: RandomStreams
+
+    def __init__(
+        self,
+        cluster_props: ClusterPropreties,
+        streams: Optional[RandomStreams] = None,
+        time_step: Optional[timedelta] = None,
+    ) -> None:
+        """Initialize Cluster.
 
-    def __init__(self, cluster_props: ClusterPropreties) -> None:
-        """Initialize Cluster."""
+        Parameters:
+            cluster_props: ClusterPropreties, properties of the cluster.
+            streams: Optional[RandomStreams], the random streams of the environment, spawned from a root seed drawn from the random module when None (see resolve_seed).
+            time_step: Optional[timedelta], time step of the environment, used to build the thermal coefficients of the buildings.
+        """
         self.init_props = deepcopy(cluster_props)
+        self.time_step = time_step
+        if streams is None:
+            streams = spawn_streams(resolve_seed(None), [0])[0]
+        self.streams = streams
         self.reset()
 
     def reset(self) -> List[EnvironmentObsDict]:
@@ -53,74 +134,228 @@ class Cluster(Simulatable):
 
         Returns: A dictionnary containing the state of the cluster
         """
-        self.max_power = 0.0
-        self.current_power_consumption = 0.0
-        self.id_houses_messages: List[int] = []
         self.buildings = [
-            Building(self.init_props.house_prop)
+            Building(self.init_props.house_prop, self.time_step)
             for _ in range(self.init_props.nb_agents)
         ]
+        self.start_episode()
+        return self.get_obs()
+
+    def recycle(self) -> None:
+        """
+        Reset the cluster for a new episode, recycling the buildings instead of constructing new ones (see
+        Building.recycle). The communication links are only drawn again in random_fixed mode, as the other modes
+        always give the same links.
+        """
+        for building in self.buildings:
+            building.recycle(self.init_props.house_prop)
+        self.start_episode(
+            new_links=self.init_props.agents_comm_prop.mode == "random_fixed"
+        )
+
+    def start_episode(self, new_links: bool = True) -> None:
+        """
+        Compute the power of the buildings of a new episode, and draw their communication links.
+
+        Parameters:
+            new_links: bool, whether to build the communication links again.
+        """
+        self.max_power = 0.0
+        self.current_power_consumption = 0.0
         for building in self.buildings:
             self.current_power_consumption += building.get_power_consumption()
             self.max_power += building.max_consumption
+        if not new_links:
+            return
         self.communication_builder = AgentCommunicationBuilder(
             agents_comm_props=self.init_props.agents_comm_prop,
             nb_agents=self.init_props.nb_agents,
+            rng=self.streams.communication,
         )
         self.agent_communicators = self.communication_builder.get_comm_link_list()
-        return self.get_obs()
+        self.comm_graph = CommunicationGraph.from_link_list(
+            self.agent_communicators, self.init_props.nb_agents
+        )
 
     def step(
         self,
         od_temp: float,
         action_dict: Dict[int, bool],
-        date_time: datetime,
+        date_time: DateTimeLike,
         time_step: timedelta,
     ) -> List[EnvironmentObsDict]:
         """Take a step in time for the cluster given the list of actions of the TCL agent."""
+        actions = [
+            action_dict[building_id] if building_id in action_dict.keys() else False
+            for building_id in range(len(self.buildings))
+        ]
+        self.advance(od_temp, actions, date_time, time_step)
+        return self.get_obs()
+
+    def advance(
+        self,
+        od_temp: float,
+        actions: Sequence[bool],
+        date_time: DateTimeLike,
+        time_step: timedelta,
+    ) -> None:
+        """Update the buildings for one time step given one action per building, without building the observations."""
         self.current_power_consumption = 0.0
-        for building_id, building in enumerate(self.buildings):
-            if building_id in action_dict.keys():
-                command = action_dict[building_id]
-            else:
-                command = False
+        for building, command in zip(self.buildings, actions):
             building.step(od_temp, time_step, date_time, command)
             self.current_power_consumption += building.get_power_consumption()
-        return self.get_obs()
 
-    def message(self, building_id: int) -> List[BuildingMessage]:
-        """List of messages sent from the other agents to the building with building_id index.
-
-        If the communication mode chosen in config is random_sample,
-        """
+    def get_comm_graph(self) -> CommunicationGraph:
+        """Communication graph of the current time step (a new sample is drawn in random_sample mode)."""
         if self.init_props.agents_comm_prop.mode == "random_sample":
-            self.id_houses_messages = self.communication_builder.get_random_sample(
-                building_id
-            )
-        else:
-            self.id_houses_messages = self.agent_communicators[building_id]
-
-        message: List[BuildingMessage] = []
-        for id_house_message in self.id_houses_messages:
-            message.append(
-                self.buildings[id_house_message].message(
-                    self.init_props.message_prop.thermal,
-                    self.init_props.message_prop.hvac,
-                )
+            return self.communication_builder.get_comm_graph()
+        return self.comm_graph
+
+    def get_message_columns(self) -> Dict[str, np.ndarray]:
+        """Message sent by each building, as one array of shape (nb_agents,) per message field."""
+        hvacs = [building.hvac for building in self.buildings]
+        state = {
+            key: np.array(
+                [getattr(building.init_props, key) for building in self.buildings]
             )
-        return message
+            for key in BUILDING_MESSAGE_KEYS
+        }
+        for key in HVAC_MESSAGE_KEYS:
+            state[key] = np.array([getattr(hvac.init_props, key) for hvac in hvacs])
+        state["seconds_since_off"] = np.array(
+            [hvac.seconds_since_off for hvac in hvacs], dtype=int
+        )
+        state["turned_on"] = np.array([hvac.turned_on for hvac in hvacs], dtype=bool)
+        state["indoor_temp"] = np.array(
+            [building.indoor_temp for building in self.buildings], dtype=float
+        )
+        return compute_message_columns(self.init_props.message_prop, state)
+
+    def get_messages(self) -> List[List[BuildingMessage]]:
+        """Lists of messages received by every building, gathered along the communication graph."""
+        return self.get_comm_graph().gather_messages(self.get_message_columns())
 
     def get_obs(self) -> List[EnvironmentObsDict]:
         """Generate cluster observation dictionnary."""
         state_dict: List[EnvironmentObsDict] = []
-        for building_id, building in enumerate(self.buildings):
+        for building, messages in zip(self.buildings, self.get_messages()):
             building_obs = building.get_obs()
             building_obs["cluster_hvac_power"] = self.current_power_consumption
-            building_obs["message"] = self.message(building_id)
+            building_obs["message"] = messages
             state_dict.append(building_obs)
         return state_dict
 
+    def get_obs_array(self, out: np.ndarray, static: bool = True) -> np.ndarray:
+        """
+        Write the observations of the buildings in an array, without building dictionnaries or messages.
+
+        Parameters:
+            out: np.ndarray, array of shape (nb_agents, D) whose columns are given by OBS_COLUMNS. Only the building columns and cluster_hvac_power are written.
+            static: bool, whether to write the columns which are constant during an episode (BUILDING_STATIC_OBS_KEYS). When False, only the columns of BUILDING_DYNAMIC_OBS_KEYS and cluster_hvac_power are written.
+
+        Returns:
+            The out array.
+        """
+        if static:
+            out[:, STATIC_OBS_COLUMNS] = [
+                list(building.static_obs.values()) for building in self.buildings
+            ]
+        out[:, DYNAMIC_OBS_COLUMNS] = [
+            building.get_dynamic_obs_values() for building in self.buildings
+        ]
+        out[:, OBS_COLUMNS["cluster_hvac_power"]] = self.current_power_consumption
+        return out
+
+    def get_state(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Export the state of the buildings which changes during an episode.
+
+        Returns:
+            - building_state: np.ndarray, of shape (nb_agents, 3), the indoor temperature, mass temperature and solar gain of each building.
+            - hvac_state: np.ndarray, integer array of shape (nb_agents, 3), the turned_on, seconds_since_off and lockout fields of each HVAC.
+        """
+        building_state = np.array(
+            [
+                (
+                    building.indoor_temp,
+                    building.current_mass_temp,
+                    building.current_solar_gain,
+                )
+                for building in self.buildings
+            ]
+        )
+        hvac_state = np.array(
+            [
+                (
+                    building.hvac.turned_on,
+                    building.hvac.seconds_since_off,
+                    building.hvac.lockout,
+                )
+                for building in self.buildings
+            ],
+            dtype=int,
+        )
+        return building_state, hvac_state
+
+    def set_state(self, building_state: np.ndarray, hvac_state: np.ndarray) -> None:
+        """Restore the state of the buildings exported by get_state."""
+        for building, values, hvac_values in zip(
+            self.buildings, building_state.tolist(), hvac_state.tolist()
+        ):
+            (
+                building.indoor_temp,
+                building.current_mass_temp,
+                building.current_solar_gain,
+            ) = values
+            turned_on, seconds_since_off, lockout = hvac_values
+            building.hvac.turned_on = bool(turned_on)
+            building.hvac.seconds_since_off = seconds_since_off
+            building.hvac.lockout = bool(lockout)
+
+    def get_params(self) -> np.ndarray:
+        """
+        Export the properties of the buildings drawn by apply_noise.
+
+        Returns:
+            params: np.ndarray, of shape (nb_agents, len(PARAM_KEYS)).
+        """
+        return np.array(
+            [
+                [getattr(building.init_props, key) for key in NOISY_PROPS]
+                + [building.hvac.init_props.cooling_capacity]
+                for building in self.buildings
+            ]
+        )
+
+    def set_params(self, params: np.ndarray) -> None:
+        """Write the properties exported by get_params back into the buildings."""
+        for building, values in zip(self.buildings, params.tolist()):
+            for key, value in zip(NOISY_PROPS, values):
+                setattr(building.init_props, key, value)
+            building.hvac.init_props.cooling_capacity = values[-1]
+            building.build_thermal_coefficients()
+            building.static_obs = building.get_static_obs()
+
+    def get_thermal_coefficients(self, time_step: timedelta) -> ThermalCoefficients:
+        """Export the cached thermal coefficients of the buildings as arrays (one entry per building)."""
+        return ThermalCoefficients.stack(
+            [
+                building.get_thermal_coefficients(time_step)
+                for building in self.buildings
+            ]
+        )
+
     def apply_noise(self) -> None:
-        """Apply noise to cluster properties."""
-        for building in self.buildings:
-            building.apply_noise()
+        """
+        Apply noise to cluster properties.
+
+        The noise of every building is drawn at once from the noise stream (see apply_batched_noise) and written with
+        set_params.
+        """
+        params = self.get_params()
+        apply_batched_noise(
+            self.streams.noise,
+            self.init_props.house_prop,
+            dict(zip(PARAM_KEYS, params.T)),
+        )
+        self.set_params(params)
@@ -37,6 +37,10 @@ class AgentsCommunicationProperties(pydantic.BaseModel):
     row_size: int = 5
     max_communication_distance: int = 2
     max_nb_agents_communication: int = 10
+    batched_sampling: bool = pydantic.Field(
+        default=False,
+        description="In random_sample mode, draw the links of all agents with a single numpy call instead of one call per agent.",
+    )
 
 
 class MessageProperties(pydantic.BaseModel):
@@ -1,4 +1,3 @@
-import random
 from copy import deepcopy
 from datetime import timedelta
 
@@ -40,8 +39,24 @@ class HVAC(Simulatable):
         self.turned_on = True
         return self.get_obs()
 
+    def recycle(self, hvac_props: HvacProperties) -> None:
+        """
+        Reset the HVAC for a new episode without constructing a new one: the properties modified by
+        Cluster.apply_noise are set back to their values in hvac_props, in place.
+
+        Parameters:
+            hvac_props: HvacProperties, the properties before noise (the ones given to the constructor).
+        """
+        self.init_props.cooling_capacity = hvac_props.cooling_capacity
+        self.reset()
+
     def step(self, action: bool, time_step: timedelta) -> EnvironmentObsDict:
         """Take a step in time for the HVAC, given action of the TCL agent."""
+        self.advance(action, time_step)
+        return self.get_obs()
+
+    def advance(self, action: bool, time_step: timedelta) -> None:
+        """Update the HVAC state for one time step, without building the observation."""
         if not self.turned_on:
             self.seconds_since_off += time_step.seconds
 
@@ -61,20 +76,25 @@ class HVAC(Simulatable):
                 < self.init_props.lockout_duration
             ):
                 self.lockout = True
-        return self.get_obs()
-
-    def apply_noise(self) -> None:
-        """Apply noise to hvac initial properties."""
-        self.init_props.cooling_capacity = random.choices(
-            self.init_props.noise_prop.cooling_capacity_list
-        )[0]
 
     def get_obs(self) -> EnvironmentObsDict:
         """Generate hvac observation dictionnary."""
+        obs_dict: EnvironmentObsDict = self.get_dynamic_obs()
+        obs_dict.update(self.get_static_obs())
+        return obs_dict
+
+    def get_dynamic_obs(self) -> EnvironmentObsDict:
+        """Generate the part of the hvac observation which changes at each step."""
         obs_dict: EnvironmentObsDict = {
             "turned_on": self.turned_on,
             "seconds_since_off": self.seconds_since_off,
             "lockout": self.lockout,
+        }
+        return obs_dict
+
+    def get_static_obs(self) -> EnvironmentObsDict:
+        """Generate the part of the hvac observation which is constant during an episode."""
+        obs_dict: EnvironmentObsDict = {
             "cop": self.init_props.cop,
             "cooling_capacity": self.init_props.cooling_capacity,
             "latent_cooling_fraction": self.init_props.latent_cooling_fraction,
@@ -0,0 +1,54 @@
+from typing import Dict
+
+import numpy as np
+
+from app.core.environment.environment_properties import BuildingProperties
+
+
+def apply_batched_noise(
+    rng: np.random.Generator,
+    house_prop: BuildingProperties,
+    params: Dict[str, np.ndarray],
+) -> None:
+    """
+    Apply the noise of the buildings and of their HVAC to arrays of properties, in place, with one call of the
+    generator per distribution:
+        - the start temperatures and the target temperature are increased by the absolute value of a gaussian noise;
+        - Ua is replaced by, and Cm, Ca and Hm are multiplied by, a triangular factor between factor_thermo_low and
+        factor_thermo_high (in any order), with mode 1 clipped into the bounds: a range on one side of 1 gives a
+        right triangle peaking at its bound closest to 1;
+        - the cooling capacity is drawn from cooling_capacity_list.
+
+    Parameters:
+        rng: np.random.Generator, the generator of the noise.
+        house_prop: BuildingProperties, the properties of the buildings, with their noise properties.
+        params: Dict[str, np.ndarray], the arrays of the properties of PARAM_KEYS (see Cluster.get_params), all of the same shape, modified in place.
+    """
+    house_noise = house_prop.noise_prop
+    hvac_noise = house_prop.hvac_prop.noise_prop
+    shape = params["target_temp"].shape
+
+    # Gaussian noise: start temperatures and target temp
+    start_temps = np.abs(rng.normal(0, house_noise.std_start_temp, (2,) + shape))
+    params["init_air_temp"] += start_temps[0]
+    params["init_mass_temp"] += start_temps[1]
+    params["target_temp"] += np.abs(rng.normal(0, house_noise.std_target_temp, shape))
+
+    # Factor noise: house wall conductance, house thermal mass, air thermal mass, house mass surface conductance
+    low, high = sorted((house_noise.factor_thermo_low, house_noise.factor_thermo_high))
+    if low < high:
+        # numpy requires low <= mode <= high
+        factors = rng.triangular(low, min(max(1.0, low), high), high, (4,) + shape)
+    else:
+        # Degenerate distribution, which numpy does not accept
+        factors = np.full((4,) + shape, low)
+    # Ua is replaced by its factor, as in the original noise model
+    params["Ua"][...] = factors[0]
+    params["Cm"] *= factors[1]
+    params["Ca"] *= factors[2]
+    params["Hm"] *= factors[3]
+
+    # HVAC noise
+    params["cooling_capacity"][...] = rng.choice(
+        hvac_noise.cooling_capacity_list, shape
+    )
@@ -0,0 +1,257 @@
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+import numpy as np
+
+FloatOrArray = Union[float, np.ndarray]
+
+
+@dataclass(frozen=True)
+class ThermalCoefficients:
+    """
+    Coefficients of the two-node (air/mass) thermal model of a building which only depend on its static
+    properties (Ua, Ca, Cm, Hm) and on the time step.
+
+    They are computed once and reused at every step, so that Building.update_temperature only has to combine
+    them with the current temperatures and heat gains. Each field is either a float (single building) or an
+    array with one entry per building (see ThermalCoefficients.stack).
+
+    Attributes:
+        Ua, Ca, Cm, Hm: Thermal properties the coefficients were computed from.
+        time_step_sec: Duration of the time step the coefficients were computed for, in seconds.
+        r1, r2: Roots of the characteristic equation of the model.
+        A3, A4: Ratios between the mass and the air temperature modes.
+        exp_r1, exp_r2: exp(r1 * time_step_sec) and exp(r2 * time_step_sec).
+
+    ---
+    Model taken from http://gridlab-d.shoutwiki.com/wiki/Residential_module_user's_guide
+    """
+
+    Ua: FloatOrArray
+    Ca: FloatOrArray
+    Cm: FloatOrArray
+    Hm: FloatOrArray
+    time_step_sec: int
+    r1: FloatOrArray
+    r2: FloatOrArray
+    A3: FloatOrArray
+    A4: FloatOrArray
+    exp_r1: FloatOrArray
+    exp_r2: FloatOrArray
+
+    @classmethod
+    def from_properties(
+        cls,
+        Ua: FloatOrArray,
+        Ca: FloatOrArray,
+        Cm: FloatOrArray,
+        Hm: FloatOrArray,
+        time_step_sec: int,
+    ) -> "ThermalCoefficients":
+        """
+        Compute the coefficients for the given thermal properties and time step.
+
+        Parameters:
+            Ua: House walls conductance (W/K).
+            Ca: Air thermal mass in the house (J/K).
+            Cm: House thermal mass (J/K).
+            Hm: House mass surface conductance (W/K).
+            time_step_sec: Duration of the time step, in seconds.
+
+        Returns:
+            The ThermalCoefficients object.
+        """
+        a = Cm * Ca / Hm
+        b = Cm * (Ua + Hm) / Hm + Ca
+        c = Ua
+
+        r1 = (-b + np.sqrt(b**2 - 4 * a * c)) / (2 * a)
+        r2 = (-b - np.sqrt(b**2 - 4 * a * c)) / (2 * a)
+
+        A3 = r1 * Ca / Hm + (Ua + Hm) / Hm
+        A4 = r2 * Ca / Hm + (Ua + Hm) / Hm
+
+        return cls(
+            Ua=Ua,
+            Ca=Ca,
+            Cm=Cm,
+            Hm=Hm,
+            time_step_sec=time_step_sec,
+            r1=r1,
+            r2=r2,
+            A3=A3,
+            A4=A4,
+            exp_r1=np.exp(r1 * time_step_sec),
+            exp_r2=np.exp(r2 * time_step_sec),
+        )
+
+    def matches(
+        self,
+        Ua: FloatOrArray,
+        Ca: FloatOrArray,
+        Cm: FloatOrArray,
+        Hm: FloatOrArray,
+        time_step_sec: int,
+    ) -> bool:
+        """Return True if the coefficients were computed from these properties and time step (scalar coefficients only)."""
+        return (
+            self.time_step_sec == time_step_sec
+            and self.Ua == Ua
+            and self.Ca == Ca
+            and self.Cm == Cm
+            and self.Hm == Hm
+        )
+
+    @classmethod
+    def stack(cls, coefficients: List["ThermalCoefficients"]) -> "ThermalCoefficients":
+        """
+        Stack the coefficients of several buildings into a single object holding one array per field, to be used by
+        batched engines.
+
+        Parameters:
+            coefficients: List of ThermalCoefficients computed with the same time step.
+
+        Returns:
+            A ThermalCoefficients object whose fields are arrays of shape (len(coefficients),).
+        """
+        time_steps = {coeff.time_step_sec for coeff in coefficients}
+        if len(time_steps) != 1:
+            raise ValueError(
+                f"Cannot stack thermal coefficients computed with different time steps: {time_steps}"
+            )
+        stacked = {
+            field.name: np.array([getattr(coeff, field.name) for coeff in coefficients])
+            for field in fields(cls)
+            if field.name != "time_step_sec"
+        }
+        return cls(time_step_sec=time_steps.pop(), **stacked)
+
+
+@lru_cache(maxsize=1024)
+def get_scalar_thermal_coefficients(
+    Ua: float, Ca: float, Cm: float, Hm: float, time_step_sec: int
+) -> ThermalCoefficients:
+    """
+    Cached ThermalCoefficients.from_properties for a single building.
+
+    The buildings of a cluster share their properties before noise, so their coefficients are only computed once
+    when they are reset, and again for each building when the noise is applied.
+    """
+    return ThermalCoefficients.from_properties(Ua, Ca, Cm, Hm, time_step_sec)
+
+
+@dataclass(frozen=True)
+class StateSpaceModel:
+    """
+    Exact discrete-time state-space form of the two-node thermal model.
+
+    For a fixed HVAC state, the model is linear in the air and mass temperatures x = [T_air, T_mass]. Over one
+    time step:
+        x' = transition @ x + od_temp_input * od_temp + heat_input * solar_gain + hvac_input[turned_on]
+    Every field has a leading shape (one entry per building), so that the whole cluster is stepped with a single
+    batched matrix-vector product. Temperatures are in Celsius: the model has a unit steady-state gain, so it is
+    invariant to the Kelvin offset used by the GridLAB-D formulas.
+
+    Attributes:
+        time_step_sec: Duration of the time step the model was computed for, in seconds.
+        transition: State-transition matrices, of shape (..., 2, 2).
+        od_temp_input: Input vectors for the outdoors temperature (Celsius), of shape (..., 2).
+        heat_input: Input vectors for a heat addition to the air (Watts), of shape (..., 2).
+        hvac_input: Input vectors of the HVAC when turned off (index 0) and on (index 1), of shape (..., 2, 2).
+    """
+
+    time_step_sec: int
+    transition: np.ndarray
+    od_temp_input: np.ndarray
+    heat_input: np.ndarray
+    hvac_input: np.ndarray
+
+    @classmethod
+    def from_coefficients(
+        cls, coeffs: ThermalCoefficients, hvac_heat_transfer: FloatOrArray
+    ) -> "StateSpaceModel":
+        """
+        Build the state-space model from the thermal coefficients.
+
+        Parameters:
+            coeffs: ThermalCoefficients of the buildings.
+            hvac_heat_transfer: Rate of heat transfer of the HVACs when turned on (W, negative for ACs).
+
+        Returns:
+            The StateSpaceModel object.
+        """
+        Ua, Ca, Hm = (
+            np.asarray(value, dtype=float)
+            for value in (coeffs.Ua, coeffs.Ca, coeffs.Hm)
+        )
+        r1, r2, A3, A4 = coeffs.r1, coeffs.r2, coeffs.A3, coeffs.A4
+        exp_r1, exp_r2 = coeffs.exp_r1, coeffs.exp_r2
+
+        # With u = od_temp + Qa / Ua, the GridLAB-D solution reads A1 = k * (p * T - q * M - s * u)
+        k = 1 / (r2 - r1)
+        p = r2 + (Ua + Hm) / Ca
+        q = Hm / Ca
+        s = r2 + Ua / Ca
+        air_mode = exp_r1 - exp_r2
+        mass_mode = A3 * exp_r1 - A4 * exp_r2
+
+        transition = np.stack(
+            [
+                np.stack([k * p * air_mode + exp_r2, -k * q * air_mode], axis=-1),
+                np.stack(
+                    [k * p * mass_mode + A4 * exp_r2, -k * q * mass_mode], axis=-1
+                ),
+            ],
+            axis=-2,
+        )
+        od_temp_input = np.stack(
+            [-k * s * air_mode + 1 - exp_r2, -k * s * mass_mode + 1 - A4 * exp_r2],
+            axis=-1,
+        )
+        heat_input = od_temp_input / Ua[..., np.newaxis]
+        hvac_on_input = (
+            heat_input * np.asarray(hvac_heat_transfer, dtype=float)[..., np.newaxis]
+        )
+        hvac_input = np.stack([np.zeros_like(hvac_on_input), hvac_on_input], axis=-2)
+
+        return cls(
+            time_step_sec=coeffs.time_step_sec,
+            transition=transition,
+            od_temp_input=od_temp_input,
+            heat_input=heat_input,
+            hvac_input=hvac_input,
+        )
+
+    def step(
+        self,
+        air_temp: np.ndarray,
+        mass_temp: np.ndarray,
+        od_temp: FloatOrArray,
+        solar_gain: np.ndarray,
+        turned_on: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Advance the temperatures of every building by one time step.
+
+        Parameters:
+            air_temp: Indoor air temperatures (Celsius).
+            mass_temp: Mass temperatures (Celsius).
+            od_temp: Outdoors temperature (Celsius), scalar or broadcastable to air_temp.
+            solar_gain: Solar gains (Watts).
+            turned_on: Boolean array, state of the HVACs during the time step.
+
+        Returns:
+            The new air and mass temperatures.
+        """
+        state = np.stack([air_temp, mass_temp], axis=-1)
+        # External input: outdoors temperature and solar gain, both entering through the air node
+        new_state = np.einsum("...ij,...j->...i", self.transition, state)
+        new_state += self.od_temp_input * np.asarray(od_temp)[..., np.newaxis]
+        new_state += self.heat_input * solar_gain[..., np.newaxis]
+        new_state += np.where(
+            turned_on[..., np.newaxis],
+            self.hvac_input[..., 1, :],
+            self.hvac_input[..., 0, :],
+        )
+        return new_state[..., 0], new_state[..., 1]
@@ -0,0 +1,543 @@
+from copy import deepcopy
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.environment.cluster.agent_communication_builder import (
+    AgentCommunicationBuilder,
+    CommunicationGraph,
+)
+from app.core.environment.cluster.cluster import (
+    BUILDING_MESSAGE_KEYS,
+    HVAC_MESSAGE_KEYS,
+    PARAM_KEYS,
+    compute_message_columns,
+)
+from app.core.environment.cluster.noise import apply_batched_noise
+from app.core.environment.cluster.thermal_coefficients import (
+    StateSpaceModel,
+    ThermalCoefficients,
+)
+from app.core.environment.environment_properties import (
+    ClusterPropreties,
+    EnvironmentObsDict,
+)
+from app.core.environment.random_streams import (
+    RandomStreams,
+    resolve_seed,
+    spawn_streams,
+)
+from app.core.environment.simulatable import Simulatable
+from app.utils.utils import (
+    compute_solar_gain,
+    get_solar_cooling_load_table,
+    get_solar_table_index,
+)
+
+FLOAT_ARRAYS = [
+    "init_air_temp",
+    "init_mass_temp",
+    "target_temp",
+    "deadband",
+    "Ua",
+    "Ca",
+    "Cm",
+    "Hm",
+    "window_area",
+    "shading_coeff",
+    "cop",
+    "cooling_capacity",
+    "latent_cooling_fraction",
+    "indoor_temp",
+    "mass_temp",
+    "solar_gain",
+]
+INT_ARRAYS = ["lockout_duration", "seconds_since_off"]
+BOOL_ARRAYS = ["turned_on", "lockout"]
+
+
+class VectorizedCluster(Simulatable):
+    """
+    Structure-of-arrays alternative to the Cluster class.
+
+    Instead of holding a list of Building objects, the state and the properties of every building are stored
+    in contiguous NumPy arrays (one entry per building) and the whole cluster is advanced with a single
+    vectorized call. The dynamics and the noise are the same as the object path: given the same random streams,
+    both classes produce identical trajectories.
+
+    Several independent clusters (replicas) can be stacked along a leading axis: the arrays then have the shape
+    (nb_replicas, nb_agents), and the outdoors temperature and date are given per replica.
+
+    Attributes:
+        init_props : ClusterPropreties
+            The initial properties of the cluster.
+        nb_agents : int
+            The number of buildings in the cluster.
+        nb_replicas : Optional[int]
+            The number of stacked clusters, None for a single cluster.
+        shape : Tuple[int, ...]
+            Shape of the buildings arrays: (nb_agents,) or (nb_replicas, nb_agents).
+        current_power_consumption : Union[float, np.ndarray]
+            The current power consumption of the cluster (one value per replica when replicated).
+        max_power : Union[float, np.ndarray]
+            The maximum power consumption of the cluster (one value per replica when replicated).
+        indoor_temp, mass_temp, solar_gain : np.ndarray
+            Dynamic thermal state of the buildings (Celsius, Celsius, Watts).
+        turned_on, lockout, seconds_since_off : np.ndarray
+            Dynamic state of the HVACs.
+        init_air_temp, init_mass_temp, target_temp, deadband, Ua, Ca, Cm, Hm, window_area, shading_coeff : np.ndarray
+            Building properties (after noise).
+        cop, cooling_capacity, latent_cooling_fraction, lockout_duration : np.ndarray
+            HVAC properties (after noise).
+        thermal_coeffs : Optional[ThermalCoefficients]
+            Cached coefficients of the thermal model (one entry per building), built by reset and apply_noise when the
+            time step is known, else at the first step.
+        state_space_model : Optional[StateSpaceModel]
+            Cached state-space form of the thermal model, used when init_props.thermal_model is "state_space".
+        agent_communicators : Dict[int, List[int]]
+            A dictionary representing the communication links between agents.
+        communication_builder : AgentCommunicationBuilder
+            An object used for building communication links between agents.
+        comm_graph : CommunicationGraph
+            The communication links between agents in CSR format.
+        time_step : Optional[timedelta]
+            The time step of the environment, used to build the thermal coefficients.
+        streams : List[RandomStreams]
+            The random streams of each replica (a single one when not replicated). The communication links, shared by
+            the replicas, are drawn from the first one.
+    """
+
+    init_props: ClusterPropreties
+    nb_agents: int
+    nb_replicas: Optional[int]
+    shape: Tuple[int, ...]
+    current_power_consumption: Union[float, np.ndarray]
+    max_power: Union[float, np.ndarray]
+    thermal_coeffs: Optional[ThermalCoefficients]
+    state_space_model: Optional[StateSpaceModel]
+    agent_communicators: Dict[int, List[int]]
+    communication_builder: AgentCommunicationBuilder
+    comm_graph: CommunicationGraph
+    time_step: Optional[timedelta]
+    streams: List[RandomStreams]
+
+    def __init__(
+        self,
+        cluster_props: ClusterPropreties,
+        nb_replicas: Optional[int] = None,
+        streams: Optional[List[RandomStreams]] = None,
+        time_step: Optional[timedelta] = None,
+    ) -> None:
+        """Initialize VectorizedCluster.
+
+        Parameters:
+            cluster_props: ClusterPropreties, properties of the cluster.
+            nb_replicas: Optional[int], number of independent clusters to stack along a leading axis.
+            streams: Optional[List[RandomStreams]], the random streams of each replica, spawned from a root seed drawn from the random module when None (see resolve_seed).
+            time_step: Optional[timedelta], time step of the environment, used to build the thermal coefficients.
+        """
+        self.init_props = deepcopy(cluster_props)
+        self.time_step = time_step
+        if streams is None:
+            streams = spawn_streams(resolve_seed(None), range(nb_replicas or 1))
+        self.streams = streams
+        self.nb_agents = self.init_props.nb_agents
+        self.nb_replicas = nb_replicas
+        if nb_replicas is None:
+            self.shape = (self.nb_agents,)
+        else:
+            self.shape = (nb_replicas, self.nb_agents)
+        self.reset()
+
+    def reset(self) -> list:
+        """Reset the state and the properties arrays of the cluster.
+
+        Returns: A list containing the observation dictionnary of each building (one list per replica when replicated)
+        """
+        self.allocate_arrays()
+        self.reset_buildings()
+        # Like the object path, max power is computed before noise is applied
+        self.max_power = self.sum_buildings(self.cooling_capacity / self.cop)
+
+        self.communication_builder = AgentCommunicationBuilder(
+            agents_comm_props=self.init_props.agents_comm_prop,
+            nb_agents=self.nb_agents,
+            rng=self.streams[0].communication,
+        )
+        self.agent_communicators = self.communication_builder.get_comm_link_list()
+        self.comm_graph = CommunicationGraph.from_link_list(
+            self.agent_communicators, self.nb_agents
+        )
+        return self.get_obs()
+
+    def allocate_arrays(self) -> None:
+        """Allocate the properties and state arrays of the buildings."""
+        for name in FLOAT_ARRAYS:
+            setattr(self, name, np.zeros(self.shape, dtype=float))
+        for name in INT_ARRAYS:
+            setattr(self, name, np.zeros(self.shape, dtype=int))
+        for name in BOOL_ARRAYS:
+            setattr(self, name, np.zeros(self.shape, dtype=bool))
+
+    def reset_buildings(self, replica_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Set the properties and the state of the buildings to the values given in config, without noise.
+
+        Parameters:
+            replica_ids: Optional[Sequence[int]], replicas to reset (all buildings when None).
+        """
+        index = slice(None) if replica_ids is None else np.asarray(replica_ids)
+        house_prop = self.init_props.house_prop
+        hvac_prop = house_prop.hvac_prop
+
+        # Building properties
+        self.init_air_temp[index] = house_prop.init_air_temp
+        self.init_mass_temp[index] = house_prop.init_mass_temp
+        self.target_temp[index] = house_prop.target_temp
+        self.deadband[index] = house_prop.deadband
+        self.Ua[index] = house_prop.Ua
+        self.Ca[index] = house_prop.Ca
+        self.Cm[index] = house_prop.Cm
+        self.Hm[index] = house_prop.Hm
+        self.window_area[index] = house_prop.window_area
+        self.shading_coeff[index] = house_prop.shading_coeff
+
+        # HVAC properties
+        self.cop[index] = hvac_prop.cop
+        self.cooling_capacity[index] = hvac_prop.cooling_capacity
+        self.latent_cooling_fraction[index] = hvac_prop.latent_cooling_fraction
+        self.lockout_duration[index] = hvac_prop.lockout_duration
+
+        # Dynamic state
+        self.indoor_temp[index] = self.init_air_temp[index]
+        self.mass_temp[index] = self.init_mass_temp[index]
+        self.solar_gain[index] = 0.0
+        self.turned_on[index] = True
+        self.lockout[index] = False
+        self.seconds_since_off[index] = 0
+
+        self.build_thermal_coefficients()
+        self.current_power_consumption = self.sum_buildings(
+            self.get_power_consumption()
+        )
+
+    def sum_buildings(self, values: np.ndarray) -> Union[float, np.ndarray]:
+        """Sum values over the buildings of the cluster (one sum per replica when replicated)."""
+        if self.nb_replicas is None:
+            return float(np.sum(values))
+        return np.sum(values, axis=-1)
+
+    def per_replica(
+        self, values: Union[float, Sequence[float]]
+    ) -> Union[float, np.ndarray]:
+        """Make a value given per replica broadcastable against the buildings arrays (values given per building are kept as is)."""
+        if self.nb_replicas is None:
+            return values
+        values = np.asarray(values, dtype=float)
+        if values.ndim == len(self.shape):
+            return values
+        return values[:, np.newaxis]
+
+    def step(
+        self,
+        od_temp: float,
+        action_dict: Union[Dict[int, bool], np.ndarray],
+        date_time: datetime,
+        time_step: timedelta,
+    ) -> list:
+        """Take a step in time for every building of the cluster at once.
+
+        Parameters:
+            od_temp: float, current outdoors temperature in Celsius
+            action_dict: dictionnary of actions (missing buildings are turned off) or boolean array of shape (nb_agents,)
+            date_time: datetime, current date and time
+            time_step: timedelta, time step duration
+        """
+        self.advance(od_temp, self.actions_to_array(action_dict), date_time, time_step)
+        return self.get_obs()
+
+    def advance(
+        self,
+        od_temp: Union[float, np.ndarray],
+        actions: np.ndarray,
+        date_time: Union[datetime, Sequence[datetime]],
+        time_step: timedelta,
+    ) -> None:
+        """
+        Advance the state arrays by one time step, without building the observation dictionnaries.
+
+        Parameters:
+            od_temp: outdoors temperature in Celsius (one value per replica, or per building, when replicated)
+            actions: boolean array of the same shape as the buildings arrays
+            date_time: current date and time (one per replica when replicated)
+            time_step: timedelta, time step duration
+        """
+        self.hvac_step(actions, time_step)
+        self.update_temperature(od_temp, time_step, date_time)
+        self.current_power_consumption = self.sum_buildings(
+            self.get_power_consumption()
+        )
+
+    def actions_to_array(
+        self, action_dict: Union[Dict[int, bool], np.ndarray]
+    ) -> np.ndarray:
+        """Convert a dictionnary of actions to a boolean array. Buildings without an action are turned off."""
+        if isinstance(action_dict, np.ndarray):
+            return action_dict.astype(bool)
+        actions = np.zeros(self.shape, dtype=bool)
+        for building_id, action in action_dict.items():
+            actions[building_id] = action
+        return actions
+
+    def hvac_step(self, actions: np.ndarray, time_step: timedelta) -> None:
+        """Vectorized version of HVAC.step."""
+        time_step_sec = time_step.seconds
+        seconds_since_off = np.where(
+            self.turned_on,
+            self.seconds_since_off,
+            self.seconds_since_off + time_step_sec,
+        )
+        lockout = ~self.turned_on & (seconds_since_off < self.lockout_duration)
+        turned_on = ~lockout & actions
+        seconds_since_off = np.where(turned_on, 0, seconds_since_off)
+        lockout |= ~turned_on & (
+            seconds_since_off + time_step_sec < self.lockout_duration
+        )
+
+        self.turned_on = turned_on
+        self.lockout = lockout
+        self.seconds_since_off = seconds_since_off
+
+    def update_temperature(
+        self,
+        od_temp: Union[float, np.ndarray],
+        time_step: timedelta,
+        date_time: Union[datetime, Sequence[datetime]],
+    ) -> None:
+        """
+        Vectorized version of Building.update_temperature.
+
+        ---
+        Model taken from http://gridlab-d.shoutwiki.com/wiki/Residential_module_user's_guide
+        """
+        if self.init_props.thermal_model == "state_space":
+            self.update_temperature_state_space(od_temp, time_step, date_time)
+            return
+
+        coeffs = self.get_thermal_coefficients(time_step)
+        Hm, Ca, Ua = coeffs.Hm, coeffs.Ca, coeffs.Ua
+
+        # Convert Celsius temperatures in Kelvin
+        od_temp_K = self.per_replica(od_temp) + 273
+        current_temp_K = self.indoor_temp + 273
+        current_mass_temp_K = self.mass_temp + 273
+
+        # Heat from hvacs (negative if it is AC)
+        total_Qhvac = self.get_heat_transfer()
+
+        # Total heat addition to air
+        self.solar_gain = self.compute_solar_gain(date_time)
+
+        Qa = total_Qhvac + self.solar_gain
+        # Heat from inside devices (oven, windows, etc)
+        Qm = 0
+
+        # Variables
+        c = Ua
+        d = Qm + Qa + Ua * od_temp_K
+        g = Qm / Hm
+
+        dTA0dt = (
+            Hm * current_mass_temp_K / Ca
+            - (Ua + Hm) * current_temp_K / Ca
+            + Ua * od_temp_K / Ca
+            + Qa / Ca
+        )
+
+        A1 = (coeffs.r2 * current_temp_K - dTA0dt - coeffs.r2 * d / c) / (
+            coeffs.r2 - coeffs.r1
+        )
+        A2 = current_temp_K - d / c - A1
+
+        # Updating the temperature
+        new_current_temp_k = A1 * coeffs.exp_r1 + A2 * coeffs.exp_r2 + d / c
+        new_current_mass_temp_k = (
+            A1 * coeffs.A3 * coeffs.exp_r1 + A2 * coeffs.A4 * coeffs.exp_r2 + g + d / c
+        )
+
+        self.indoor_temp = new_current_temp_k - 273
+        self.mass_temp = new_current_mass_temp_k - 273
+
+    def update_temperature_state_space(
+        self,
+        od_temp: Union[float, np.ndarray],
+        time_step: timedelta,
+        date_time: Union[datetime, Sequence[datetime]],
+    ) -> None:
+        """Update the temperature of every building with the precomputed state-space model (one batched matrix-vector product)."""
+        self.solar_gain = self.compute_solar_gain(date_time)
+        self.indoor_temp, self.mass_temp = self.get_state_space_model(time_step).step(
+            self.indoor_temp,
+            self.mass_temp,
+            self.per_replica(od_temp),
+            self.solar_gain,
+            self.turned_on,
+        )
+
+    def compute_solar_gain(
+        self, date_time: Union[datetime, Sequence[datetime]]
+    ) -> np.ndarray:
+        """Solar gain of every building, in Watts (the date is given per replica when replicated)."""
+        if not self.init_props.house_prop.solar_gain:
+            return np.zeros(self.shape, dtype=float)
+        if self.nb_replicas is None:
+            return compute_solar_gain(date_time, self.window_area, self.shading_coeff)
+        day_ids, minute_ids = zip(*map(get_solar_table_index, date_time))
+        solar_cooling_load = get_solar_cooling_load_table()[day_ids, minute_ids]
+        return (
+            self.window_area * self.shading_coeff * self.per_replica(solar_cooling_load)
+        )
+
+    def get_state_space_model(self, time_step: timedelta) -> StateSpaceModel:
+        """Return the cached state-space model of the buildings, computing it again if the time step changed."""
+        if (
+            self.state_space_model is None
+            or self.state_space_model.time_step_sec != time_step.seconds
+        ):
+            self.state_space_model = StateSpaceModel.from_coefficients(
+                self.get_thermal_coefficients(time_step),
+                -1 * self.cooling_capacity / (1 + self.latent_cooling_fraction),
+            )
+        return self.state_space_model
+
+    def build_thermal_coefficients(self) -> None:
+        """
+        Compute the cached thermal coefficients from the current properties arrays, or drop them if the time step is
+        unknown. The state-space model is dropped, and built again from them at the next step.
+        """
+        self.state_space_model = None
+        if self.time_step is None:
+            self.thermal_coeffs = None
+            return
+        self.thermal_coeffs = ThermalCoefficients.from_properties(
+            self.Ua, self.Ca, self.Cm, self.Hm, self.time_step.seconds
+        )
+
+    def get_thermal_coefficients(self, time_step: timedelta) -> ThermalCoefficients:
+        """
+        Return the cached coefficients of the thermal model of every building.
+
+        The cache is built again by reset and apply_noise, the only methods modifying the thermal properties arrays,
+        and computed again if the time step changes.
+        """
+        if (
+            self.thermal_coeffs is None
+            or self.thermal_coeffs.time_step_sec != time_step.seconds
+        ):
+            self.thermal_coeffs = ThermalCoefficients.from_properties(
+                self.Ua, self.Ca, self.Cm, self.Hm, time_step.seconds
+            )
+        return self.thermal_coeffs
+
+    def get_heat_transfer(self) -> np.ndarray:
+        """Rate of heat transfer produced by each HVAC, in Watts (negative as they are ACs)."""
+        return np.where(
+            self.turned_on,
+            -1 * self.cooling_capacity / (1 + self.latent_cooling_fraction),
+            0.0,
+        )
+
+    def get_power_consumption(self) -> np.ndarray:
+        """Electric power consumption of each HVAC, in Watts."""
+        return np.where(self.turned_on, self.cooling_capacity / self.cop, 0.0)
+
+    def get_comm_graph(self) -> CommunicationGraph:
+        """Communication graph of the current time step (a new sample is drawn in random_sample mode)."""
+        if self.init_props.agents_comm_prop.mode == "random_sample":
+            return self.communication_builder.get_comm_graph()
+        return self.comm_graph
+
+    def get_message_columns(
+        self, replica_id: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """Message sent by each building (of the given replica when replicated), as one array per message field."""
+        index = slice(None) if replica_id is None else replica_id
+        state = {
+            key: getattr(self, key)[index]
+            for key in BUILDING_MESSAGE_KEYS
+            + HVAC_MESSAGE_KEYS
+            + ("seconds_since_off", "turned_on", "indoor_temp")
+        }
+        return compute_message_columns(self.init_props.message_prop, state)
+
+    def get_obs(self) -> list:
+        """Generate cluster observation dictionnary, with the same layout as Cluster.get_obs (one list per replica when replicated)."""
+        if self.nb_replicas is None:
+            return self.get_replica_obs()
+        return [
+            self.get_replica_obs(replica_id) for replica_id in range(self.nb_replicas)
+        ]
+
+    def get_replica_obs(
+        self, replica_id: Optional[int] = None
+    ) -> List[EnvironmentObsDict]:
+        """Generate the observation dictionnaries of the buildings of a cluster (of the given replica when replicated)."""
+        index = slice(None) if replica_id is None else replica_id
+        columns = {
+            "turned_on": self.turned_on[index].tolist(),
+            "seconds_since_off": self.seconds_since_off[index].tolist(),
+            "lockout": self.lockout[index].tolist(),
+            "cop": self.cop[index].tolist(),
+            "cooling_capacity": self.cooling_capacity[index].tolist(),
+            "latent_cooling_fraction": self.latent_cooling_fraction[index].tolist(),
+            "lockout_duration": self.lockout_duration[index].tolist(),
+            "target_temp": self.target_temp[index].tolist(),
+            "deadband": self.deadband[index].tolist(),
+            "Ua": self.Ua[index].tolist(),
+            "Ca": self.Ca[index].tolist(),
+            "Cm": self.Cm[index].tolist(),
+            "Hm": self.Hm[index].tolist(),
+            "indoor_temp": self.indoor_temp[index].tolist(),
+            "mass_temp": self.mass_temp[index].tolist(),
+            "solar_gain": self.solar_gain[index].tolist(),
+        }
+        if replica_id is None:
+            cluster_hvac_power = self.current_power_consumption
+        else:
+            cluster_hvac_power = float(self.current_power_consumption[replica_id])
+        messages = self.get_comm_graph().gather_messages(
+            self.get_message_columns(replica_id)
+        )
+        state_dict: List[EnvironmentObsDict] = []
+        for building_id in range(self.nb_agents):
+            building_obs: EnvironmentObsDict = {
+                key: values[building_id] for key, values in columns.items()
+            }
+            building_obs["cluster_hvac_power"] = cluster_hvac_power
+            building_obs["message"] = messages[building_id]
+            state_dict.append(building_obs)
+        return state_dict
+
+    def apply_noise(self, replica_ids: Optional[Sequence[int]] = None) -> None:
+        """Apply noise to the buildings properties.
+
+        The noise of each cluster is drawn at once from the noise stream of its replica (see apply_batched_noise) and
+        written straight into the properties arrays. Given the same streams, the noise is the same as the one of
+        Cluster.apply_noise, so that both cluster backends stay interchangeable.
+
+        Parameters:
+            replica_ids: Optional[Sequence[int]], replicas to apply noise to (all buildings when None).
+        """
+        house_prop = self.init_props.house_prop
+        if self.nb_replicas is None:
+            params = {name: getattr(self, name) for name in PARAM_KEYS}
+            apply_batched_noise(self.streams[0].noise, house_prop, params)
+        else:
+            if replica_ids is None:
+                replica_ids = range(self.nb_replicas)
+            for replica_id in replica_ids:
+                # Rows of the arrays, modified in place
+                params = {name: getattr(self, name)[replica_id] for name in PARAM_KEYS}
+                apply_batched_noise(self.streams[replica_id].noise, house_prop, params)
+        self.build_thermal_coefficients()
@@ -1,16 +1,26 @@
-import random
 from copy import deepcopy
-from datetime import timedelta
-from typing import Dict, List
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
+from app.core.environment.clock import Clock, DateTimeLike
 from app.core.environment.cluster.cluster import Cluster
 from app.core.environment.environment_properties import (
+    OBS_COLUMNS,
+    OBS_KEYS,
     EnvironmentObsDict,
     EnvironmentProperties,
+    TemperatureProperties,
 )
+from app.core.environment.episode_planner import EpisodePlanner, sinusoidal_od_temp
 from app.core.environment.power_grid.power_grid import PowerGrid
+from app.core.environment.random_streams import (
+    RandomStreams,
+    resolve_seed,
+    spawn_streams,
+)
 from app.core.environment.rewards_calculator import RewardsCalculator
 
 DAYS_IN_YEAR = 364.0
@@ -20,6 +30,93 @@ HOURS_IN_DAY = 24.0
 SECONDS_IN_DAY = SECONDS_IN_MINUTE * MINUTES_IN_HOUR * HOURS_IN_DAY
 
 
+def draw_od_temp(
+    temp_prop: TemperatureProperties, date_time: DateTimeLike, rng: np.random.Generator
+) -> float:
+    """
+    Compute the outdoors temperature of a time step, with the sinusoidal model and a gaussian noise.
+
+    Parameters:
+        temp_prop: TemperatureProperties, the properties of the temperature model.
+        date_time: DateTimeLike, the time step (or its calendar fields).
+        rng: np.random.Generator, the generator of the noise (the od_temp stream of the environment).
+
+    Returns:
+        temperature: float, the outdoor temperature.
+    """
+    time_day = date_time.hour + date_time.minute / SECONDS_IN_MINUTE
+    temperature = sinusoidal_od_temp(temp_prop, time_day)
+    return temperature + rng.normal(0, temp_prop.temp_std)
+
+
+def draw_start_date(
+    env_props: EnvironmentProperties, rng: np.random.Generator
+) -> datetime:
+    """
+    Return the start date of an episode: start_datetime, shifted by a random number of days and seconds within the
+    year when start_datetime_mode is "random".
+
+    Parameters:
+        env_props: EnvironmentProperties, the environment properties.
+        rng: np.random.Generator, the generator of the date (the date stream of the environment).
+
+    Returns:
+        start_date_time: datetime, the start date and time of the episode.
+    """
+    if env_props.start_datetime_mode != "random":
+        return env_props.start_datetime
+    random_days = int(rng.integers(int(DAYS_IN_YEAR)))
+    random_seconds = int(rng.integers(int(SECONDS_IN_DAY)))
+    return env_props.start_datetime + timedelta(
+        days=random_days, seconds=random_seconds
+    )
+
+
+@dataclass
+class EnvironmentSnapshot:
+    """
+    State of an Environment captured by Environment.snapshot.
+
+    The objects of the episode (cluster, power grid, planner, rewards calculator) are kept by reference, with their
+    properties and tables: only the state which changes during an episode is copied, as arrays. With pooled_reset,
+    the objects are recycled by the next episodes: the noisy properties of the buildings (see Cluster.get_params) and
+    the objects drawn again at each reset are kept as well.
+
+    Attributes:
+        cluster (Cluster): The cluster of the episode.
+        power_grid (PowerGrid): The power grid of the episode.
+        planner (Optional[EpisodePlanner]): The planner of the episode.
+        rewards_calculator (RewardsCalculator): The rewards calculator of the episode.
+        timestamp (int): The time of the clock.
+        current_od_temp (float): The outdoor temperature.
+        building_state (np.ndarray): The state of the buildings (see Cluster.get_state).
+        hvac_state (np.ndarray): The state of the HVACs (see Cluster.get_state).
+        cluster_power (float): The power consumption of the cluster.
+        grid_state (np.ndarray): The base power, signal, time since last interpolation and artificial ratio of the power grid.
+        planned (Optional[tuple]): The planned arrays of the planner.
+        streams_state (dict): The state of the random streams of the environment.
+        episode_id (int): The number of the episode, counted by Environment.reset.
+        params (Optional[np.ndarray]): The noisy properties of the buildings, with pooled_reset.
+        episode_objects (tuple): The communication builder, links and graph of the cluster, and the signal calculator and interpolation tables of the power grid.
+    """
+
+    cluster: Cluster
+    power_grid: PowerGrid
+    planner: Optional[EpisodePlanner]
+    rewards_calculator: RewardsCalculator
+    timestamp: int
+    current_od_temp: float
+    building_state: np.ndarray
+    hvac_state: np.ndarray
+    cluster_power: float
+    grid_state: np.ndarray
+    planned: Optional[tuple]
+    streams_state: dict
+    episode_id: int
+    params: Optional[np.ndarray]
+    episode_objects: tuple
+
+
 class Environment:
     """
 
@@ -29,44 +126,88 @@ class Environment:
     Attributes:
         init_props (EnvironmentProperties): An object containing the initial properties of the environment.
         cluster (Cluster): An object representing the cluster of buildings.
-        date_time (datetime): A datetime object representing the current date and time in the environment.
+        clock (Clock): The integer clock of the environment, whose calendar fields are given to the cluster and the power grid.
+        date_time (datetime): A datetime object representing the current date and time in the environment, built from the clock when accessed.
         current_od_temp (float): A float representing the current outdoor temperature in the environment.
         power_grid (PowerGrid): An object representing the power grid.
+        planner (Optional[EpisodePlanner]): The planner of the outdoor temperature and of the signal shape, when init_props.plan_horizon is positive.
         rewards_calculator (RewardsCalculator): An object representing the rewards calculator.
+        obs_array (np.ndarray): Preallocated array of shape (nb_agents, len(OBS_KEYS)) filled by get_obs_array.
+        episode_count (int): The number of resets.
+        episode_id (int): The number of the current episode, the value of episode_count at its reset (or at the reset of the restored snapshot).
+        seed (int): The root seed of the random streams, init_props.seed or the seed drawn when it is None (see resolve_seed), to rerun the environment.
+        env_id (int): The id of the environment, which selects its random streams among the ones of the seed.
+        streams (RandomStreams): The random streams of the environment, kept across episodes.
 
     """
 
-    def __init__(self, env_props: EnvironmentProperties) -> None:
+    def __init__(self, env_props: EnvironmentProperties, env_id: int = 0) -> None:
         """
         Initialize a new instance of the Environment class with the provided environment properties.
 
         Parameters:
             env_props: EnvironmentProperties, the environment properties used to initialize the Environment instance.
+            env_id: int, the id of the environment. Environments with the same seed and id draw the same numbers, whether they are run alone, as replicas of a BatchedEnvironment or in worker processes.
         """
         self.init_props = deepcopy(env_props)
+        self.env_id = env_id
+        self.seed = resolve_seed(self.init_props.seed)
+        self.streams: RandomStreams = spawn_streams(self.seed, [env_id])[0]
+        self.episode_count = 0
         self.reset()
 
     def reset(self) -> Dict[int, EnvironmentObsDict]:
         """
         Reset the Environment instance to its initial state.
 
+        With init_props.pooled_reset, the buildings, HVACs, power grid (with its interpolator), rewards calculator and
+        observation array of the previous episode are recycled: only the noise, the communication links, the signal
+        and the planner are drawn again, in the same order as when the objects are constructed.
+
         Returns:
             obs_dict: Dict[int, EnvironmentObsDict], a dictionary of observation dictionaries for each building in the cluster.
         """
-        self.cluster = Cluster(self.init_props.cluster_prop)
-        self.date_time = self.init_props.start_datetime
+        # With pooled_reset, the objects of the previous episode are recycled. The random draws are the same.
+        recycle = self.init_props.pooled_reset and self.episode_count > 0
+        self.episode_count += 1
+        self.episode_id = self.episode_count
+        if recycle:
+            self.cluster.recycle()
+            self.clock.set(self.init_props.start_datetime)
+        else:
+            self.cluster = Cluster(
+                self.init_props.cluster_prop, self.streams, self.init_props.time_step
+            )
+            self.clock = Clock(
+                self.init_props.start_datetime, self.init_props.time_step
+            )
         self.apply_noise()
+        if self.init_props.plan_horizon > 0:
+            self.planner = EpisodePlanner(
+                self.init_props, self.date_time, self.streams.od_temp
+            )
+        else:
+            self.planner = None
         self.compute_od_temp()
-        self.power_grid = PowerGrid(
-            self.init_props.power_grid_prop,
-            self.cluster,
-        )
-        self.rewards_calculator = RewardsCalculator(
-            self.init_props.reward_prop, self.init_props.cluster_prop.house_prop
-        )
+        if recycle:
+            self.power_grid.reset(self.planner)
+        else:
+            self.power_grid = PowerGrid(
+                self.init_props.power_grid_prop,
+                self.cluster,
+                self.planner,
+            )
+            self.rewards_calculator = RewardsCalculator(
+                self.init_props.reward_prop, self.init_props.cluster_prop.house_prop
+            )
+            self.obs_array = np.zeros(
+                (self.init_props.cluster_prop.nb_agents, len(OBS_KEYS))
+            )
         self.power_grid.step(
-            self.date_time, self.init_props.time_step, self.current_od_temp
+            self.clock.fields, self.init_props.time_step, self.current_od_temp
         )
+        # The columns which are constant during the episode are only written here
+        self.cluster.get_obs_array(self.obs_array)
         return self.get_obs()
 
     def step(
@@ -84,10 +225,13 @@ class Environment:
 
         """
         # Step in time
-        self.date_time += self.init_props.time_step
+        self.clock.advance()
         # Cluster step
         self.cluster.step(
-            self.current_od_temp, action_dict, self.date_time, self.init_props.time_step
+            self.current_od_temp,
+            action_dict,
+            self.clock.fields,
+            self.init_props.time_step,
         )
 
         # Compute outdoor temperature before power grid step
@@ -102,11 +246,166 @@ class Environment:
 
         # Power grid step
         self.power_grid.step(
-            self.date_time, self.init_props.time_step, self.current_od_temp
+            self.clock.fields, self.init_props.time_step, self.current_od_temp
         )
 
         return self.get_obs(), rewards_dict
 
+    def step_arrays(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Advance the simulation one time step, with arrays instead of dictionnaries.
+
+        Same as step, but the observations are returned by get_obs_array and the messages are not computed (in the
+        random_sample communication mode, the random draws of the messages are skipped as well).
+
+        Parameters:
+            actions: np.ndarray, boolean array of shape (nb_agents,), the action of each building.
+
+        Returns:
+            - obs_array: np.ndarray, the observations, of shape (nb_agents, len(OBS_KEYS)) (see get_obs_array).
+            - rewards: np.ndarray, the rewards, of shape (nb_agents,).
+        """
+        # Step in time
+        self.clock.advance()
+        # Cluster step
+        self.cluster.advance(
+            self.current_od_temp,
+            np.asarray(actions, dtype=bool).tolist(),
+            self.clock.fields,
+            self.init_props.time_step,
+        )
+
+        # Compute outdoor temperature before power grid step
+        self.compute_od_temp()
+
+        # Power grid step, keeping the old grid signal for the reward
+        reg_signal = self.power_grid.current_signal
+        self.power_grid.step(
+            self.clock.fields, self.init_props.time_step, self.current_od_temp
+        )
+
+        obs_array = self.get_obs_array()
+        rewards = self.rewards_calculator.compute_rewards_array(
+            obs_array[:, OBS_COLUMNS["indoor_temp"]],
+            obs_array[:, OBS_COLUMNS["target_temp"]],
+            obs_array[:, OBS_COLUMNS["deadband"]],
+            self.cluster.current_power_consumption,
+            reg_signal,
+        )
+        return obs_array, rewards
+
+    def snapshot(self) -> EnvironmentSnapshot:
+        """
+        Capture the state of the environment, to restore it later (evaluation forks, rollbacks, branching).
+
+        Much cheaper than a deepcopy: the properties and tables of the episode are shared, and only the state which
+        changes during an episode is copied. The states of the random streams of the environment are captured as
+        well, and the random module is left untouched.
+
+        Returns:
+            snapshot: EnvironmentSnapshot, the state to give to restore.
+        """
+        building_state, hvac_state = self.cluster.get_state()
+        power_grid = self.power_grid
+        planned = None
+        if self.planner is not None:
+            planned = (self.planner.od_temps, self.planner.signal_shapes)
+        return EnvironmentSnapshot(
+            cluster=self.cluster,
+            power_grid=power_grid,
+            planner=self.planner,
+            rewards_calculator=self.rewards_calculator,
+            timestamp=self.clock.timestamp,
+            current_od_temp=self.current_od_temp,
+            building_state=building_state,
+            hvac_state=hvac_state,
+            cluster_power=self.cluster.current_power_consumption,
+            grid_state=np.array(
+                [
+                    power_grid.base_power,
+                    power_grid.current_signal,
+                    getattr(power_grid, "time_since_last_interp", 0),
+                    power_grid.init_props.artificial_ratio,
+                ]
+            ),
+            planned=planned,
+            streams_state=self.streams.get_state(),
+            episode_id=self.episode_id,
+            params=self.cluster.get_params() if self.init_props.pooled_reset else None,
+            episode_objects=(
+                self.cluster.communication_builder,
+                self.cluster.agent_communicators,
+                self.cluster.comm_graph,
+                power_grid.signal_calculator,
+                getattr(power_grid, "building_tables", None),
+            ),
+        )
+
+    def restore(self, snapshot: EnvironmentSnapshot) -> None:
+        """
+        Restore the state captured by snapshot, even after the environment was stepped or reset.
+
+        Parameters:
+            snapshot: EnvironmentSnapshot, a state returned by snapshot. It can be restored several times.
+        """
+        self.cluster = snapshot.cluster
+        self.power_grid = snapshot.power_grid
+        self.planner = snapshot.planner
+        self.rewards_calculator = snapshot.rewards_calculator
+        self.clock.set_timestamp(snapshot.timestamp)
+        self.current_od_temp = snapshot.current_od_temp
+
+        if snapshot.params is not None and snapshot.episode_id != self.episode_id:
+            # The objects were recycled by another episode
+            self.cluster.set_params(snapshot.params)
+        self.episode_id = snapshot.episode_id
+        (
+            self.cluster.communication_builder,
+            self.cluster.agent_communicators,
+            self.cluster.comm_graph,
+            self.power_grid.signal_calculator,
+            building_tables,
+        ) = snapshot.episode_objects
+        if building_tables is not None:
+            self.power_grid.building_tables = building_tables
+        self.power_grid.planner = self.planner
+        if self.planner is not None:
+            self.planner.signal_calculator = self.power_grid.signal_calculator
+
+        self.cluster.set_state(snapshot.building_state, snapshot.hvac_state)
+        self.cluster.current_power_consumption = snapshot.cluster_power
+
+        power_grid = self.power_grid
+        base_power, current_signal, time_since_last_interp, artificial_ratio = (
+            snapshot.grid_state.tolist()
+        )
+        power_grid.base_power = base_power
+        power_grid.current_signal = current_signal
+        if hasattr(power_grid, "time_since_last_interp"):
+            power_grid.time_since_last_interp = int(time_since_last_interp)
+        power_grid.init_props.artificial_ratio = artificial_ratio
+
+        if snapshot.planned is not None:
+            self.planner.od_temps, self.planner.signal_shapes = snapshot.planned
+        self.streams.set_state(snapshot.streams_state)
+        # The columns which are constant during the episode may be from another episode
+        self.cluster.get_obs_array(self.obs_array)
+
+    def get_obs_array(self) -> np.ndarray:
+        """
+        Return the current observations as an array, without building the observation dictionnaries.
+
+        The array is preallocated and overwritten at each call: copy it to keep it across steps. The columns which are
+        constant during the episode (BUILDING_STATIC_OBS_KEYS) are written at reset.
+
+        Returns:
+            obs_array: np.ndarray, array of shape (nb_agents, len(OBS_KEYS)), whose columns are given by OBS_COLUMNS.
+        """
+        self.cluster.get_obs_array(self.obs_array, static=False)
+        self.obs_array[:, OBS_COLUMNS["OD_temp"]] = self.current_od_temp
+        self.obs_array[:, OBS_COLUMNS["reg_signal"]] = self.power_grid.current_signal
+        return self.obs_array
+
     def get_obs(self) -> Dict[int, EnvironmentObsDict]:
         """
         Return the current observations of the Environment instance.
@@ -129,9 +428,19 @@ class Environment:
 
         return obs_dict
 
+    @property
+    def date_time(self) -> datetime:
+        """The current date and time, built from the clock."""
+        return self.clock.date_time
+
+    @date_time.setter
+    def date_time(self, date_time: datetime) -> None:
+        self.clock.set(date_time)
+
     def compute_od_temp(self) -> None:
         """
-        Compute the outdoors temperature based on the time, according to a sinusoidal model and add a gaussian random factor.
+        Compute the outdoors temperature based on the time, according to a sinusoidal model and add a gaussian random factor, drawn from the od_temp stream.
+        When the episode is planned, the temperature is looked up in the EpisodePlanner instead.
 
         Parameters:
             self
@@ -139,25 +448,14 @@ class Environment:
         Returns:
             None
         """
+        if self.planner is not None:
+            self.current_od_temp = self.planner.get_od_temp(self.clock.fields)
+            return
 
-        # Sinusoidal model
-        amplitude = (
-            self.init_props.temp_prop.day_temp - self.init_props.temp_prop.night_temp
-        ) / 2.0
-        bias = (
-            self.init_props.temp_prop.day_temp + self.init_props.temp_prop.night_temp
-        ) / 2.0
-        delay = -6.0 + self.init_props.temp_prop.phase  # Temperature is coldest at 6am
-        time_day = self.date_time.hour + self.date_time.minute / SECONDS_IN_MINUTE
-
-        temperature = (
-            amplitude * np.sin(2 * np.pi * (time_day + delay) / HOURS_IN_DAY) + bias
+        self.current_od_temp = draw_od_temp(
+            self.init_props.temp_prop, self.clock.fields, self.streams.od_temp
         )
 
-        # Adding noise
-        temperature += random.gauss(0, self.init_props.temp_prop.temp_std)
-        self.current_od_temp = temperature
-
     def apply_noise(self) -> None:
         """
         Apply noise to the environment by randomizing the start date and adding noise to the cluster.
@@ -187,8 +485,4 @@ class Environment:
 
         """
         if self.init_props.start_datetime_mode == "random":
-            random_days = random.randrange(int(DAYS_IN_YEAR))
-            random_seconds = random.randrange(int(SECONDS_IN_DAY))
-            self.date_time = self.init_props.start_datetime + timedelta(
-                days=random_days, seconds=random_seconds
-            )
+            self.date_time = draw_start_date(self.init_props, self.streams.date)
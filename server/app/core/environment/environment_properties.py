@@ -1,5 +1,5 @@
 import datetime
-from typing import List, Literal, TypedDict, Union
+from typing import Dict, List, Literal, Optional, TypedDict, Union
 
 from pydantic import BaseModel, Field
 
@@ -110,6 +110,7 @@ class BuildingNoiseProperties(BaseModel):
         - std_target_temp: Standard deviation of the target temperature of the house (Celsius).
         - factor_thermo_low: Factor to multiply the standard deviation of the target temperature of the house (Celsius) to generate a lower limit for the noise.
         - factor_thermo_high: Factor to multiply the standard deviation of the target temperature of the house (Celsius) to generate an upper limit for the noise.
+        The thermal factors follow a triangular distribution between factor_thermo_low and factor_thermo_high, with mode 1 clipped into the bounds (see apply_batched_noise).
     """
 
     std_start_temp: float = Field(
@@ -320,6 +321,7 @@ class ClusterPropreties(BaseModel):
         - agents_comm_prop: an instance of AgentsCommunicationProperties class that specifies properties related to communication between agents.
         - message_prop: an instance of MessageProperties class that specifies properties related to the message space.
         - house_prop: an instance of BuildingProperties class that specifies properties related to the buildings in the cluster.
+        - thermal_model: formulation of the building thermal model used by the vectorized cluster.
     """
 
     nb_agents: int = Field(
@@ -334,6 +336,10 @@ class ClusterPropreties(BaseModel):
     agents_comm_prop: AgentsCommunicationProperties = AgentsCommunicationProperties()
     message_prop: MessageProperties = MessageProperties()
     house_prop: BuildingProperties = BuildingProperties()
+    thermal_model: Literal["analytic", "state_space"] = Field(
+        default="analytic",
+        description="Thermal model of the vectorized cluster: analytic (GridLAB-D formulas) or state_space (precomputed discrete-time transition matrices).",
+    )
 
 
 class EnvironmentProperties(BaseModel):
@@ -344,6 +350,9 @@ class EnvironmentProperties(BaseModel):
     - start_datetime: the start date and time of the simulation, as a datetime.datetime object.
     - start_datetime_mode: a string that specifies whether the start date and time should be randomly chosen within the year after the original start date and time, or whether it should stay fixed.
     - time_step: the length of each time step in the simulation, as a datetime.timedelta object.
+    - plan_horizon: the number of time steps planned at once by the EpisodePlanner, or 0 to compute the outdoor temperature and the signal at each step.
+    - pooled_reset: whether reset recycles the buildings, HVACs and power grid of the previous episode instead of constructing new ones.
+    - seed: the root seed of the random streams of the environments (see RandomStreams), or None to draw it from the random module.
     - temp_prop: an instance of the TemperatureProperties class that defines the properties of the temperature model used in the simulation.
     - state_prop: an instance of the StateProperties class that defines the properties of the state space used in the simulation.
     - reward_prop: an instance of the RewardProperties class that defines the properties of the reward function used in the simulation.
@@ -364,6 +373,18 @@ class EnvironmentProperties(BaseModel):
         default=datetime.timedelta(0, 4),
         description="How long a timestep should take (in seconds).",
     )
+    plan_horizon: int = Field(
+        default=0,
+        description="Number of time steps of outdoor temperature and signal shape planned at once by the EpisodePlanner (0 to compute them at each step).",
+    )
+    pooled_reset: bool = Field(
+        default=True,
+        description="Whether reset recycles the objects of the previous episode (buildings, HVACs, power grid and its interpolator) instead of constructing new ones.",
+    )
+    seed: Optional[int] = Field(
+        default=None,
+        description="Root seed of the random streams of the environments, whose draws only depend on the seed and on the id of the environment (None to draw it from the random module, following the global seed).",
+    )
 
     temp_prop: TemperatureProperties = TemperatureProperties()
     state_prop: StateProperties = StateProperties()
@@ -462,3 +483,31 @@ class EnvironmentObsDict(TypedDict, total=False):
     solar_gain: float
     message: Union[List[BuildingMessage], list]
     reg_signal: float
+
+
+# Columns of the observation arrays (Environment.get_obs_array): numeric fields of EnvironmentObsDict, building
+# fields first. Booleans are stored as 0/1, datetime and message are not included.
+BUILDING_OBS_KEYS: List[str] = [
+    "turned_on",
+    "seconds_since_off",
+    "lockout",
+    "cop",
+    "cooling_capacity",
+    "latent_cooling_fraction",
+    "lockout_duration",
+    "target_temp",
+    "deadband",
+    "Ua",
+    "Ca",
+    "Cm",
+    "Hm",
+    "indoor_temp",
+    "mass_temp",
+    "solar_gain",
+]
+# Building fields which are constant during an episode, and fields which change at each step
+BUILDING_STATIC_OBS_KEYS: List[str] = BUILDING_OBS_KEYS[3:13]
+BUILDING_DYNAMIC_OBS_KEYS: List[str] = BUILDING_OBS_KEYS[:3] + BUILDING_OBS_KEYS[13:]
+ENV_OBS_KEYS: List[str] = ["cluster_hvac_power", "OD_temp", "reg_signal"]
+OBS_KEYS: List[str] = BUILDING_OBS_KEYS + ENV_OBS_KEYS
+OBS_COLUMNS: Dict[str, int] = {key: index for index, key in enumerate(OBS_KEYS)}
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.core.environment.clock import DateTimeLike, calendar_fields, to_timestamp
+from app.core.environment.environment_properties import (
+    EnvironmentProperties,
+    TemperatureProperties,
+)
+from app.core.environment.power_grid.signal_calculator import SignalCalculator
+
+SECONDS_IN_MINUTE = 60.0
+HOURS_IN_DAY = 24.0
+
+
+def sinusoidal_od_temp(
+    temp_prop: TemperatureProperties, time_day: Union[float, np.ndarray]
+) -> Union[float, np.ndarray]:
+    """
+    Compute the outdoor temperature of the sinusoidal model, without noise.
+
+    Parameters:
+        temp_prop: TemperatureProperties, the properties of the temperature model.
+        time_day: Union[float, np.ndarray], the time of the day, in hours.
+
+    Returns:
+        temperature: Union[float, np.ndarray], the outdoor temperature, of the shape of time_day.
+    """
+    amplitude = (temp_prop.day_temp - temp_prop.night_temp) / 2.0
+    bias = (temp_prop.day_temp + temp_prop.night_temp) / 2.0
+    delay = -6.0 + temp_prop.phase  # Temperature is coldest at 6am
+    return amplitude * np.sin(2 * np.pi * (time_day + delay) / HOURS_IN_DAY) + bias
+
+
+class EpisodePlanner:
+    """
+    Plans the exogenous trajectories of an episode, which do not depend on the actions of the agents: the outdoor
+    temperature and the shape of the regulation signal (see SignalCalculator.get_signal_shapes).
+
+    They are computed as arrays, by blocks of plan_horizon time steps from the start of the episode, and the step
+    loop only indexes them. The gaussian noise of the outdoor temperature is drawn in bulk, from the same generator as
+    the temperatures computed at each step: the draws only differ in that whole blocks are drawn in advance.
+
+    Attributes:
+        start_date_time (datetime): The start date and time of the episode.
+        time_step (timedelta): The length of each time step.
+        plan_horizon (int): The number of time steps planned at once.
+        rng (np.random.Generator): The generator of the outdoor temperature noise.
+        signal_calculator (Optional[SignalCalculator]): The signal calculator of the episode, set by the PowerGrid.
+        od_temps (np.ndarray): The outdoor temperature at each planned time step.
+        signal_shapes (np.ndarray): The shape of the signal at each planned time step.
+    """
+
+    def __init__(
+        self,
+        env_props: EnvironmentProperties,
+        start_date_time: datetime,
+        rng: np.random.Generator,
+    ) -> None:
+        """
+        Initialize the planner of an episode. Nothing is planned before the first lookup.
+
+        Parameters:
+            env_props: EnvironmentProperties, the environment properties.
+            start_date_time: datetime, the start date and time of the episode (after randomize_date).
+            rng: np.random.Generator, the generator of the outdoor temperature noise (the od_temp stream of the environment).
+        """
+        self.temp_prop = env_props.temp_prop
+        self.start_date_time = start_date_time
+        self.time_step = env_props.time_step
+        self.start_timestamp = to_timestamp(start_date_time)
+        self.plan_horizon = env_props.plan_horizon
+        self.rng = rng
+        self.signal_calculator: Optional[SignalCalculator] = None
+        self.od_temps = np.zeros(0)
+        self.signal_shapes = np.zeros(0)
+
+    def get_step_id(self, date_time: DateTimeLike) -> int:
+        """Return the number of time steps between the start of the episode and date_time."""
+        elapsed = calendar_fields(date_time).timestamp - self.start_timestamp
+        return elapsed // (self.time_step // timedelta(seconds=1))
+
+    def get_date_times(self, start: int, stop: int) -> List[datetime]:
+        """Return the datetimes of the time steps start to stop (excluded)."""
+        return [
+            self.start_date_time + step_id * self.time_step
+            for step_id in range(start, stop)
+        ]
+
+    def plan_od_temps(self, start: int, stop: int) -> np.ndarray:
+        """
+        Compute the outdoor temperature of the time steps start to stop (excluded), with the sinusoidal model of
+        Environment.compute_od_temp.
+
+        Parameters:
+            start: int, the first time step.
+            stop: int, the last time step (excluded).
+
+        Returns:
+            od_temps: np.ndarray, of shape (stop - start,).
+        """
+        time_day = np.array(
+            [
+                date_time.hour + date_time.minute / SECONDS_IN_MINUTE
+                for date_time in self.get_date_times(start, stop)
+            ]
+        )
+        temperature = sinusoidal_od_temp(self.temp_prop, time_day)
+        return temperature + self.rng.normal(0, self.temp_prop.temp_std, stop - start)
+
+    def get_od_temp(self, date_time: DateTimeLike) -> float:
+        """
+        Return the planned outdoor temperature at date_time, planning the next blocks if needed.
+
+        Parameters:
+            date_time: DateTimeLike, a time step of the episode.
+
+        Returns:
+            od_temp: float, the outdoor temperature.
+        """
+        step_id = self.get_step_id(date_time)
+        while step_id >= len(self.od_temps):
+            start = len(self.od_temps)
+            self.od_temps = np.concatenate(
+                (self.od_temps, self.plan_od_temps(start, start + self.plan_horizon))
+            )
+        return float(self.od_temps[step_id])
+
+    def get_signal_shape(self, date_time: DateTimeLike) -> float:
+        """
+        Return the planned shape of the signal at date_time, planning the next blocks if needed.
+
+        Parameters:
+            date_time: DateTimeLike, a time step of the episode.
+
+        Returns:
+            shape: float, the shape of the signal, to give to SignalCalculator.apply_signal_shape.
+        """
+        step_id = self.get_step_id(date_time)
+        while step_id >= len(self.signal_shapes):
+            start = len(self.signal_shapes)
+            self.signal_shapes = np.concatenate(
+                (
+                    self.signal_shapes,
+                    self.signal_calculator.get_signal_shapes(
+                        self.get_date_times(start, start + self.plan_horizon)
+                    ),
+                )
+            )
+        return float(self.signal_shapes[step_id])
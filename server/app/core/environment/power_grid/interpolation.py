@@ -1,14 +1,17 @@
 import csv
 import json
-import random
+import os
 import sys
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from copy import deepcopy
-from datetime import datetime
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from scipy.interpolate import interpn
 
+from app.core.environment.clock import DateTimeLike, calendar_fields
 from app.core.environment.cluster.building import Building
 from app.core.environment.environment_properties import BuildingProperties
 from app.core.environment.power_grid.power_grid_properties import BasePowerProperties
@@ -19,9 +22,334 @@ sys.path.insert(1, "../marl-demandresponse")
 
 SECOND_IN_A_HOUR = 3600
 NB_TIME_STEPS_BY_SIM = 450
+# Dimensions of the grid snapped to the nearest point by interpolate_grid_fast (house thermal ratios and HVAC_power),
+# the others being linearly interpolated
+NEAREST_KEYS = ["Ua_ratio", "Cm_ratio", "Ca_ratio", "Hm_ratio", "HVAC_power"]
 
 
-class PowerInterpolator(object):
+@dataclass(frozen=True)
+class InterpolationGrid:
+    """
+    Monte Carlo grid of the power demand, shared read-only by every PowerInterpolator using the same files.
+
+    Attributes:
+        parameters_dict (Dict[str, List[float]]): The values of each parameter of the grid.
+        dict_keys (List[str]): The parameters, in the order of the grid dimensions.
+        values (np.ndarray): The power demand at each point of the grid, memory-mapped from the data file.
+    """
+
+    parameters_dict: Dict[str, List[float]]
+    dict_keys: List[str]
+    values: np.ndarray
+
+
+# Loaded grids, keyed by the path and modification time of their files
+_grid_cache: Dict[Tuple[Tuple[str, float], ...], InterpolationGrid] = {}
+
+
+def load_grid_parameters(
+    path_parameter_dict: str, path_dict_keys: str
+) -> Tuple[Dict[str, List[float]], List[str]]:
+    """
+    Read the parameters of the Monte Carlo grid.
+
+    Parameters:
+        path_parameter_dict: str, the path to the JSON file of the values of each parameter.
+        path_dict_keys: str, the path to the CSV file of the parameters, in the order of the grid dimensions.
+
+    Returns:
+        parameters_dict: Dict[str, List[float]], the values of each parameter.
+        dict_keys: List[str], the parameters in the order of the grid dimensions.
+    """
+    with open(path_parameter_dict) as json_file:
+        parameters_dict = json.load(json_file)
+    with open(path_dict_keys) as f:
+        reader = csv.reader(f)
+        dict_keys = list(reader)[0]
+    return parameters_dict, dict_keys
+
+
+def load_interpolation_grid(base_power_props: BasePowerProperties) -> InterpolationGrid:
+    """
+    Load the Monte Carlo grid of the base power properties, or return it from the cache if its files did not change.
+
+    The data file is opened with mmap_mode="r": its pages are read on demand and shared through the page cache by
+    every environment and worker process, instead of being copied in the memory of each one. The grid is read-only.
+
+    Parameters:
+        base_power_props: BasePowerProperties, the paths of the data file, parameter dictionary and keys.
+
+    Returns:
+        The InterpolationGrid.
+    """
+    paths = [
+        os.path.realpath(path)
+        for path in (
+            base_power_props.path_datafile,
+            base_power_props.path_parameter_dict,
+            base_power_props.path_dict_keys,
+        )
+    ]
+    cache_key = tuple((path, os.path.getmtime(path)) for path in paths)
+    if cache_key not in _grid_cache:
+        path_datafile, path_parameter_dict, path_dict_keys = paths
+        parameters_dict, dict_keys = load_grid_parameters(
+            path_parameter_dict, path_dict_keys
+        )
+        dimensions_array = [len(parameters_dict[key]) for key in dict_keys]
+        values = np.load(path_datafile, mmap_mode="r").reshape(*dimensions_array, 1)
+
+        # Drop the stale grids loaded from the same files
+        for key in [key for key in _grid_cache if key[0][0] == path_datafile]:
+            del _grid_cache[key]
+        _grid_cache[cache_key] = InterpolationGrid(parameters_dict, dict_keys, values)
+    return _grid_cache[cache_key]
+
+
+def sample_interp_houses(
+    nb_agents: int, interp_nb_agents: int, rng: np.random.Generator
+) -> Tuple[np.ndarray, float]:
+    """
+    Sample the houses whose base power is interpolated, with replacement, when there are more than interp_nb_agents.
+
+    Parameters
+        nb_agents (int): The number of houses.
+        interp_nb_agents (int): The number of houses to interpolate.
+        rng (np.random.Generator): The generator of the sample (the interpolation stream of the environment).
+
+    Returns
+        house_ids (np.ndarray): The ids of the sampled houses.
+        multi_factor (float): The ratio between the number of houses and the number of sampled houses.
+    """
+    if nb_agents <= interp_nb_agents:
+        return np.arange(nb_agents), 1.0
+    house_ids = rng.integers(nb_agents, size=interp_nb_agents)
+    return house_ids, float(nb_agents) / float(interp_nb_agents)
+
+
+@dataclass(frozen=True)
+class BuildingTables:
+    """
+    Reduced interpolation tables of the buildings of a cluster, built by PowerInterpolator.build_tables.
+
+    Attributes:
+        table_ids (np.ndarray): Array of shape (N,), the table of each building.
+        tables (np.ndarray): Array of shape (T, ...), the grid sliced at the nearest thermal ratios and HVAC power of
+            each distinct table, over the linearly interpolated dimensions in the order of dict_keys.
+    """
+
+    table_ids: np.ndarray
+    tables: np.ndarray
+
+
+class InterpolationCache:
+    """
+    Bounded cache of interpolated power demands, keyed by quantized interpolation points, evicting the least
+    recently used entries.
+
+    Attributes:
+        max_size (int): The maximum number of entries.
+        entries (OrderedDict): The cached values, from the least to the most recently used.
+        hits (int): The number of lookups answered by the cache.
+        misses (int): The number of lookups which had to be interpolated.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[int, ...], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, ...]) -> Optional[float]:
+        """Return the cached value of a key and count a hit, or count a miss and return None."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[int, ...], value: float) -> None:
+        """Cache a value, evicting the least recently used entry if the cache is full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the lookups answered by the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class BasePowerInterpolator(ABC):
+    """
+    Estimator of the base power of a cluster from a sample of its houses, shared by PowerInterpolator and
+    SurrogatePowerInterpolator: the houses are turned into points by get_points, and get_powers gives the power
+    demand of each point.
+
+    Attributes:
+    -----------
+    base_power_props : BasePowerProperties
+        An instance of the `BasePowerProperties` class, which contains information about the power grid properties.
+    default_building_props : BuildingProperties
+        An instance of the `BuildingProperties` class, used to compute the thermal ratios of the houses.
+    dict_keys : List[str]
+        The parameters of the points, in the order of their columns.
+    """
+
+    base_power_props: BasePowerProperties
+    default_building_props: BuildingProperties
+    dict_keys: List[str]
+
+    @abstractmethod
+    def get_powers(
+        self,
+        points: np.ndarray,
+        building_tables: Optional["BuildingTables"] = None,
+        building_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Power demand of each point.
+
+        Parameters
+            points (np.ndarray): Array of shape (M, len(dict_keys)), as built by get_points.
+            building_tables (Optional[BuildingTables]): Reduced tables of the buildings (see PowerInterpolator.build_tables).
+            building_ids (Optional[np.ndarray]): Array of shape (M,), the building of each point, required with building_tables.
+
+        Returns
+            powers (np.ndarray): Array of shape (M,).
+        """
+
+    def get_points(
+        self,
+        date_time: DateTimeLike,
+        current_od_temp: float,
+        Ua: np.ndarray,
+        Cm: np.ndarray,
+        Ca: np.ndarray,
+        Hm: np.ndarray,
+        indoor_temp: np.ndarray,
+        mass_temp: np.ndarray,
+        target_temp: np.ndarray,
+        cooling_capacity: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Build the interpolation points of several houses from their properties, as interpolate_power does for each house.
+
+        Parameters
+            date_time (DateTimeLike): The current date and time (or its calendar fields).
+            current_od_temp (float): The current outdoor temperature.
+            Ua, Cm, Ca, Hm, indoor_temp, mass_temp, target_temp, cooling_capacity (np.ndarray): Arrays of shape (M,), the properties and state of the houses.
+
+        Returns
+            points (np.ndarray): Array of shape (M, len(dict_keys)), to be used by interpolate_points.
+        """
+        if self.default_building_props.solar_gain:
+            fields = calendar_fields(date_time)
+            date = fields.day_of_year
+            hour = fields.seconds_of_day
+        else:  # No solar gain - make it think it is midnight
+            date = 0.0
+            hour = 0.0
+
+        columns = {
+            "Ua_ratio": Ua / self.default_building_props.Ua,
+            "Cm_ratio": Cm / self.default_building_props.Cm,
+            "Ca_ratio": Ca / self.default_building_props.Ca,
+            "Hm_ratio": Hm / self.default_building_props.Hm,
+            "air_temp": indoor_temp - target_temp,
+            "mass_temp": mass_temp - target_temp,
+            "OD_temp": current_od_temp - target_temp,
+            "HVAC_power": cooling_capacity,
+            "hour": hour,
+            "date": date,
+        }
+        points = np.empty((len(Ua), len(self.dict_keys)))
+        for dim, key in enumerate(self.dict_keys):
+            points[:, dim] = columns[key]
+        return points
+
+    def interpolate_power(
+        self,
+        date_time: DateTimeLike,
+        current_od_temp: float,
+        interp_nb_agents,
+        buildings: List[Building],
+        rng: np.random.Generator,
+        building_tables: Optional[BuildingTables] = None,
+    ) -> float:
+        """
+        Given a value, returns the closest values from a sorted numpy array. If value is inside the list range, return one lower and one higher. If all are lower or higher, return the two extreme values.
+
+        Parameters
+            array (numpy.ndarray): A sorted numpy array.
+            value (float): The value for which to find the closest values.
+        Returns
+            closest (numpy.ndarray): An array containing the two closest values.
+        """
+        house_ids, multi_factor = sample_interp_houses(
+            len(buildings), interp_nb_agents, rng
+        )
+        houses = [buildings[house_id] for house_id in house_ids]
+        # TODO: This is ugly as in the Monte Carlo, we compute the ratio based on the Ua in config. We should change the dict for absolute numbers.
+        return self.interpolate_sample(
+            date_time,
+            current_od_temp,
+            (
+                np.array([house.init_props.Ua for house in houses]),
+                np.array([house.init_props.Cm for house in houses]),
+                np.array([house.init_props.Ca for house in houses]),
+                np.array([house.init_props.Hm for house in houses]),
+                np.array([house.indoor_temp for house in houses]),
+                np.array([house.current_mass_temp for house in houses]),
+                np.array([house.init_props.target_temp for house in houses]),
+                np.array([house.hvac.init_props.cooling_capacity for house in houses]),
+            ),
+            building_tables,
+            house_ids,
+            multi_factor,
+        )
+
+    def interpolate_sample(
+        self,
+        date_time: DateTimeLike,
+        current_od_temp: float,
+        properties: Tuple[np.ndarray, ...],
+        building_tables: Optional[BuildingTables],
+        house_ids: np.ndarray,
+        multi_factor: float,
+    ) -> float:
+        """
+        Interpolate the base power of a cluster from the houses sampled by sample_interp_houses. Shared by
+        interpolate_power and BatchedEnvironment.
+
+        Parameters
+            date_time (DateTimeLike): The current date and time (or its calendar fields).
+            current_od_temp (float): The current outdoor temperature.
+            properties (Tuple[np.ndarray, ...]): The arrays of the sampled houses given to get_points (Ua, Cm, Ca, Hm, indoor_temp, mass_temp, target_temp, cooling_capacity).
+            building_tables (Optional[BuildingTables]): The interpolation tables of every house of the cluster, in interpolation mode.
+            house_ids (np.ndarray): The ids of the sampled houses.
+            multi_factor (float): The ratio between the number of houses and the number of sampled houses.
+
+        Returns
+            base_power (float): The interpolated base power of the cluster.
+        """
+        points = self.get_points(date_time, current_od_temp, *properties)
+        # Adding the interpolated power for each house
+        base_power = float(np.sum(self.get_powers(points, building_tables, house_ids)))
+        return base_power * multi_factor
+
+
+class PowerInterpolator(BasePowerInterpolator):
     """
     Class that allows to interpolate the power demand based on the provided data.
 
@@ -42,9 +370,11 @@ class PowerInterpolator(object):
     dimensions_array : List[int]
         A list that contains the number of dimensions for each parameter in the `parameters_dict` dictionary.
     values : np.ndarray
-        A NumPy array that contains the power demand values for each point in the parameter space.
+        A read-only NumPy array, memory-mapped and shared between the interpolators, that contains the power demand values for each point in the parameter space.
     default_building_props : BuildingProperties
         An instance of the `BuildingProperties` class, which contains information about the building properties.
+    cache : Optional[InterpolationCache]
+        The cache of interpolate_points_cached, None if disabled (interp_cache_size of 0).
     """
 
     def __init__(
@@ -63,11 +393,9 @@ class PowerInterpolator(object):
             None
         """
         self.base_power_props = base_power_props
-        with open(base_power_props.path_parameter_dict) as json_file:
-            self.parameters_dict = json.load(json_file)
-        with open(base_power_props.path_dict_keys) as f:
-            reader = csv.reader(f)
-            self.dict_keys = list(reader)[0]
+        grid = load_interpolation_grid(base_power_props)
+        self.parameters_dict = grid.parameters_dict
+        self.dict_keys = grid.dict_keys
 
         self.nb_params = []
         for key in self.dict_keys:
@@ -85,11 +413,26 @@ class PowerInterpolator(object):
             len(self.parameters_dict[key]) for key in self.dict_keys
         ]
 
-        self.values = np.load(base_power_props.path_datafile).reshape(
-            *self.dimensions_array, 1
-        )
+        self.values = grid.values
         self.default_building_props = default_building_props
 
+        # Precomputed grid for the batch interpolation
+        self.grid_points = [
+            np.array(self.parameters_dict[key], dtype=float) for key in self.dict_keys
+        ]
+        self.lower_bounds = np.array([np.min(points) for points in self.grid_points])
+        self.upper_bounds = np.array([np.max(points) for points in self.grid_points])
+        self.nearest_dims = [self.dict_keys.index(key) for key in NEAREST_KEYS]
+        self.linear_dims = [
+            dim for dim in range(len(self.dict_keys)) if dim not in self.nearest_dims
+        ]
+
+        self.cache = (
+            InterpolationCache(base_power_props.interp_cache_size)
+            if base_power_props.interp_cache_size > 0
+            else None
+        )
+
     def param2index(self, point_dict):
         """
         Converts a dictionary of power parameters to an index that can be used to extract power data from the loaded data files.
@@ -177,77 +520,209 @@ class PowerInterpolator(object):
         # print(result)
         return result
 
-    def get_two_closest(self, array, value):
-        "Given a value, return the closest values from a sorted numpy array. If value is inside the list range, return one lower and one higher. If all are lower or higher, return the two extreme values."
-        distances = np.abs(array - value)
-        indices_two_closest = np.argsort(distances)[:2]
-        return array[indices_two_closest]
+    def interpolate_points(
+        self,
+        points: np.ndarray,
+        building_tables: Optional["BuildingTables"] = None,
+        building_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Batch version of clip_interpolation_point followed by interpolate_grid_fast: nearest neighbour for the house
+        thermal parameters and the HVAC power, multilinear interpolation for the other parameters.
 
-    def interpolate_power(
+        Parameters
+            points (np.ndarray): Array of shape (M, len(dict_keys)), one point per row, columns in the order of dict_keys.
+            building_tables (Optional[BuildingTables]): Reduced tables of the buildings (see build_tables). When given, the nearest parameters are not looked up again and the points are interpolated in the table of their building.
+            building_ids (Optional[np.ndarray]): Array of shape (M,), the building of each point, required with building_tables.
+
+        Returns
+            result (np.ndarray): Array of shape (M,), the interpolated power demand of each point.
+        """
+        points = np.clip(points, self.lower_bounds, self.upper_bounds)
+        if building_tables is None:
+            values = self.values[..., 0]
+            # Index of the nearest grid point (first one on ties, like np.argmin)
+            indices = [None] * len(self.dict_keys)
+            for dim in self.nearest_dims:
+                indices[dim] = np.argmin(
+                    np.abs(self.grid_points[dim] - points[:, dim, np.newaxis]), axis=1
+                )
+            linear_axes = self.linear_dims
+        else:
+            values = building_tables.tables
+            indices = [building_tables.table_ids[building_ids]] + [None] * len(
+                self.linear_dims
+            )
+            linear_axes = range(1, len(self.linear_dims) + 1)
+
+        # Lower corner of the grid cell and position within the cell
+        lower_ids = []
+        fractions = []
+        for dim in self.linear_dims:
+            grid = self.grid_points[dim]
+            lower_id = np.clip(
+                np.searchsorted(grid, points[:, dim], side="right") - 1,
+                0,
+                len(grid) - 2,
+            )
+            lower_ids.append(lower_id)
+            fractions.append(
+                (points[:, dim] - grid[lower_id])
+                / (grid[lower_id + 1] - grid[lower_id])
+            )
+
+        nb_points = points.shape[0]
+        result = np.zeros(nb_points)
+        for corner in range(2 ** len(self.linear_dims)):
+            weight = np.ones(nb_points)
+            for bit, axis in enumerate(linear_axes):
+                upper = (corner >> bit) & 1
+                indices[axis] = lower_ids[bit] + upper
+                weight *= fractions[bit] if upper else 1 - fractions[bit]
+            result += weight * values[tuple(indices)]
+        return result
+
+    def interpolate_points_cached(
         self,
-        date_time: datetime,
-        current_od_temp: float,
-        interp_nb_agents,
-        buildings: List[Building],
-    ) -> float:
+        points: np.ndarray,
+        building_tables: Optional["BuildingTables"] = None,
+        building_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
         """
-        Given a value, returns the closest values from a sorted numpy array. If value is inside the list range, return one lower and one higher. If all are lower or higher, return the two extreme values.
+        Same as interpolate_points, with the linearly interpolated parameters quantized to interp_cache_resolution grid
+        cells, and the results cached. The points with the same nearest thermal ratios and HVAC power and the same
+        quantized parameters share one interpolation, made at the quantized point. Without cache, the points are
+        interpolated exactly.
 
         Parameters
-            array (numpy.ndarray): A sorted numpy array.
-            value (float): The value for which to find the closest values.
+            points (np.ndarray): Array of shape (M, len(dict_keys)), one point per row, columns in the order of dict_keys.
+            building_tables (Optional[BuildingTables]): Reduced tables of the buildings, see interpolate_points.
+            building_ids (Optional[np.ndarray]): Array of shape (M,), the building of each point, required with building_tables.
+
         Returns
-            closest (numpy.ndarray): An array containing the two closest values.
+            result (np.ndarray): Array of shape (M,), the interpolated power demand of each point.
         """
-        base_power = 0.0
+        if self.cache is None:
+            return self.interpolate_points(points, building_tables, building_ids)
+
+        points = np.clip(points, self.lower_bounds, self.upper_bounds)
+        resolution = self.base_power_props.interp_cache_resolution
+        nearest_ids = [
+            np.argmin(
+                np.abs(self.grid_points[dim] - points[:, dim, np.newaxis]), axis=1
+            )
+            for dim in self.nearest_dims
+        ]
+        # Position of the points in grid cells, rounded to the resolution
+        quantized_ids = [
+            np.rint(
+                np.interp(
+                    points[:, dim],
+                    self.grid_points[dim],
+                    np.arange(len(self.grid_points[dim])),
+                )
+                / resolution
+            ).astype(int)
+            for dim in self.linear_dims
+        ]
+        keys = np.stack(nearest_ids + quantized_ids, axis=1).tolist()
+
+        result = np.empty(points.shape[0])
+        missing = []
+        for point_id, key in enumerate(keys):
+            value = self.cache.get(tuple(key))
+            if value is None:
+                missing.append(point_id)
+            else:
+                result[point_id] = value
+
+        if missing:
+            quantized_points = points[missing]
+            for dim, dim_ids in zip(self.linear_dims, quantized_ids):
+                grid = self.grid_points[dim]
+                quantized_points[:, dim] = np.interp(
+                    dim_ids[missing] * resolution, np.arange(len(grid)), grid
+                )
+            result[missing] = self.interpolate_points(
+                quantized_points,
+                building_tables,
+                None if building_ids is None else building_ids[missing],
+            )
+            for point_id in missing:
+                self.cache.put(tuple(keys[point_id]), result[point_id])
+        return result
 
-        if self.default_building_props.solar_gain:
-            point = {
-                "date": date_time.timetuple().tm_yday,
-                "hour": (
-                    date_time
-                    - date_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                ).total_seconds(),
-            }
-        else:  # No solar gain - make it think it is midnight
-            point = {
-                "date": 0.0,
-                "hour": 0.0,
-            }
-
-        all_ids = list(range(len(buildings)))
-        if len(all_ids) <= interp_nb_agents:
-            interp_house_ids = all_ids
-            multi_factor = 1.0
-        else:
-            interp_house_ids = random.choices(all_ids, k=interp_nb_agents)
-            multi_factor = float(len(all_ids)) / float(interp_nb_agents)
-        # Adding the interpolated power for each house
-        for house_id in interp_house_ids:
-            house = buildings[house_id]
-            point["Ua_ratio"] = (
-                house.init_props.Ua / self.default_building_props.Ua
-            )  # TODO: This is ugly as in the Monte Carlo, we compute the ratio based on the Ua in config. We should change the dict for absolute numbers.
-            point["Cm_ratio"] = house.init_props.Cm / self.default_building_props.Cm
-            point["Ca_ratio"] = house.init_props.Ca / self.default_building_props.Ca
-            point["Hm_ratio"] = house.init_props.Hm / self.default_building_props.Hm
-            point["air_temp"] = house.indoor_temp - house.init_props.target_temp
-            point["mass_temp"] = house.current_mass_temp - house.init_props.target_temp
-            point["OD_temp"] = current_od_temp - house.init_props.target_temp
-            point["HVAC_power"] = house.hvac.init_props.cooling_capacity
-            point = self.clip_interpolation_point(point)
-            point = sort_dict_keys(point, self.dict_keys)
-            base_power += self.interpolate_grid_fast(point)
-        base_power *= multi_factor
-
-        return base_power
+    def get_powers(
+        self,
+        points: np.ndarray,
+        building_tables: Optional["BuildingTables"] = None,
+        building_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Interpolate the power demand of the points in the grid, see interpolate_points_cached."""
+        return self.interpolate_points_cached(points, building_tables, building_ids)
+
+    def build_tables(
+        self,
+        Ua: np.ndarray,
+        Cm: np.ndarray,
+        Ca: np.ndarray,
+        Hm: np.ndarray,
+        cooling_capacity: np.ndarray,
+    ) -> "BuildingTables":
+        """
+        Slice the grid at the nearest thermal ratios and HVAC power of each building, which do not change within an
+        episode. Buildings snapped to the same grid point share the same table.
+
+        Parameters
+            Ua, Cm, Ca, Hm, cooling_capacity (np.ndarray): Arrays of shape (N,), the properties of the buildings.
+
+        Returns
+            building_tables (BuildingTables): The reduced tables, to be given to interpolate_points.
+        """
+        columns = {
+            "Ua_ratio": Ua / self.default_building_props.Ua,
+            "Cm_ratio": Cm / self.default_building_props.Cm,
+            "Ca_ratio": Ca / self.default_building_props.Ca,
+            "Hm_ratio": Hm / self.default_building_props.Hm,
+            "HVAC_power": cooling_capacity,
+        }
+        nearest_ids = np.stack(
+            [
+                np.argmin(
+                    np.abs(
+                        self.grid_points[dim]
+                        - np.clip(
+                            np.asarray(columns[self.dict_keys[dim]], dtype=float),
+                            self.lower_bounds[dim],
+                            self.upper_bounds[dim],
+                        )[:, np.newaxis]
+                    ),
+                    axis=1,
+                )
+                for dim in self.nearest_dims
+            ],
+            axis=1,
+        )
+        unique_ids, table_ids = np.unique(nearest_ids, axis=0, return_inverse=True)
+
+        values = self.values[..., 0]
+        # Move the nearest dimensions first, so that each table is a contiguous block over the linear dimensions
+        values = np.moveaxis(values, self.nearest_dims, range(len(self.nearest_dims)))
+        tables = np.ascontiguousarray(values[tuple(unique_ids.T)])
+        return BuildingTables(table_ids=table_ids.reshape(-1), tables=tables)
+
+    def get_two_closest(self, array, value):
+        "Given a value, return the closest values from a sorted numpy array. If value is inside the list range, return one lower and one higher. If all are lower or higher, return the two extreme values."
+        distances = np.abs(array - value)
+        indices_two_closest = np.argsort(distances)[:2]
+        return array[indices_two_closest]
 
     def clip_interpolation_point(self, point: Dict[str, float]) -> Dict[str, float]:
         """
         Interpolates the power demand for a given set of power parameters using the loaded data files.
 
         Parameters
-            date_time (datetime): A datetime object containing the current date and time.
+            date_time (DateTimeLike): The current date and time (or its calendar fields).
             current_od_temp (float): The current outdoor temperature.
             interp_nb_agents (int): The number of buildings to use for interpolation.
             buildings (List[Building]): A list of Building objects representing the buildings in the simulation.
@@ -0,0 +1,266 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.environment.cluster.vectorized_cluster import VectorizedCluster
+from app.core.environment.environment_properties import ClusterPropreties
+from app.core.environment.power_grid.interpolation import (
+    NB_TIME_STEPS_BY_SIM,
+    load_grid_parameters,
+)
+from app.core.environment.power_grid.power_grid_properties import BasePowerProperties
+from app.core.environment.random_streams import spawn_streams
+
+# Child of the "app" logger, without importing its uvicorn configuration in the worker processes
+logger = logging.getLogger(__name__)
+
+# Number of last time steps whose running averages are averaged, to stabilize the result
+NB_TIME_STEPS_AVG = 10
+# Dates of the grid are given in days since this date, hours in seconds since midnight
+START_DATE = datetime(2021, 1, 1)
+# Parameters shared by every house of a replica, which must be the last dimensions of the grid
+DATE_TIME_KEYS = ["hour", "date"]
+
+
+def simulate_combinations(
+    parameters_dict: Dict[str, List[float]],
+    dict_keys: List[str],
+    date_time_ids: Sequence[int],
+    cluster_props: ClusterPropreties,
+    time_step: timedelta,
+    nb_time_steps: int = NB_TIME_STEPS_BY_SIM,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Compute the average power of a bang-bang controlled house for every combination of the house parameters, at some
+    of the (hour, date) combinations of the grid.
+
+    Every combination is an independent house without noise: they are all simulated at once, as a VectorizedCluster
+    with one replica per (hour, date) and one building per combination of the other parameters. The random streams of
+    each replica are spawned from seed with its (hour, date) index, so that a combination gives the same result in
+    any shard.
+
+    Parameters:
+        parameters_dict: Dict[str, List[float]], the values of each parameter of the grid.
+        dict_keys: List[str], the parameters in the order of the grid dimensions, ending with DATE_TIME_KEYS.
+        date_time_ids: Sequence[int], flat indices of the (hour, date) combinations to simulate.
+        cluster_props: ClusterPropreties, the properties of the default house and HVAC.
+        time_step: timedelta, the time step of the simulation.
+        nb_time_steps: int, the number of time steps simulated for each combination.
+        seed: int, the root seed of the random streams.
+
+    Returns:
+        powers: np.ndarray, of shape (len(date_time_ids), number of combinations of the other parameters).
+    """
+    if dict_keys[-len(DATE_TIME_KEYS) :] != DATE_TIME_KEYS:
+        raise ValueError(
+            "The last dimensions of the grid must be {}, got {}".format(
+                DATE_TIME_KEYS, dict_keys
+            )
+        )
+    house_keys = dict_keys[: -len(DATE_TIME_KEYS)]
+    house_grid = np.meshgrid(
+        *[np.array(parameters_dict[key], dtype=float) for key in house_keys],
+        indexing="ij",
+    )
+    columns = {key: values.reshape(-1) for key, values in zip(house_keys, house_grid)}
+
+    cluster_props = cluster_props.copy(deep=True)
+    cluster_props.nb_agents = len(columns["Ua_ratio"])
+    cluster = VectorizedCluster(
+        cluster_props,
+        nb_replicas=len(date_time_ids),
+        streams=spawn_streams(seed, date_time_ids),
+    )
+    house_prop = cluster_props.house_prop
+    cluster.Ua[:] = house_prop.Ua * columns["Ua_ratio"]
+    cluster.Cm[:] = house_prop.Cm * columns["Cm_ratio"]
+    cluster.Ca[:] = house_prop.Ca * columns["Ca_ratio"]
+    cluster.Hm[:] = house_prop.Hm * columns["Hm_ratio"]
+    cluster.cooling_capacity[:] = columns["HVAC_power"]
+    cluster.lockout_duration[:] = 1
+    cluster.indoor_temp[:] = cluster.target_temp + columns["air_temp"]
+    cluster.mass_temp[:] = cluster.target_temp + columns["mass_temp"]
+    od_temp = cluster.target_temp + columns["OD_temp"]
+
+    nb_dates = len(parameters_dict["date"])
+    date_times = []
+    for date_time_id in date_time_ids:
+        hour_id, date_id = divmod(date_time_id, nb_dates)
+        date_times.append(
+            START_DATE
+            + timedelta(
+                days=parameters_dict["date"][date_id],
+                seconds=parameters_dict["hour"][hour_id],
+            )
+        )
+
+    total_power = np.zeros(cluster.shape)
+    average_power = np.zeros(cluster.shape)
+    for step in range(nb_time_steps):
+        actions = cluster.indoor_temp > cluster.target_temp
+        date_times = [date_time + time_step for date_time in date_times]
+        cluster.advance(od_temp, actions, date_times, time_step)
+        total_power += cluster.get_power_consumption()
+        # The average of the NB_TIME_STEPS_AVG last running averages
+        if step >= nb_time_steps - NB_TIME_STEPS_AVG:
+            average_power += total_power / ((step + 1) * NB_TIME_STEPS_AVG)
+    return average_power
+
+
+def shard_path(output_dir: str, start: int, stop: int) -> str:
+    """Path of the shard holding the (hour, date) combinations start to stop (excluded)."""
+    return os.path.join(output_dir, f"shard_{start}_{stop}.npy")
+
+
+def simulate_shard(
+    parameters_dict: Dict[str, List[float]],
+    dict_keys: List[str],
+    start: int,
+    stop: int,
+    cluster_props: ClusterPropreties,
+    time_step: timedelta,
+    nb_time_steps: int,
+    output_dir: str,
+    seed: int = 0,
+) -> str:
+    """Simulate the (hour, date) combinations start to stop and save them as a shard. Returns the shard path."""
+    powers = simulate_combinations(
+        parameters_dict,
+        dict_keys,
+        range(start, stop),
+        cluster_props,
+        time_step,
+        nb_time_steps,
+        seed,
+    )
+    path = shard_path(output_dir, start, stop)
+    # Written under a temporary name, so that an interrupted run never leaves a partial shard
+    temp_path = path[: -len(".npy")] + ".tmp.npy"
+    np.save(temp_path, powers)
+    os.replace(temp_path, path)
+    return path
+
+
+def generate_grid(
+    base_power_props: BasePowerProperties,
+    cluster_props: ClusterPropreties,
+    time_step: timedelta,
+    output_dir: str,
+    chunk_size: int = 1,
+    nb_workers: Optional[int] = None,
+    nb_time_steps: int = NB_TIME_STEPS_BY_SIM,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Simulate the Monte Carlo grid described by the parameter files of base_power_props, in shards of chunk_size
+    (hour, date) combinations spread over a process pool.
+
+    Shards already in output_dir are not simulated again, so that an interrupted run can be resumed.
+
+    Parameters:
+        base_power_props: BasePowerProperties, the paths to the parameter dictionary and keys of the grid.
+        cluster_props: ClusterPropreties, the properties of the default house and HVAC.
+        time_step: timedelta, the time step of the simulation.
+        output_dir: str, the directory of the shards.
+        chunk_size: int, the number of (hour, date) combinations of each shard.
+        nb_workers: Optional[int], the number of worker processes (defaults to the cpu count).
+        nb_time_steps: int, the number of time steps simulated for each combination.
+        seed: int, the root seed of the random streams (see simulate_combinations).
+
+    Returns:
+        shard_paths: List[str], the paths of every shard of the grid.
+    """
+    parameters_dict, dict_keys = load_grid_parameters(
+        base_power_props.path_parameter_dict, base_power_props.path_dict_keys
+    )
+    nb_date_times = int(np.prod([len(parameters_dict[key]) for key in DATE_TIME_KEYS]))
+    os.makedirs(output_dir, exist_ok=True)
+
+    chunks = [
+        (start, min(start + chunk_size, nb_date_times))
+        for start in range(0, nb_date_times, chunk_size)
+    ]
+    remaining = [
+        chunk for chunk in chunks if not os.path.exists(shard_path(output_dir, *chunk))
+    ]
+    logger.info(
+        f"Monte Carlo grid: {len(chunks) - len(remaining)}/{len(chunks)} shards already done"
+    )
+
+    start_time = time.time()
+    with ProcessPoolExecutor(nb_workers) as executor:
+        futures = [
+            executor.submit(
+                simulate_shard,
+                parameters_dict,
+                dict_keys,
+                start,
+                stop,
+                cluster_props,
+                time_step,
+                nb_time_steps,
+                output_dir,
+                seed,
+            )
+            for start, stop in remaining
+        ]
+        for nb_done, future in enumerate(futures, 1):
+            future.result()
+            logger.info(
+                f"Monte Carlo grid: shard {nb_done}/{len(remaining)} done in {timedelta(seconds=round(time.time() - start_time))}"
+            )
+    return [shard_path(output_dir, *chunk) for chunk in chunks]
+
+
+def merge_shards(
+    base_power_props: BasePowerProperties, output_dir: str, chunk_size: int = 1
+) -> None:
+    """
+    Merge the shards of generate_grid into the data file of base_power_props, in the flat layout read by
+    PowerInterpolator. The shards are copied one at a time into a memory-mapped output, so that the whole grid is
+    never held in memory.
+
+    Parameters:
+        base_power_props: BasePowerProperties, the paths to the parameter files and to the data file to write.
+        output_dir: str, the directory of the shards.
+        chunk_size: int, the number of (hour, date) combinations of each shard, as given to generate_grid.
+    """
+    parameters_dict, dict_keys = load_grid_parameters(
+        base_power_props.path_parameter_dict, base_power_props.path_dict_keys
+    )
+    nb_date_times = int(np.prod([len(parameters_dict[key]) for key in DATE_TIME_KEYS]))
+    nb_houses = int(
+        np.prod(
+            [len(parameters_dict[key]) for key in dict_keys[: -len(DATE_TIME_KEYS)]]
+        )
+    )
+    chunks = [
+        (start, min(start + chunk_size, nb_date_times))
+        for start in range(0, nb_date_times, chunk_size)
+    ]
+    missing = [
+        shard_path(output_dir, *chunk)
+        for chunk in chunks
+        if not os.path.exists(shard_path(output_dir, *chunk))
+    ]
+    if missing:
+        raise FileNotFoundError(f"Missing Monte Carlo shards: {missing}")
+
+    path_datafile = base_power_props.path_datafile
+    temp_path = path_datafile[: -len(".npy")] + ".tmp.npy"
+    merged = np.lib.format.open_memmap(
+        temp_path, mode="w+", dtype=float, shape=(nb_houses * nb_date_times,)
+    )
+    # The (hour, date) dimensions are the last ones: the grid is a (houses, date times) matrix
+    grid = merged.reshape(nb_houses, nb_date_times)
+    for start, stop in chunks:
+        grid[:, start:stop] = np.load(shard_path(output_dir, start, stop)).T
+    merged.flush()
+    del grid, merged
+    os.replace(temp_path, path_datafile)
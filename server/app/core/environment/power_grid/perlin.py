@@ -1,3 +1,7 @@
+import random
+from typing import Dict, List
+
+import numpy as np
 from matplotlib import pyplot as plt
 from perlin_noise import PerlinNoise
 
@@ -12,6 +16,7 @@ class Perlin:
         octaves_step (float): The step between each octave for the Perlin noise.
         period (float): The period of the Perlin noise.
         seed (int): The seed for the Perlin noise.
+        gradients (List[Dict[int, float]]): The gradients of each octave at the integer coordinates, cached by get_gradients.
     """
 
     def __init__(self, amplitude, nb_octaves, octaves_step, period, seed):
@@ -37,6 +42,8 @@ class Perlin:
             self.noise_list.append(
                 PerlinNoise(octaves=2**i * octaves_step, seed=seed)
             )
+        self.gradients: List[Dict[int, float]] = [{} for _ in range(self.nb_octaves)]
+        self.rng = random.Random()
 
     def calculate_noise(self, x) -> float:
         """
@@ -55,6 +62,56 @@ class Perlin:
         noise += self.noise_list[-1].noise(x / self.period) / (2**self.nb_octaves - 1)
         return self.amplitude * noise
 
+    def get_gradients(self, octave: int, coordinates: np.ndarray) -> np.ndarray:
+        """
+        Get the gradients of an octave at integer coordinates, drawn like perlin_noise does (a generator seeded
+        with the seed of the octave times the hash of the coordinate), without touching the global random state.
+
+        Parameters:
+            octave (int): The index of the octave.
+            coordinates (np.ndarray): The integer coordinates.
+
+        Returns:
+            np.ndarray: The gradients, of the same shape as coordinates.
+        """
+        cache = self.gradients[octave]
+        seed = self.noise_list[octave].seed
+        unique_coordinates, inverse = np.unique(coordinates, return_inverse=True)
+        gradients = np.empty(len(unique_coordinates))
+        for index, coordinate in enumerate(unique_coordinates.tolist()):
+            if coordinate not in cache:
+                self.rng.seed(seed * max(1, int(abs(coordinate + 1))))
+                cache[coordinate] = self.rng.uniform(-1, 1)
+            gradients[index] = cache[coordinate]
+        return gradients[inverse].reshape(np.shape(coordinates))
+
+    def calculate_noise_array(self, x: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of calculate_noise.
+
+        Parameters:
+            x (np.ndarray): The input values.
+
+        Returns:
+            np.ndarray: The Perlin noise value for each input value.
+        """
+        x = np.asarray(x, dtype=float)
+        noise = np.zeros(x.shape)
+        for j, octave_noise in enumerate(self.noise_list):
+            coordinates = x / self.period * octave_noise.octaves
+            lower = np.floor(coordinates)
+            value = np.zeros(x.shape)
+            for corner in (lower, lower + 1):
+                dist = coordinates - corner
+                weight = 1 - np.abs(dist)
+                fade = 6 * weight**5 - 15 * weight**4 + 10 * weight**3
+                value += fade * self.get_gradients(j, corner.astype(int)) * dist
+            if j < self.nb_octaves - 1:
+                noise += value / (2**j)
+            else:
+                noise += value / (2**self.nb_octaves - 1)
+        return self.amplitude * noise
+
     def plot_noise(self, timesteps=500):
         """
         Plot the Perlin noise for the given number of timesteps.
@@ -1,14 +1,21 @@
-import random
-from datetime import datetime, timedelta
-from typing import TypedDict
+from datetime import timedelta
+from typing import Optional, TypedDict
 
 import numpy as np
 
+from app.core.environment.clock import DateTimeLike
 from app.core.environment.cluster.cluster import Cluster
 from app.core.environment.environment_properties import EnvironmentObsDict
-from app.core.environment.power_grid.interpolation import PowerInterpolator
+from app.core.environment.episode_planner import EpisodePlanner
+from app.core.environment.power_grid.interpolation import (
+    BasePowerInterpolator,
+    BuildingTables,
+    PowerInterpolator,
+)
 from app.core.environment.power_grid.power_grid_properties import PowerGridProperties
 from app.core.environment.power_grid.signal_calculator import SignalCalculator
+from app.core.environment.power_grid.surrogate import SurrogatePowerInterpolator
+from app.core.environment.random_streams import RandomStreams
 from app.core.environment.simulatable import Simulatable
 
 
@@ -18,6 +25,57 @@ class PowerGridObsDict(TypedDict):
     reg_signal: float
 
 
+def draw_artificial_ratio(
+    artificial_ratio: float, ratio_range: float, rng: np.random.Generator
+) -> float:
+    """
+    Multiply the artificial ratio of the signal by a random number between 1/ratio_range and ratio_range, drawn on a
+    logarithmic scale. Called at each reset, on the ratio of the previous episode.
+
+    Parameters:
+        artificial_ratio (float): The artificial ratio of the previous episode.
+        ratio_range (float): The artificial signal ratio range.
+        rng (np.random.Generator): The generator of the ratio (the power grid stream of the environment).
+
+    Returns:
+        float: The artificial ratio of the new episode.
+    """
+    return artificial_ratio * ratio_range ** (rng.random() * 2 - 1)
+
+
+def compute_grid_signal(
+    signal_calculator: SignalCalculator,
+    planner: Optional[EpisodePlanner],
+    base_power: float,
+    date_time: DateTimeLike,
+    artificial_ratio: float,
+    max_power: float,
+) -> float:
+    """
+    Compute the regulation signal of a time step from the base power, capped to the maximum power of the cluster.
+
+    Parameters:
+        signal_calculator (SignalCalculator): The signal calculator of the episode.
+        planner (Optional[EpisodePlanner]): The planner of the shape of the signal, None to compute it at each step.
+        base_power (float): The base power of the time step.
+        date_time (DateTimeLike): The current datetime (or its calendar fields).
+        artificial_ratio (float): The artificial ratio of the episode.
+        max_power (float): The maximum power of the cluster.
+
+    Returns:
+        float: The regulation signal.
+    """
+    if planner is None:
+        signal = signal_calculator.compute_signal(base_power, date_time)
+    else:
+        signal = signal_calculator.apply_signal_shape(
+            base_power, planner.get_signal_shape(date_time)
+        )
+    # Artificial_ratio should be 1. Only change for experimental purposes.
+    signal = signal * artificial_ratio
+    return np.minimum(signal, max_power)
+
+
 class PowerGrid(Simulatable):
     """
     Simulatable object representing a power grid, with functionality to update the power supply based on the current environment and compute a signal.
@@ -28,7 +86,10 @@ class PowerGrid(Simulatable):
         current_signal (float): The current signal of the power grid.
         cluster (Cluster): The cluster in which the power grid is situated.
         signal_calculator (SignalCalculator): An object used to compute the current signal of the power grid.
-        power_interpolator (PowerInterpolator): An object used to interpolate the power of the power grid.
+        power_interpolator (BasePowerInterpolator): An object used to interpolate the power of the power grid (PowerInterpolator or SurrogatePowerInterpolator).
+        building_tables (Optional[BuildingTables]): The reduced interpolation tables of the buildings, built once per episode (None in surrogate mode).
+        planner (Optional[EpisodePlanner]): The planner of the shape of the signal, when it is not computed at each step.
+        streams (RandomStreams): The random streams of the environment, shared with the cluster (power_grid and interpolation generators).
     """
 
     init_props: PowerGridProperties
@@ -36,55 +97,97 @@ class PowerGrid(Simulatable):
     current_signal: float
     cluster: Cluster
     signal_calculator: SignalCalculator
-    power_interpolator: PowerInterpolator
+    power_interpolator: BasePowerInterpolator
+    building_tables: Optional[BuildingTables]
+    planner: Optional[EpisodePlanner]
+    streams: RandomStreams
 
-    def __init__(self, power_grid_props: PowerGridProperties, cluster: Cluster) -> None:
+    def __init__(
+        self,
+        power_grid_props: PowerGridProperties,
+        cluster: Cluster,
+        planner: Optional[EpisodePlanner] = None,
+    ) -> None:
         """Initialize a new instance of the PowerGrid class."""
         # TODO: use parser service
         self.init_props = power_grid_props
-        # Base ratio, randomly multiplying by a number between 1/artificial_signal_ratio_range and artificial_signal_ratio_range, scaled on a logarithmic scale.
-        self.init_props.artificial_ratio = (
-            self.init_props.artificial_ratio
-            * self.init_props.artificial_signal_ratio_range ** (random.random() * 2 - 1)
-        )
         self.cluster = cluster
+        self.streams = cluster.streams
+        # The interpolators (and their grid and cache) are kept for the following episodes, see reset
+        if self.init_props.base_power_props.mode == "surrogate":
+            self.power_interpolator = SurrogatePowerInterpolator(
+                self.init_props.base_power_props, self.cluster.init_props.house_prop
+            )
+        elif self.init_props.base_power_props.mode == "interpolation":
+            self.power_interpolator = PowerInterpolator(
+                self.init_props.base_power_props, self.cluster.init_props.house_prop
+            )
+        self.reset(planner)
+
+    def reset(self, planner: Optional[EpisodePlanner] = None) -> dict:
+        """
+        Reset the state of the power grid environment for a new episode of its cluster, after the noise of the cluster is applied.
+
+        The artificial ratio and the seed of the signal are drawn again, and the interpolation tables of the buildings are built again, but the power interpolator is kept.
+
+        Parameters:
+            planner (Optional[EpisodePlanner]): The planner of the shape of the signal of the episode.
+
+        Returns:
+            dict: Empty dictionary.
+        """
+        self.init_props.artificial_ratio = draw_artificial_ratio(
+            self.init_props.artificial_ratio,
+            self.init_props.artificial_signal_ratio_range,
+            self.streams.power_grid,
+        )
         self.current_signal = (
             self.init_props.base_power_props.avg_power_per_hvac
             * self.cluster.init_props.nb_agents
         )
         self.current_signal = 0.0
         self.signal_calculator = SignalCalculator(
-            self.init_props.signal_properties, self.cluster.init_props.nb_agents
+            self.init_props.signal_properties,
+            self.cluster.init_props.nb_agents,
+            self.streams.power_grid,
         )
+        self.planner = planner
+        if planner is not None:
+            planner.signal_calculator = self.signal_calculator
 
-        if self.init_props.base_power_props.mode == "interpolation":
-            self.power_interpolator = PowerInterpolator(
-                self.init_props.base_power_props, self.cluster.init_props.house_prop
+        if self.init_props.base_power_props.mode == "surrogate":
+            self.time_since_last_interp = (
+                self.init_props.base_power_props.interp_update_period + 1
             )
+            self.building_tables = None
+        elif self.init_props.base_power_props.mode == "interpolation":
             self.time_since_last_interp = (
                 self.init_props.base_power_props.interp_update_period + 1
             )
-
-    def reset(self) -> dict:
-        """
-        Reset the state of the power grid environment.
-
-        Parameters:
-            None
-
-        Returns:
-            dict: Empty dictionary.
-        """
+            # The thermal properties of the buildings are fixed for the episode
+            buildings = self.cluster.buildings
+            self.building_tables = self.power_interpolator.build_tables(
+                Ua=np.array([building.init_props.Ua for building in buildings]),
+                Cm=np.array([building.init_props.Cm for building in buildings]),
+                Ca=np.array([building.init_props.Ca for building in buildings]),
+                Hm=np.array([building.init_props.Hm for building in buildings]),
+                cooling_capacity=np.array(
+                    [
+                        building.hvac.init_props.cooling_capacity
+                        for building in buildings
+                    ]
+                ),
+            )
         return {}
 
     def step(
-        self, date_time: datetime, time_step: timedelta, current_od_temp: float
+        self, date_time: DateTimeLike, time_step: timedelta, current_od_temp: float
     ) -> EnvironmentObsDict:
         """
         Simulate one step in the power grid environment.
 
         Parameters:
-            date_time (datetime): The current datetime.
+            date_time (DateTimeLike): The current datetime (or its calendar fields).
             time_step (timedelta): The time delta between the current datetime and the previous one.
             current_od_temp (float): The current outdoor temperature.
 
@@ -92,12 +195,14 @@ class PowerGrid(Simulatable):
             EnvironmentObsDict: A dictionary containing the current regulatory signal.
         """
         self.power_step(date_time, time_step, current_od_temp)
-        self.current_signal = self.signal_calculator.compute_signal(
-            self.base_power, date_time
+        self.current_signal = compute_grid_signal(
+            self.signal_calculator,
+            self.planner,
+            self.base_power,
+            date_time,
+            self.init_props.artificial_ratio,
+            self.cluster.max_power,
         )
-        # Artificial_ratio should be 1. Only change for experimental purposes.
-        self.current_signal = self.current_signal * self.init_props.artificial_ratio
-        self.current_signal = np.minimum(self.current_signal, self.cluster.max_power)
 
         return self.get_obs()
 
@@ -128,13 +233,13 @@ class PowerGrid(Simulatable):
         """
 
     def power_step(
-        self, date_time: datetime, time_step: timedelta, current_od_temp: float
+        self, date_time: DateTimeLike, time_step: timedelta, current_od_temp: float
     ) -> None:
         """
         Simulate one step in the power grid environment's power consumption.
 
         Parameters:
-            date_time (datetime): The current datetime.
+            date_time (DateTimeLike): The current datetime (or its calendar fields).
             time_step (timedelta): The time delta between the current datetime and the previous one.
             current_od_temp (float): The current outdoor temperature.
 
@@ -146,7 +251,7 @@ class PowerGrid(Simulatable):
                 self.init_props.base_power_props.avg_power_per_hvac
                 * self.cluster.init_props.nb_agents
             )
-        elif self.init_props.base_power_props.mode == "interpolation":
+        elif self.init_props.base_power_props.mode in ("interpolation", "surrogate"):
             self.time_since_last_interp += time_step.seconds
             if (
                 self.time_since_last_interp
@@ -157,5 +262,7 @@ class PowerGrid(Simulatable):
                     current_od_temp,
                     self.init_props.base_power_props.interp_nb_agents,
                     self.cluster.buildings,
+                    self.streams.interpolation,
+                    self.building_tables,
                 )
                 self.time_since_last_interp = 0
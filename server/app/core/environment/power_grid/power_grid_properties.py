@@ -8,12 +8,13 @@ class SignalProperties(BaseModel):
     Store the properties related to the power grid signal.
 
     Attributes:
-        mode (str): The mode of the power grid signal (default: "perlin").
+        mode (str): The mode of the power grid signal: "flat", "sinusoidals", "regular_steps", "perlin" or "perlin_table" (default: "perlin").
         amplitude_ratios (List[float]): The amplitude ratios of the power grid signal (default: [0.1, 0.3]).
         amplitude_per_hvac (int): The amplitude per HVAC of the power grid signal (default: 6000).
         nb_octaves (int): The number of octaves used to compute the Perlin noise (default: 5).
         octaves_step (int): The step between octaves used to compute the Perlin noise (default: 5).
         period (int): The period of the power grid signal (default: 300).
+        perlin_table_step (int): The sampling step of the Perlin noise table in perlin_table mode, in seconds (default: 4).
         periods (List[int]): The periods of the sinusoidal signals (default: [400, 1200]).
     """
 
@@ -24,6 +25,7 @@ class SignalProperties(BaseModel):
     nb_octaves: int = 5
     octaves_step: int = 5
     period: int = 300
+    perlin_table_step: int = 4
     periods: List[int] = [400, 1200]
 
 
@@ -32,14 +34,17 @@ class BasePowerProperties(BaseModel):
     Store the properties related to the base power of the power grid.
 
     Attributes:
-        mode (str): The mode of the base power (default: "constant").
+        mode (str): The mode of the base power: "constant", "interpolation" or "surrogate" (default: "constant").
         avg_power_per_hvac (int): The average power per HVAC (default: 4200).
         init_signal_per_hvac (int): The initial signal per HVAC (default: 910).
         path_datafile (str): The path to the data file (default: "./monteCarlo/mergedGridSearchResultFinal.npy").
         path_parameter_dict (str): The path to the parameter dictionary (default: "./monteCarlo/interp_parameters_dict.json").
         path_dict_keys (str): The path to the dictionary keys (default: "./monteCarlo/interp_dict_keys.csv").
+        path_surrogate (str): The path to the surrogate fitted on the data file, for the surrogate mode (default: "./monteCarlo/surrogate.npz").
         interp_update_period (int): The update period of the interpolator (default: 300).
         interp_nb_agents (int): The number of agents used to compute the interpolator (default: 100).
+        interp_cache_size (int): The maximum number of interpolated points kept in the cache of the interpolator, 0 to disable it (default: 0).
+        interp_cache_resolution (float): The resolution to which the points are quantized to be cached, in grid cells (default: 0.1).
     """
 
     # TODO: Think about a better way to do it
@@ -49,8 +54,11 @@ class BasePowerProperties(BaseModel):
     path_datafile: str = "./monteCarlo/mergedGridSearchResultFinal.npy"
     path_parameter_dict: str = "./monteCarlo/interp_parameters_dict.json"
     path_dict_keys: str = "./monteCarlo/interp_dict_keys.csv"
+    path_surrogate: str = "./monteCarlo/surrogate.npz"
     interp_update_period: int = 300
     interp_nb_agents: int = 100
+    interp_cache_size: int = 0
+    interp_cache_resolution: float = 0.1
 
 
 class PowerGridProperties(BaseModel):
@@ -1,12 +1,14 @@
-import random
-import time
-from datetime import datetime
+from typing import Dict, List
 
 import numpy as np
 
+from app.core.environment.clock import DateTimeLike, calendar_fields
 from app.core.environment.power_grid.perlin import Perlin
 from app.core.environment.power_grid.power_grid_properties import SignalProperties
 
+# Number of samples of each block of the Perlin table, computed when first looked up
+PERLIN_TABLE_BLOCK_SIZE = 900
+
 
 class SignalCalculator:
     """
@@ -15,27 +17,38 @@ class SignalCalculator:
     Parameters:
         signal_props (SignalProperties): The configuration of the power grid signal.
         nb_agents (int): The number of agents that will consume the power grid signal.
+        rng (np.random.Generator): The generator of the seed of the Perlin noise (the power grid stream of the environment).
+
+    Attributes:
+        perlin (Perlin): The Perlin noise, in perlin and perlin_table modes.
+        perlin_table (Dict[int, np.ndarray]): The blocks of the Perlin noise sampled every perlin_table_step seconds of the day, in perlin_table mode.
     """
 
-    def __init__(self, signal_props: SignalProperties, nb_agents: int) -> None:
+    def __init__(
+        self,
+        signal_props: SignalProperties,
+        nb_agents: int,
+        rng: np.random.Generator,
+    ) -> None:
         """Initialize a SignalCalculator object."""
         self.signal_props = signal_props
         self.nb_agents = nb_agents
-        if signal_props.mode == "perlin":
+        if signal_props.mode in ("perlin", "perlin_table"):
+            self.perlin_table: Dict[int, np.ndarray] = {}
             self.perlin = Perlin(
                 1,
                 self.signal_props.nb_octaves,
                 self.signal_props.octaves_step,
                 self.signal_props.period,
-                random.random(),
+                rng.random(),
             )
 
-    def flat_signal(self, date_time: datetime, base_power: float) -> float:
+    def flat_signal(self, date_time: DateTimeLike, base_power: float) -> float:
         """
         Compute the power signal as a flat value. Returns the base power value provided as input.
 
         Parameters:
-            date_time (datetime): The datetime for which to compute the power signal.
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
             base_power (float): The base power value for the signal.
 
         Returns:
@@ -43,12 +56,12 @@ class SignalCalculator:
         """
         return base_power
 
-    def sinusoidals_signal(self, date_time: datetime, base_power: float) -> float:
+    def sinusoidals_signal(self, date_time: DateTimeLike, base_power: float) -> float:
         """
         Compute the outdoors temperature based on the time, being the sum of several sinusoidal signals.
 
         Parameters:
-            date_time (datetime): The datetime for which to compute the power signal.
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
             base_power (float): The base power value for the signal.
 
         Returns:
@@ -75,12 +88,12 @@ class SignalCalculator:
 
         return signal
 
-    def regular_steps_signal(self, date_time: datetime, base_power: float) -> float:
+    def regular_steps_signal(self, date_time: DateTimeLike, base_power: float) -> float:
         """
         Compute the outdoors temperature based on the time using pulse width modulation.
 
         Parameters:
-            date_time (datetime): The datetime for which to compute the power signal.
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
             base_power (float): The base power value for the signal.
 
         Returns:
@@ -97,12 +110,12 @@ class SignalCalculator:
         signal = amplitude * np.heaviside((time_sec % period) - (1 - ratio) * period, 1)
         return signal
 
-    def perlin_signal(self, date_time: datetime, base_power: float) -> float:
+    def perlin_signal(self, date_time: DateTimeLike, base_power: float) -> float:
         """
         Compute the power signal using Perlin noise. The amplitude, period, and number of octaves for the Perlin noise are defined in the SignalProperties object provided to the SignalCalculator constructor.
 
         Parameters:
-            date_time (datetime): The datetime for which to compute the power signal.
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
             base_power (float): The base power value for the signal.
 
         Returns:
@@ -110,17 +123,132 @@ class SignalCalculator:
         """
 
         amplitude = self.signal_props.amplitude_ratios[0]
-        unix_time_stamp = time.mktime(date_time.timetuple()) % 86400
+        unix_time_stamp = calendar_fields(date_time).local_time_of_day
         perlin = self.perlin.calculate_noise(unix_time_stamp)
         return np.maximum(0, base_power + (base_power * amplitude * perlin))
 
-    def compute_signal(self, base_power: float, date_time: datetime) -> float:
+    def perlin_table_signal(self, date_time: DateTimeLike, base_power: float) -> float:
+        """
+        Same as perlin_signal, with the Perlin noise linearly interpolated in a table sampled every perlin_table_step
+        seconds of the day instead of being computed at each step.
+
+        Parameters:
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
+            base_power (float): The base power value for the signal.
+
+        Returns:
+            signal (float): The power signal value computed using the Perlin noise table.
+        """
+        amplitude = self.signal_props.amplitude_ratios[0]
+        unix_time_stamp = calendar_fields(date_time).local_time_of_day
+        perlin = self.lookup_perlin(unix_time_stamp)
+        return np.maximum(0, base_power + (base_power * amplitude * perlin))
+
+    def lookup_perlin(self, time_of_day: float) -> float:
+        """
+        Linearly interpolate the Perlin noise in the table. The table is computed by blocks of PERLIN_TABLE_BLOCK_SIZE
+        samples with Perlin.calculate_noise_array, when first looked up.
+
+        Parameters:
+            time_of_day (float): The time, in seconds since midnight.
+
+        Returns:
+            perlin (float): The Perlin noise value.
+        """
+        table_step = self.signal_props.perlin_table_step
+        position = time_of_day / table_step
+        sample = int(position)
+        block_id, offset = divmod(sample, PERLIN_TABLE_BLOCK_SIZE)
+        if block_id not in self.perlin_table:
+            # Each block holds the first sample of the next one, to interpolate up to its end
+            samples = block_id * PERLIN_TABLE_BLOCK_SIZE + np.arange(
+                PERLIN_TABLE_BLOCK_SIZE + 1
+            )
+            self.perlin_table[block_id] = self.perlin.calculate_noise_array(
+                samples * table_step
+            )
+        table = self.perlin_table[block_id]
+        fraction = position - sample
+        return table[offset] + fraction * (table[offset + 1] - table[offset])
+
+    def get_signal_shapes(self, date_times: List[DateTimeLike]) -> np.ndarray:
+        """
+        Compute the part of the signal that does not depend on the base power, for several datetimes at once. The
+        signal is then given by apply_signal_shape.
+
+        The shape is a multiplier of the base power in flat, sinusoidals and perlin modes, and the position in the
+        period in regular_steps mode. In perlin_table mode, the Perlin noise is computed exactly as in perlin mode.
+
+        Parameters:
+            date_times (List[DateTimeLike]): The datetimes for which to compute the shape of the signal.
+
+        Returns:
+            shapes (np.ndarray): The shape of the signal at each datetime.
+        """
+        mode = self.signal_props.mode
+        if mode == "flat":
+            return np.ones(len(date_times))
+        if mode in ("perlin", "perlin_table"):
+            unix_time_stamps = np.array(
+                [
+                    calendar_fields(date_time).local_time_of_day
+                    for date_time in date_times
+                ]
+            )
+            perlin = self.perlin.calculate_noise_array(unix_time_stamps)
+            return 1 + self.signal_props.amplitude_ratios[0] * perlin
+
+        time_sec = np.array(
+            [
+                date_time.hour * 3600 + date_time.minute * 60 + date_time.second
+                for date_time in date_times
+            ],
+            dtype=float,
+        )
+        if mode == "regular_steps":
+            return time_sec % self.signal_props.period
+        if len(self.signal_props.periods) != len(self.signal_props.amplitude_ratios):
+            raise ValueError(
+                "Power grid signal parameters: periods and amplitude_ratios lists should have the same length. Change it in the config.py file. len(periods): {}, leng(amplitude_ratios): {}.".format(
+                    len(self.signal_props.periods),
+                    len(self.signal_props.amplitude_ratios),
+                )
+            )
+        shapes = np.ones(len(date_times))
+        for period, ratio in zip(
+            self.signal_props.periods, self.signal_props.amplitude_ratios
+        ):
+            shapes += ratio * np.sin(2 * np.pi * time_sec / period)
+        return shapes
+
+    def apply_signal_shape(self, base_power: float, shape: float) -> float:
+        """
+        Compute the power signal from the base power and a shape computed by get_signal_shapes.
+
+        Parameters:
+            base_power (float): The base power value for the signal.
+            shape (float): The shape of the signal at the current datetime.
+
+        Returns:
+            signal (float): The power signal value.
+        """
+        mode = self.signal_props.mode
+        if mode == "regular_steps":
+            amplitude = self.signal_props.amplitude_per_hvac * self.nb_agents
+            ratio = base_power / amplitude
+            period = self.signal_props.period
+            return amplitude * np.heaviside(shape - (1 - ratio) * period, 1)
+        if mode in ("perlin", "perlin_table"):
+            return np.maximum(0, base_power * shape)
+        return base_power * shape
+
+    def compute_signal(self, base_power: float, date_time: DateTimeLike) -> float:
         """
-        Compute the power signal for the given base_power and date_time using the mode specified in the SignalProperties object provided to the SignalCalculator constructor. This method delegates the actual computation to one of the four signal methods (flat_signal, sinusoidals_signal, regular_steps_signal, perlin_signal) based on the mode attribute in the SignalProperties object.
+        Compute the power signal for the given base_power and date_time using the mode specified in the SignalProperties object provided to the SignalCalculator constructor. This method delegates the actual computation to one of the signal methods (flat_signal, sinusoidals_signal, regular_steps_signal, perlin_signal, perlin_table_signal) based on the mode attribute in the SignalProperties object.
 
         Parameters:
             base_power (float): The base power value for the signal.
-            date_time (datetime): The datetime for which to compute the power signal.
+            date_time (DateTimeLike): The datetime (or calendar fields) for which to compute the power signal.
 
         Returns:
             signal (float): The power signal value computed based on the mode attribute in the SignalProperties object.
@@ -0,0 +1,290 @@
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.interpolate import interpn
+
+from app.core.environment.environment_properties import BuildingProperties
+from app.core.environment.power_grid.interpolation import (
+    BasePowerInterpolator,
+    BuildingTables,
+    InterpolationGrid,
+    PowerInterpolator,
+)
+from app.core.environment.power_grid.power_grid_properties import BasePowerProperties
+
+
+@dataclass(frozen=True)
+class PolynomialSurrogate:
+    """
+    Polynomial regression of the power demand over the parameters of the Monte Carlo grid, fitted offline with
+    PolynomialSurrogate.fit. The parameters are clipped to the grid bounds and scaled to [-1, 1].
+
+    Attributes:
+        dict_keys (List[str]): The parameters, in the order of the columns of the points.
+        lower_bounds, upper_bounds (np.ndarray): The bounds of the grid, of shape (len(dict_keys),).
+        exponents (np.ndarray): The exponent of each parameter in each monomial, of shape (nb_terms, len(dict_keys)).
+        coefficients (np.ndarray): The coefficient of each monomial, of shape (nb_terms,).
+        parent_ids, parent_params (np.ndarray): Each monomial is its parent monomial times one parameter.
+    """
+
+    dict_keys: List[str]
+    lower_bounds: np.ndarray
+    upper_bounds: np.ndarray
+    exponents: np.ndarray
+    coefficients: np.ndarray
+    parent_ids: np.ndarray = field(init=False, repr=False)
+    parent_params: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # Each monomial is a monomial of lower degree (its parent) times one parameter
+        term_ids = {
+            tuple(exponent): term_id for term_id, exponent in enumerate(self.exponents)
+        }
+        parent_ids = np.zeros(len(self.exponents), dtype=int)
+        parent_params = np.zeros(len(self.exponents), dtype=int)
+        for term_id in range(1, len(self.exponents)):
+            exponent = self.exponents[term_id].copy()
+            parent_params[term_id] = np.flatnonzero(exponent)[-1]
+            exponent[parent_params[term_id]] -= 1
+            parent_ids[term_id] = term_ids[tuple(exponent)]
+        object.__setattr__(self, "parent_ids", parent_ids)
+        object.__setattr__(self, "parent_params", parent_params)
+
+    @staticmethod
+    def get_exponents(max_exponents: List[int], degree: int) -> np.ndarray:
+        """
+        Exponents of every monomial up to degree, ordered by degree. The exponent of each parameter is bounded by
+        max_exponents, as a parameter with n values in the grid only determines a polynomial of degree n - 1.
+        """
+        nb_params = len(max_exponents)
+        exponents = [np.zeros(nb_params, dtype=int)]
+        for term_degree in range(1, degree + 1):
+            for params in itertools.combinations_with_replacement(
+                range(nb_params), term_degree
+            ):
+                exponent = np.bincount(params, minlength=nb_params)
+                if np.all(exponent <= max_exponents):
+                    exponents.append(exponent)
+        return np.array(exponents)
+
+    def features(self, points: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the monomials at the points.
+
+        Parameters:
+            points: np.ndarray, of shape (M, len(dict_keys)).
+
+        Returns:
+            features: np.ndarray, of shape (M, nb_terms).
+        """
+        points = np.clip(points, self.lower_bounds, self.upper_bounds)
+        scaled = (2 * points - self.upper_bounds - self.lower_bounds) / (
+            self.upper_bounds - self.lower_bounds
+        )
+        features = np.empty((points.shape[0], len(self.exponents)))
+        features[:, 0] = 1.0
+        for term_id in range(1, len(self.exponents)):
+            features[:, term_id] = (
+                features[:, self.parent_ids[term_id]]
+                * scaled[:, self.parent_params[term_id]]
+            )
+        return features
+
+    def predict(self, points: np.ndarray) -> np.ndarray:
+        """
+        Predict the power demand of every point in one batched call.
+
+        Parameters:
+            points: np.ndarray, of shape (M, len(dict_keys)), as built by PowerInterpolator.get_points.
+
+        Returns:
+            powers: np.ndarray, of shape (M,), clipped to be non-negative.
+        """
+        return np.maximum(self.features(points) @ self.coefficients, 0.0)
+
+    @classmethod
+    def fit(
+        cls,
+        grid: InterpolationGrid,
+        degree: int = 3,
+        ridge: float = 1e-6,
+        chunk_size: int = 100000,
+    ) -> "PolynomialSurrogate":
+        """
+        Fit the polynomial by least squares on every point of the grid. The normal equations are accumulated
+        chunk by chunk, so that the grid is never expanded in memory.
+
+        Parameters:
+            grid: InterpolationGrid, the Monte Carlo grid.
+            degree: int, the maximum degree of the monomials.
+            ridge: float, the ridge regularization, relative to the mean of the diagonal of the normal matrix.
+            chunk_size: int, the number of grid points processed at once.
+
+        Returns:
+            The fitted PolynomialSurrogate.
+        """
+        grid_points = [
+            np.array(grid.parameters_dict[key], dtype=float) for key in grid.dict_keys
+        ]
+        surrogate = cls(
+            dict_keys=list(grid.dict_keys),
+            lower_bounds=np.array([np.min(points) for points in grid_points]),
+            upper_bounds=np.array([np.max(points) for points in grid_points]),
+            exponents=cls.get_exponents(
+                [len(points) - 1 for points in grid_points], degree
+            ),
+            coefficients=np.zeros(0),
+        )
+        values = grid.values.reshape(-1)
+        shape = [len(points) for points in grid_points]
+
+        normal_matrix = np.zeros((len(surrogate.exponents), len(surrogate.exponents)))
+        normal_vector = np.zeros(len(surrogate.exponents))
+        for start in range(0, len(values), chunk_size):
+            flat_ids = np.arange(start, min(start + chunk_size, len(values)))
+            grid_ids = np.unravel_index(flat_ids, shape)
+            points = np.stack(
+                [points[ids] for points, ids in zip(grid_points, grid_ids)], axis=1
+            )
+            features = surrogate.features(points)
+            normal_matrix += features.T @ features
+            normal_vector += features.T @ values[flat_ids]
+
+        regularization = ridge * np.mean(np.diag(normal_matrix))
+        coefficients = np.linalg.solve(
+            normal_matrix + regularization * np.eye(len(normal_matrix)), normal_vector
+        )
+        return cls(
+            dict_keys=surrogate.dict_keys,
+            lower_bounds=surrogate.lower_bounds,
+            upper_bounds=surrogate.upper_bounds,
+            exponents=surrogate.exponents,
+            coefficients=coefficients,
+        )
+
+    def save(self, path: str) -> None:
+        """Save the surrogate as a .npz file."""
+        np.savez(
+            path,
+            dict_keys=np.array(self.dict_keys),
+            lower_bounds=self.lower_bounds,
+            upper_bounds=self.upper_bounds,
+            exponents=self.exponents,
+            coefficients=self.coefficients,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PolynomialSurrogate":
+        """Load a surrogate saved with save."""
+        with np.load(path) as data:
+            return cls(
+                dict_keys=data["dict_keys"].tolist(),
+                lower_bounds=data["lower_bounds"],
+                upper_bounds=data["upper_bounds"],
+                exponents=data["exponents"],
+                coefficients=data["coefficients"],
+            )
+
+
+class SurrogatePowerInterpolator(BasePowerInterpolator):
+    """
+    Base power estimator of the "surrogate" mode: the power demand of the houses is predicted by a
+    PolynomialSurrogate instead of being interpolated in the Monte Carlo grid, which is not loaded.
+
+    Attributes:
+        base_power_props (BasePowerProperties): The base power properties, with the path to the surrogate.
+        default_building_props (BuildingProperties): The default building properties, to compute the thermal ratios.
+        surrogate (PolynomialSurrogate): The fitted surrogate.
+        dict_keys (List[str]): The parameters, in the order of the columns of the points.
+    """
+
+    def __init__(
+        self,
+        base_power_props: BasePowerProperties,
+        default_building_props: BuildingProperties,
+    ) -> None:
+        self.base_power_props = base_power_props
+        self.default_building_props = default_building_props
+        self.surrogate = PolynomialSurrogate.load(base_power_props.path_surrogate)
+        self.dict_keys = self.surrogate.dict_keys
+
+    def get_powers(
+        self,
+        points: np.ndarray,
+        building_tables: Optional[BuildingTables] = None,
+        building_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Predict the power demand of the points with the surrogate (building_tables and building_ids are ignored)."""
+        return self.surrogate.predict(points)
+
+
+def sample_points(
+    interpolator: PowerInterpolator, nb_points: int, seed: int
+) -> np.ndarray:
+    """Draw points uniformly within the bounds of the grid of the interpolator."""
+    return np.random.default_rng(seed).uniform(
+        interpolator.lower_bounds,
+        interpolator.upper_bounds,
+        (nb_points, len(interpolator.dict_keys)),
+    )
+
+
+def accuracy_report(
+    surrogate: PolynomialSurrogate,
+    interpolator: PowerInterpolator,
+    nb_points: int = 10000,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Compare the surrogate and the fast interpolation to the multilinear interpolation of interpolate_grid, on random
+    points within the grid.
+
+    Returns:
+        report: Dict[str, float], the mean and max absolute errors (W) of both methods, and the mean power (W).
+    """
+    points = sample_points(interpolator, nb_points, seed)
+    reference = interpn(interpolator.points, interpolator.values[..., 0], points)
+    surrogate_errors = np.abs(surrogate.predict(points) - reference)
+    fast_errors = np.abs(interpolator.interpolate_points(points) - reference)
+    return {
+        "mean_power": float(np.mean(reference)),
+        "surrogate_mae": float(np.mean(surrogate_errors)),
+        "surrogate_max_error": float(np.max(surrogate_errors)),
+        "interpolation_mae": float(np.mean(fast_errors)),
+        "interpolation_max_error": float(np.max(fast_errors)),
+    }
+
+
+def benchmark(
+    surrogate: PolynomialSurrogate,
+    interpolator: PowerInterpolator,
+    nb_points: int = 100,
+    nb_repeats: int = 20,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Time the evaluation of nb_points houses (interp_nb_agents) with interpolate_grid, the batch interpolation and
+    the surrogate.
+
+    Returns:
+        timings: Dict[str, float], the duration of one evaluation of the nb_points houses by each method, in seconds.
+    """
+    points = sample_points(interpolator, nb_points, seed)
+    point_dicts = [dict(zip(interpolator.dict_keys, point)) for point in points]
+    methods = {
+        "interpolate_grid": lambda: [
+            interpolator.interpolate_grid(point_dict) for point_dict in point_dicts
+        ],
+        "interpolate_points": lambda: interpolator.interpolate_points(points),
+        "surrogate": lambda: surrogate.predict(points),
+    }
+    timings = {}
+    for name, method in methods.items():
+        start_time = time.perf_counter()
+        for _ in range(nb_repeats):
+            method()
+        timings[name] = (time.perf_counter() - start_time) / nb_repeats
+    return timings
@@ -0,0 +1,98 @@
+import random
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Components of an environment which draw random numbers, each from its own generator
+STREAM_NAMES = [
+    "date",
+    "od_temp",
+    "noise",
+    "power_grid",
+    "interpolation",
+    "communication",
+]
+
+
+class RandomStreams:
+    """
+    Random generators of one environment, one per component, spawned from the SeedSequence of the environment.
+
+    The SeedSequence of the environment env_id is SeedSequence(seed, spawn_key=(env_id,)) (see spawn_streams): each
+    environment can be rebuilt on its own, so the serial (Environment), replicated (BatchedEnvironment) and sharded
+    (SubprocVectorEnvironment) runs of the same environments draw the same numbers. As each component has its own
+    generator, the draws of one component (such as the houses sampled by the interpolation, which depend on the base
+    power mode) do not shift the draws of the others.
+
+    Attributes:
+        seed_sequence (np.random.SeedSequence): The seed sequence of the environment.
+        date (np.random.Generator): The start dates of the episodes.
+        od_temp (np.random.Generator): The noise of the outdoor temperature (planned or not).
+        noise (np.random.Generator): The noise of the properties of the buildings.
+        power_grid (np.random.Generator): The artificial signal ratio and the seed of the signal.
+        interpolation (np.random.Generator): The houses sampled by the base power interpolation.
+        communication (np.random.Generator): The random communication links.
+    """
+
+    seed_sequence: np.random.SeedSequence
+    date: np.random.Generator
+    od_temp: np.random.Generator
+    noise: np.random.Generator
+    power_grid: np.random.Generator
+    interpolation: np.random.Generator
+    communication: np.random.Generator
+
+    def __init__(self, seed_sequence: np.random.SeedSequence) -> None:
+        """
+        Spawn the generators of the components.
+
+        Parameters:
+            seed_sequence: np.random.SeedSequence, the seed sequence of the environment.
+        """
+        self.seed_sequence = seed_sequence
+        for name, child in zip(STREAM_NAMES, seed_sequence.spawn(len(STREAM_NAMES))):
+            setattr(self, name, np.random.default_rng(child))
+
+    def get_state(self) -> Dict[str, dict]:
+        """Return the state of every generator, to give to set_state."""
+        return {name: getattr(self, name).bit_generator.state for name in STREAM_NAMES}
+
+    def set_state(self, state: Dict[str, dict]) -> None:
+        """Restore the state of every generator, returned by get_state."""
+        for name in STREAM_NAMES:
+            getattr(self, name).bit_generator.state = state[name]
+
+
+def resolve_seed(seed: Optional[int]) -> int:
+    """
+    Return the root seed of the random streams.
+
+    This is the only draw of the random module: when seed is None, the root seed is drawn from it, so that unseeded
+    environments follow random.seed. Every other draw of the environments comes from their streams.
+
+    Parameters:
+        seed: Optional[int], the seed of the properties (EnvironmentProperties.seed).
+
+    Returns:
+        seed: int, seed itself, or a 128 bits seed drawn from the random module when it is None.
+    """
+    if seed is None:
+        return random.getrandbits(128)
+    return seed
+
+
+def spawn_streams(seed: int, env_ids: Sequence[int]) -> List[RandomStreams]:
+    """
+    Create the random streams of several environments.
+
+    Parameters:
+        seed: int, the root seed (see resolve_seed).
+        env_ids: Sequence[int], the ids of the environments.
+
+    Returns:
+        streams: List[RandomStreams], the streams of each environment.
+    """
+    return [
+        RandomStreams(np.random.SeedSequence(seed, spawn_key=(env_id,)))
+        for env_id in env_ids
+    ]
@@ -1,11 +1,13 @@
-from typing import Dict, List
+from typing import Dict, List, Union
+
+import numpy as np
 
 from app.core.environment.cluster.building import Building
 from app.core.environment.environment_properties import (
     BuildingProperties,
     RewardProperties,
 )
-from app.utils.utils import deadbandL2
+from app.utils.utils import deadbandL2, vectorized_deadbandL2
 
 
 class RewardsCalculator:
@@ -139,19 +141,119 @@ class RewardsCalculator:
         power_grid_reg_signal: float,
     ) -> Dict[int, float]:
         """
-        Compute the reward of each TCL agent
+        Compute the reward of each TCL agent, as a dictionary view of compute_building_rewards.
 
         Returns:
             rewards_dict: a dictionary, containing the rewards of each TCL agent.
 
         Parameters:
-            - temp_penalty_dict: a dictionary, containing the temperature penalty for each TCL agent
+            - buildings: the list of Buildings in the environment.
             - cluster_hvac_power: a float. Total power used by the TCLs, in Watts.
             - power_grid_reg_signal: a float. Regulation signal, or target total power, in Watts.
         """
-        rewards_dict: Dict[int, float] = {}
+        rewards = self.compute_building_rewards(
+            buildings, cluster_hvac_power, power_grid_reg_signal
+        )
+        return dict(enumerate(rewards.tolist()))
+
+    def compute_building_rewards(
+        self,
+        buildings: List[Building],
+        cluster_hvac_power: float,
+        power_grid_reg_signal: float,
+    ) -> np.ndarray:
+        """
+        Compute the reward of each TCL agent. The temperatures of the buildings are collected once, and the common
+        penalties (mean and max over the cluster) are computed once per call by compute_rewards_array.
+
+        Returns:
+            rewards: array of shape (nb_agents,), containing the rewards of each TCL agent.
+
+        Parameters:
+            - buildings: the list of Buildings in the environment.
+            - cluster_hvac_power: a float. Total power used by the TCLs, in Watts.
+            - power_grid_reg_signal: a float. Regulation signal, or target total power, in Watts.
+        """
+        if not buildings:
+            return np.zeros(0)
+        indoor_temp = np.array([building.indoor_temp for building in buildings])
+        target_temp = np.array(
+            [building.init_props.target_temp for building in buildings]
+        )
+        deadband = np.array([building.init_props.deadband for building in buildings])
+        return self.compute_rewards_array(
+            indoor_temp,
+            target_temp,
+            deadband,
+            cluster_hvac_power,
+            power_grid_reg_signal,
+        )
+
+    def compute_temp_penalties_array(
+        self,
+        indoor_temp: np.ndarray,
+        target_temp: np.ndarray,
+        deadband: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Computes the temperature penalty of every building at once, according to the penalty mode.
+
+        Parameters:
+            - indoor_temp: array of shape (..., nb_agents), indoor temperature of the buildings.
+            - target_temp: array of shape (..., nb_agents), target temperature of the buildings.
+            - deadband: array of shape (..., nb_agents), deadband of the buildings.
+
+        Returns:
+            np.ndarray: array of shape (..., nb_agents), the temperature penalties. The common modes are aggregated over the last axis.
+        """
+        penalty_props = self.reward_props.penalty_props
+        ind_l2 = vectorized_deadbandL2(target_temp, deadband, indoor_temp)
+        if penalty_props.mode == "individual_L2":
+            return ind_l2
+
+        common_l2 = np.mean(ind_l2, axis=-1, keepdims=True)
+        common_max = np.max(ind_l2, axis=-1, keepdims=True)
+        if penalty_props.mode == "common_L2":
+            temperature_penalty = common_l2
+        elif penalty_props.mode == "common_max_error":
+            temperature_penalty = common_max
+        else:
+            temperature_penalty = (
+                penalty_props.alpha_ind_l2 * ind_l2
+                + penalty_props.alpha_common_l2 * common_l2
+                + penalty_props.alpha_common_max * common_max
+            ) / (
+                penalty_props.alpha_ind_l2
+                + penalty_props.alpha_common_l2
+                + penalty_props.alpha_common_max
+            )
+        return np.broadcast_to(temperature_penalty, ind_l2.shape)
+
+    def compute_rewards_array(
+        self,
+        indoor_temp: np.ndarray,
+        target_temp: np.ndarray,
+        deadband: np.ndarray,
+        cluster_hvac_power: Union[float, np.ndarray],
+        power_grid_reg_signal: Union[float, np.ndarray],
+    ) -> np.ndarray:
+        """
+        Compute the reward of each TCL agent from the state arrays of the buildings.
+
+        The buildings are on the last axis; leading axes (e.g. stacked replicas of the cluster) are kept.
+
+        Returns:
+            rewards: array of shape (..., nb_agents), containing the rewards of each TCL agent.
+
+        Parameters:
+            - indoor_temp, target_temp, deadband: arrays of shape (..., nb_agents).
+            - cluster_hvac_power: float or array of shape (...). Total power used by the TCLs, in Watts.
+            - power_grid_reg_signal: float or array of shape (...). Regulation signal, or target total power, in Watts.
+        """
         signal_penalty = self.reg_signal_penalty(
-            cluster_hvac_power, power_grid_reg_signal, len(buildings)
+            np.asarray(cluster_hvac_power),
+            np.asarray(power_grid_reg_signal),
+            indoor_temp.shape[-1],
         )
 
         norm_temp_penalty = deadbandL2(
@@ -166,19 +268,15 @@ class RewardsCalculator:
             0.75 * self.reward_props.norm_reg_sig,
         )
 
-        # Temperature penalties
-        temp_penalty_dict: Dict[int, float] = {}
-        for building_id, _ in enumerate(buildings):
-            temp_penalty_dict[building_id] = self.compute_temp_penalty(
-                building_id, buildings
-            )
-            rewards_dict[building_id] = -1 * (
-                self.reward_props.alpha_temp
-                * temp_penalty_dict[building_id]
-                / norm_temp_penalty
-                + self.reward_props.alpha_sig * signal_penalty / norm_sig_penalty
-            )
-        return rewards_dict
+        temp_penalties = self.compute_temp_penalties_array(
+            indoor_temp, target_temp, deadband
+        )
+        return -1 * (
+            self.reward_props.alpha_temp * temp_penalties / norm_temp_penalty
+            + self.reward_props.alpha_sig
+            * signal_penalty[..., np.newaxis]
+            / norm_sig_penalty
+        )
 
     def reg_signal_penalty(
         self, cluster_hvac_power: float, power_grid_reg_signal: float, nb_agents: int
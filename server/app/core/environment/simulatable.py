@@ -28,7 +28,3 @@ class Simulatable(ABC):
     @abstractmethod
     def get_obs(self):
         """Get the current observation of the simulation."""
-
-    @abstractmethod
-    def apply_noise(self) -> None:
-        """Apply noise to the simulation to simulate real-world variability. This method does not return anything."""
@@ -0,0 +1,323 @@
+import multiprocessing as mp
+import traceback
+from copy import deepcopy
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import (
+    OBS_KEYS,
+    EnvironmentProperties,
+)
+from app.core.environment.random_streams import resolve_seed
+
+
+class SharedBuffers:
+    """
+    Observations, rewards and dones of every environment, stored in shared memory blocks so that the workers write
+    them in place and nothing is pickled at each step.
+
+    Attributes:
+        obs (np.ndarray): Observations, of shape (nb_envs, nb_agents, len(OBS_KEYS)).
+        rewards (np.ndarray): Rewards, of shape (nb_envs, nb_agents).
+        dones (np.ndarray): Whether the episode of each environment ended with the last step, of shape (nb_envs,).
+    """
+
+    def __init__(
+        self, nb_envs: int, nb_agents: int, names: Optional[List[str]] = None
+    ) -> None:
+        """
+        Create the shared memory blocks, or attach to existing ones.
+
+        Parameters:
+            nb_envs: int, the number of environments.
+            nb_agents: int, the number of buildings in each environment.
+            names: Optional[List[str]], names of the blocks to attach to. New blocks are created when None.
+        """
+        specs = [
+            ((nb_envs, nb_agents, len(OBS_KEYS)), np.float64),
+            ((nb_envs, nb_agents), np.float64),
+            ((nb_envs,), np.bool_),
+        ]
+        self.owner = names is None
+        self.blocks: List[SharedMemory] = []
+        arrays = []
+        for index, (shape, dtype) in enumerate(specs):
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            if self.owner:
+                block = SharedMemory(create=True, size=size)
+            else:
+                block = SharedMemory(name=names[index])
+            self.blocks.append(block)
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+        self.obs, self.rewards, self.dones = arrays
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the shared memory blocks, used by the workers to attach to them."""
+        return [block.name for block in self.blocks]
+
+    def close(self) -> None:
+        """Release the shared memory blocks, and destroy them if they were created by this object."""
+        self.obs = self.rewards = self.dones = None
+        for block in self.blocks:
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = []
+
+
+def worker(
+    remote: Connection,
+    parent_remote: Connection,
+    env_props: EnvironmentProperties,
+    env_ids: List[int],
+    nb_envs: int,
+    episode_length: Optional[int],
+    buffer_names: List[str],
+) -> None:
+    """
+    Main loop of a worker process, which owns the environments env_ids.
+
+    The worker builds its environments and answers ("ok", None), then waits for commands on its pipe:
+        - ("reset", None): reset the environments and write their observations.
+        - ("step", actions): step the environments with the boolean actions of shape (len(env_ids), nb_agents),
+        write the observations, rewards and dones, and reset the environments whose episode is done.
+        - ("close", None): exit.
+    It answers ("ok", None) once the shared buffers are written, or ("error", traceback) if an exception was raised.
+
+    Parameters:
+        remote: Connection, the worker end of the pipe.
+        parent_remote: Connection, the main process end of the pipe, closed by the worker.
+        env_props: EnvironmentProperties, the properties of the environments, with their seed.
+        env_ids: List[int], the indices of the environments owned by the worker, which are also their environment ids.
+        nb_envs: int, the total number of environments.
+        episode_length: Optional[int], number of time steps after which an environment is done and reset.
+        buffer_names: List[str], the names of the shared memory blocks.
+    """
+    parent_remote.close()
+    buffers = SharedBuffers(nb_envs, env_props.cluster_prop.nb_agents, buffer_names)
+    try:
+        envs = [Environment(env_props, env_id) for env_id in env_ids]
+        elapsed_steps = [0] * len(env_ids)
+        remote.send(("ok", None))
+        while True:
+            command, data = remote.recv()
+            if command == "reset":
+                for env_id, env in zip(env_ids, envs):
+                    env.reset()
+                    buffers.obs[env_id] = env.get_obs_array()
+                    buffers.dones[env_id] = False
+                elapsed_steps = [0] * len(env_ids)
+            elif command == "step":
+                for index, (env_id, env) in enumerate(zip(env_ids, envs)):
+                    obs_array, buffers.rewards[env_id] = env.step_arrays(data[index])
+                    elapsed_steps[index] += 1
+                    done = (
+                        episode_length is not None
+                        and elapsed_steps[index] >= episode_length
+                    )
+                    if done:
+                        env.reset()
+                        obs_array = env.get_obs_array()
+                        elapsed_steps[index] = 0
+                    buffers.obs[env_id] = obs_array
+                    buffers.dones[env_id] = done
+            elif command == "close":
+                break
+            else:
+                raise NotImplementedError(f"Unknown command {command}")
+            remote.send(("ok", None))
+    except Exception:
+        remote.send(("error", traceback.format_exc()))
+    finally:
+        buffers.close()
+        remote.close()
+
+
+class SubprocVectorEnvironment:
+    """
+    Several Environment instances run in worker processes.
+
+    Each worker owns one or more environments and writes their observations, rewards and dones into shared memory
+    blocks; only the actions are sent through a pipe. step_async sends the actions to every worker and returns
+    immediately, step_wait waits for the workers and returns the results, so that the main process can work while
+    the environments are stepped.
+
+    The environment env_id draws from the random streams of (seed, env_id) (see spawn_streams), so that a run only
+    depends on the seed and the number of environments, and not on the number of workers. The environments are
+    stepped with Environment.step_arrays: the observations are the columns of OBS_KEYS, and messages are not computed.
+
+    Attributes:
+        env_props (EnvironmentProperties): The properties of the environments.
+        nb_envs (int): The number of environments.
+        nb_agents (int): The number of buildings in each environment.
+        nb_workers (int): The number of worker processes.
+        seed (int): The root seed of the random streams of the environments.
+        episode_length (Optional[int]): Number of time steps after which an environment is done and reset, None to never reset.
+        buffers (SharedBuffers): The shared observations, rewards and dones.
+        env_ids (List[List[int]]): The indices of the environments owned by each worker.
+    """
+
+    def __init__(
+        self,
+        env_props: EnvironmentProperties,
+        nb_envs: int,
+        nb_workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        episode_length: Optional[int] = None,
+        start_method: Optional[str] = None,
+    ) -> None:
+        """
+        Start the worker processes, and wait for them to build their environments.
+
+        Parameters:
+            env_props: EnvironmentProperties, the properties of the environments.
+            nb_envs: int, the number of environments.
+            nb_workers: Optional[int], the number of worker processes (defaults to min(nb_envs, cpu count)).
+            seed: Optional[int], the root seed of the random streams of the environments, env_props.seed when None. When both are None, it is drawn from the random module (see resolve_seed).
+            episode_length: Optional[int], number of time steps after which an environment is reset.
+            start_method: Optional[str], the multiprocessing start method (fork, spawn or forkserver).
+        """
+        self.env_props = deepcopy(env_props)
+        # Resolved here, so that the environments of every worker share the root seed
+        self.seed = resolve_seed(env_props.seed if seed is None else seed)
+        self.env_props.seed = self.seed
+        self.nb_envs = nb_envs
+        self.nb_agents = env_props.cluster_prop.nb_agents
+        self.nb_workers = min(nb_workers or mp.cpu_count(), nb_envs)
+        self.episode_length = episode_length
+        self.waiting = False
+        self.closed = False
+
+        self.buffers = SharedBuffers(nb_envs, self.nb_agents)
+        self.env_ids = [
+            env_ids.tolist()
+            for env_ids in np.array_split(np.arange(nb_envs), self.nb_workers)
+        ]
+
+        context = mp.get_context(start_method)
+        self.remotes: List[Connection] = []
+        self.processes = []
+        for env_ids in self.env_ids:
+            remote, worker_remote = context.Pipe()
+            process = context.Process(
+                target=worker,
+                args=(
+                    worker_remote,
+                    remote,
+                    self.env_props,
+                    env_ids,
+                    nb_envs,
+                    episode_length,
+                    self.buffers.names,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        try:
+            self.wait_workers()
+        except RuntimeError:
+            self.close()
+            raise
+
+    def reset(self) -> Dict[str, np.ndarray]:
+        """
+        Reset every environment.
+
+        Returns:
+            obs: Dict[str, np.ndarray], the observations, each of shape (nb_envs, nb_agents).
+        """
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        self.wait_workers()
+        return self.get_obs()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """
+        Send the actions to the workers, without waiting for the environments to be stepped.
+
+        Parameters:
+            actions: np.ndarray, boolean array of shape (nb_envs, nb_agents).
+        """
+        if self.waiting:
+            raise RuntimeError("step_async called twice without step_wait")
+        actions = np.asarray(actions, dtype=bool)
+        for remote, env_ids in zip(self.remotes, self.env_ids):
+            remote.send(("step", actions[env_ids]))
+        self.waiting = True
+
+    def step_wait(self) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        """
+        Wait for the environments to be stepped.
+
+        Returns:
+            - obs: Dict[str, np.ndarray], the observations, each of shape (nb_envs, nb_agents). For the environments that are done, these are the observations after reset.
+            - rewards: np.ndarray, the rewards, of shape (nb_envs, nb_agents).
+            - dones: np.ndarray, boolean array of shape (nb_envs,).
+        """
+        if not self.waiting:
+            raise RuntimeError("step_wait called without step_async")
+        self.wait_workers()
+        self.waiting = False
+        return self.get_obs(), self.buffers.rewards.copy(), self.buffers.dones.copy()
+
+    def step(
+        self, actions: np.ndarray
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        """Step every environment synchronously (step_async followed by step_wait)."""
+        self.step_async(actions)
+        return self.step_wait()
+
+    def get_obs(self) -> Dict[str, np.ndarray]:
+        """
+        Return a copy of the current observations.
+
+        Returns:
+            obs: Dict[str, np.ndarray], the observations, each of shape (nb_envs, nb_agents).
+        """
+        return {
+            key: self.buffers.obs[..., index].copy()
+            for index, key in enumerate(OBS_KEYS)
+        }
+
+    def wait_workers(self) -> None:
+        """Wait for every worker to answer, and raise if one of them failed."""
+        errors = []
+        for remote in self.remotes:
+            status, message = remote.recv()
+            if status == "error":
+                errors.append(message)
+        if errors:
+            raise RuntimeError("Environment worker failed:\n" + "\n".join(errors))
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory."""
+        if self.closed:
+            return
+        if self.waiting:
+            self.wait_workers()
+            self.waiting = False
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        self.buffers.close()
+        self.closed = True
+
+    def __enter__(self) -> "SubprocVectorEnvironment":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
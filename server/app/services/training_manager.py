@@ -1,8 +1,7 @@
 import os
 import random
-from copy import deepcopy
 from time import sleep
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np
 import torch
@@ -19,7 +18,7 @@ from app.services.metrics_service import Metrics
 from app.services.parser_service import MarlConfig
 from app.services.simulation_properties import SimulationProperties
 from app.utils.logger import logger
-from app.utils.norm import norm_state_dict
+from app.utils.norm import norm_state_dict, norm_static_dicts
 
 from .client_manager_service import ClientManagerService
 
@@ -161,7 +160,8 @@ class TrainingManager(Experiment):
         self.env = Environment(config.env_prop)
         self.nb_agents = config.env_prop.cluster_prop.nb_agents
         self.obs_dict = self.env.reset()
-        self.num_state = len(norm_state_dict(self.obs_dict, self.env.init_props)[0])
+        self.static_norm_dicts = norm_static_dicts(self.obs_dict, self.env.init_props)
+        self.num_state = len(self.norm_state(self.obs_dict)[0])
         self.metrics_service.initialize(
             self.nb_agents,
             self.static_props.start_stats_from,
@@ -179,6 +179,7 @@ class TrainingManager(Experiment):
             data=self.static_props.agent,
         )
         self.obs_dict = self.env.reset()
+        self.static_norm_dicts = norm_static_dicts(self.obs_dict, self.env.init_props)
 
     async def start(self, config: MarlConfig) -> None:
         """
@@ -221,9 +222,7 @@ class TrainingManager(Experiment):
             sleep(self.speed)
 
             # Select action with probabilities
-            actions = self.agent.select_actions(
-                norm_state_dict(self.obs_dict, self.env.init_props)
-            )
+            actions = self.agent.select_actions(self.norm_state(self.obs_dict))
 
             # Take action and get new transition
             next_obs_dict, rewards_dict = self.env.step(actions)
@@ -233,8 +232,8 @@ class TrainingManager(Experiment):
 
             # Storing in replay buffer
             self.agent.store_transition(
-                norm_state_dict(self.obs_dict, self.env.init_props),
-                norm_state_dict(next_obs_dict, self.env.init_props),
+                self.norm_state(self.obs_dict),
+                self.norm_state(next_obs_dict),
                 rewards_dict,
                 done,
             )
@@ -262,30 +261,45 @@ class TrainingManager(Experiment):
 
         await self.end_simulation()
 
+    def norm_state(self, obs_dict: Dict[int, EnvironmentObsDict]) -> List[np.ndarray]:
+        """Normalize observations of the current episode, reusing its normalized static fields."""
+        return norm_state_dict(obs_dict, self.env.init_props, self.static_norm_dicts)
+
     def test(self, tr_time_steps: int) -> None:
         """
         Test ppo agent on an episode of nb_test_timesteps, with
         """
-        env = deepcopy(self.env)
+        # The test episode runs in the training environment, which is then restored
+        state = self.env.snapshot()
+        env = self.env
         cumul_avg_reward = 0.0
         cumul_temp_error = 0.0
         cumul_signal_error = 0.0
-        obs_dict = env.reset()
-        with torch.no_grad():
-            for _ in range(self.static_props.nb_time_steps_test):
-                actions = self.agent.select_actions(
-                    norm_state_dict(obs_dict, self.env.init_props)
-                )
-                obs_dict, rewards_dict = env.step(actions)
-                for i in range(self.nb_agents):
-                    cumul_avg_reward += rewards_dict[i] / self.nb_agents
-                    cumul_temp_error += (
-                        np.abs(obs_dict[i]["indoor_temp"] - obs_dict[i]["target_temp"])
-                        / self.nb_agents
+        try:
+            obs_dict = env.reset()
+            static_norm_dicts = norm_static_dicts(obs_dict, self.env.init_props)
+            with torch.no_grad():
+                for _ in range(self.static_props.nb_time_steps_test):
+                    actions = self.agent.select_actions(
+                        norm_state_dict(
+                            obs_dict, self.env.init_props, static_norm_dicts
+                        )
                     )
-                    cumul_signal_error += np.abs(
-                        obs_dict[i]["reg_signal"] - obs_dict[i]["cluster_hvac_power"]
-                    ) / (self.nb_agents**2)
+                    obs_dict, rewards_dict = env.step(actions)
+                    for i in range(self.nb_agents):
+                        cumul_avg_reward += rewards_dict[i] / self.nb_agents
+                        cumul_temp_error += (
+                            np.abs(
+                                obs_dict[i]["indoor_temp"] - obs_dict[i]["target_temp"]
+                            )
+                            / self.nb_agents
+                        )
+                        cumul_signal_error += np.abs(
+                            obs_dict[i]["reg_signal"]
+                            - obs_dict[i]["cluster_hvac_power"]
+                        ) / (self.nb_agents**2)
+        finally:
+            env.restore(state)
         mean_avg_return = cumul_avg_reward / self.static_props.nb_time_steps_test
         mean_temp_error = cumul_temp_error / self.static_props.nb_time_steps_test
         mean_signal_error = cumul_signal_error / self.static_props.nb_time_steps_test
@@ -437,6 +451,9 @@ class TrainingManager(Experiment):
                 data={"message": f"New episode at time {step}"},
             )
             self.obs_dict = self.env.reset()
+            self.static_norm_dicts = norm_static_dicts(
+                self.obs_dict, self.env.init_props
+            )
 
     async def stop_sim(self, stop_state: bool) -> None:
         """
@@ -3,11 +3,13 @@
 Contains methods to normalize state dictionnaries generated by the environment at every timestep
 """
 
-from typing import Dict, List, TypedDict, Union
+from typing import Dict, List, Optional, TypedDict, Union
 
 import numpy as np
 
 from app.core.environment.environment_properties import (
+    BUILDING_STATIC_OBS_KEYS,
+    OBS_COLUMNS,
     BuildingMessage,
     BuildingProperties,
     EnvironmentObsDict,
@@ -151,8 +153,7 @@ def flatten_message(messages: List[BuildingMessage]) -> list:
     """Flatten message list of buildings."""
     flat_messages: List[Union[object, float, int]] = []
     for message in messages:
-        flat_message = list(message.values())
-        flat_messages = flat_messages + flat_message
+        flat_messages.extend(message.values())
     return flat_messages
 
 
@@ -175,33 +176,80 @@ def env_norm_dict(
     return norm_dict
 
 
-def norm_state_dict(
+def norm_static_dicts(
     obs_dicts: Dict[int, EnvironmentObsDict], env_props: EnvironmentProperties
-) -> List[np.ndarray]:
-    """Normalize the observation dictionnaries and convert them a flatten numpy array.
+) -> Dict[int, EnvironmentObsDict]:
+    """Normalize the hvac, cluster, power grid and building fields of the observation dictionnaries.
 
-    Returns a list of flatten numpy arrays of length number of agents.
+    Computed once per episode (after reset), the result holds the normalized fields which are constant during the
+    episode, and gives the order of the fields to norm_state_dict, which then only normalizes the dynamic fields.
     """
-    norm_agents_list: List[np.ndarray] = []
-    for obs_dict_id in obs_dicts.keys():
+    static_dicts: Dict[int, EnvironmentObsDict] = {}
+    for obs_dict_id, obs_dict in obs_dicts.items():
         norm_dict = norm_hvac_dict(
-            obs_dicts[obs_dict_id],
+            obs_dict,
             env_props.state_prop.hvac,
             env_props.cluster_prop.house_prop.hvac_prop,
         )
         norm_dict.update(
-            norm_cluster_dict(
-                obs_dicts[obs_dict_id], env_props.reward_prop.norm_reg_sig
-            )
+            norm_cluster_dict(obs_dict, env_props.reward_prop.norm_reg_sig)
         )
-        norm_dict.update(norm_powergrid_dict(obs_dicts[obs_dict_id], env_props))
+        norm_dict.update(norm_powergrid_dict(obs_dict, env_props))
         norm_dict.update(
             norm_building_dict(
-                obs_dicts[obs_dict_id],
+                obs_dict,
                 env_props.state_prop,
                 env_props.cluster_prop.house_prop,
             )
         )
+        static_dicts[obs_dict_id] = norm_dict
+    return static_dicts
+
+
+def norm_dynamic_dict(
+    obs_dict: EnvironmentObsDict, env_props: EnvironmentProperties
+) -> EnvironmentObsDict:
+    """Normalize the fields of the observation dictionnary which change at each step, as norm_state_dict."""
+    norm_reg_sig = env_props.reward_prop.norm_reg_sig
+    norm_dict: EnvironmentObsDict = {
+        "turned_on": 1 if obs_dict["turned_on"] else 0,
+        "lockout": 1 if obs_dict["lockout"] else 0,
+        "seconds_since_off": int(
+            obs_dict["seconds_since_off"] / obs_dict["lockout_duration"]
+        ),
+        "cluster_hvac_power": obs_dict["cluster_hvac_power"] / norm_reg_sig,
+        "reg_signal": obs_dict["reg_signal"]
+        / (norm_reg_sig * env_props.cluster_prop.nb_agents),
+        "indoor_temp": (obs_dict["indoor_temp"] - 20) / 5,
+        "mass_temp": (obs_dict["mass_temp"] - 20) / 5,
+    }
+    if env_props.state_prop.solar_gain:
+        norm_dict["solar_gain"] = obs_dict["solar_gain"] / 1000
+    return norm_dict
+
+
+def norm_state_dict(
+    obs_dicts: Dict[int, EnvironmentObsDict],
+    env_props: EnvironmentProperties,
+    static_dicts: Optional[Dict[int, EnvironmentObsDict]] = None,
+) -> List[np.ndarray]:
+    """Normalize the observation dictionnaries and convert them a flatten numpy array.
+
+    When the normalized static fields of the episode are given (see norm_static_dicts), only the dynamic fields are
+    normalized.
+
+    Returns a list of flatten numpy arrays of length number of agents.
+    """
+    dynamic_only = static_dicts is not None
+    if not dynamic_only:
+        static_dicts = norm_static_dicts(obs_dicts, env_props)
+    norm_agents_list: List[np.ndarray] = []
+    for obs_dict_id in obs_dicts.keys():
+        norm_dict = static_dicts[obs_dict_id]
+        if dynamic_only:
+            # Updating the existing keys keeps the order of the static dictionnary
+            norm_dict = norm_dict.copy()
+            norm_dict.update(norm_dynamic_dict(obs_dicts[obs_dict_id], env_props))
         flat_messages = flatten_message(
             norm_message(
                 obs_dicts[obs_dict_id]["message"],
@@ -216,3 +264,252 @@ def norm_state_dict(
         )
         norm_agents_list.append(array)
     return norm_agents_list
+
+
+# Raw values of the messages sent by a building, computed by message_sources
+MESSAGE_SOURCE_KEYS: List[str] = [
+    "current_temp_diff_to_target",
+    "seconds_since_off",
+    "curr_consumption",
+    "max_consumption",
+    "Ua",
+    "Ca",
+    "Cm",
+    "Hm",
+    "cop",
+]
+MESSAGE_SOURCE_COLUMNS: Dict[str, int] = {
+    key: index for index, key in enumerate(MESSAGE_SOURCE_KEYS)
+}
+
+
+def message_sources(obs_array: np.ndarray) -> np.ndarray:
+    """
+    Compute the raw values of the messages sent by each building (see compute_message_columns) from the observation array.
+
+    Returns:
+        An array of shape (nb_agents, len(MESSAGE_SOURCE_KEYS)).
+    """
+    max_consumption = (
+        obs_array[:, OBS_COLUMNS["cooling_capacity"]] / obs_array[:, OBS_COLUMNS["cop"]]
+    )
+    return np.stack(
+        [
+            obs_array[:, OBS_COLUMNS["indoor_temp"]]
+            - obs_array[:, OBS_COLUMNS["target_temp"]],
+            obs_array[:, OBS_COLUMNS["seconds_since_off"]],
+            max_consumption * obs_array[:, OBS_COLUMNS["turned_on"]],
+            max_consumption,
+            obs_array[:, OBS_COLUMNS["Ua"]],
+            obs_array[:, OBS_COLUMNS["Ca"]],
+            obs_array[:, OBS_COLUMNS["Cm"]],
+            obs_array[:, OBS_COLUMNS["Hm"]],
+            obs_array[:, OBS_COLUMNS["cop"]],
+        ],
+        axis=-1,
+    )
+
+
+class ObservationLayout:
+    """
+    Compiled version of norm_state_dict, working on the observation arrays of Environment.get_obs_array.
+
+    The layout is computed once from the state and message properties: each normalized column is
+    raw[:, source] * scale + offset, optionally truncated to an integer, where raw is the observation array. The
+    messages of a building are computed once per sender and gathered for each receiver. The columns are in the same
+    order as the arrays of norm_state_dict.
+
+    Attributes:
+        columns (List[str]): Names of the normalized columns, without the messages.
+        message_columns (List[str]): Names of the normalized columns of one message.
+        buffer (np.ndarray): The reusable float32 array filled by fill, of shape (nb_agents, D).
+    """
+
+    def __init__(self, env_props: EnvironmentProperties) -> None:
+        """
+        Compile the layout.
+
+        Parameters:
+            env_props: EnvironmentProperties, the properties of the environment.
+        """
+        state_prop = env_props.state_prop
+        message_prop = env_props.cluster_prop.message_prop
+        house_prop = env_props.cluster_prop.house_prop
+        hvac_prop = house_prop.hvac_prop
+        norm_reg_sig = env_props.reward_prop.norm_reg_sig
+
+        # (name, source column, scale, offset, truncate), in the order of norm_state_dict
+        state_layout = [
+            ("turned_on", "turned_on", 1.0, 0.0, False),
+            ("lockout", "lockout", 1.0, 0.0, False),
+            (
+                "seconds_since_off",
+                "seconds_since_off",
+                1 / hvac_prop.lockout_duration,
+                0.0,
+                True,
+            ),
+            ("lockout_duration", "lockout_duration", 0.0, 1.0, False),
+        ]
+        if state_prop.hvac:
+            state_layout += [
+                ("cop", "cop", 1 / hvac_prop.cop, 0.0, False),
+                (
+                    "latent_cooling_fraction",
+                    "latent_cooling_fraction",
+                    1 / hvac_prop.latent_cooling_fraction,
+                    0.0,
+                    False,
+                ),
+            ]
+        state_layout += [
+            (
+                "cluster_hvac_power",
+                "cluster_hvac_power",
+                1 / norm_reg_sig,
+                0.0,
+                False,
+            ),
+            (
+                "reg_signal",
+                "reg_signal",
+                1 / (norm_reg_sig * env_props.cluster_prop.nb_agents),
+                0.0,
+                False,
+            ),
+            ("deadband", "deadband", 1.0, 0.0, False),
+            ("indoor_temp", "indoor_temp", 1 / 5, -20 / 5, False),
+            ("mass_temp", "mass_temp", 1 / 5, -20 / 5, False),
+            ("target_temp", "target_temp", 1 / 5, -20 / 5, False),
+        ]
+        if state_prop.solar_gain:
+            state_layout.append(("solar_gain", "solar_gain", 1 / 1000, 0.0, False))
+        if state_prop.thermal:
+            state_layout += [
+                (key, key, 1 / getattr(house_prop, key), 0.0, False)
+                for key in ("Ua", "Ca", "Cm", "Hm")
+            ]
+            # Only the outdoors temperature is kept by env_norm_dict
+            state_layout.append(("OD_temp", "OD_temp", 1 / 5, -20 / 5, False))
+
+        # Messages, from the observation of the sender (see compute_message_columns)
+        message_layout = [
+            (
+                "current_temp_diff_to_target",
+                "current_temp_diff_to_target",
+                1 / 5,
+                0.0,
+                False,
+            ),
+            (
+                "seconds_since_off",
+                "seconds_since_off",
+                1 / hvac_prop.lockout_duration,
+                0.0,
+                True,
+            ),
+            ("curr_consumption", "curr_consumption", 1 / norm_reg_sig, 0.0, False),
+            ("max_consumption", "max_consumption", 1 / norm_reg_sig, 0.0, False),
+        ]
+        if message_prop.thermal:
+            message_layout += [
+                (key, key, 1 / getattr(house_prop, key), 0.0, False)
+                for key in ("Ua", "Ca", "Cm", "Hm")
+            ]
+        if message_prop.hvac:
+            # norm_message sends the default HVAC properties
+            message_layout += [
+                (key, "cop", 0.0, getattr(hvac_prop, key), False)
+                for key in ("cop", "latent_cooling_fraction", "cooling_capacity")
+            ]
+
+        self.columns = [column[0] for column in state_layout]
+        self.message_columns = [column[0] for column in message_layout]
+        self.nb_agents = env_props.cluster_prop.nb_agents
+        self.buffer = np.zeros((self.nb_agents, len(self.columns)), dtype=np.float32)
+
+        (
+            self.sources,
+            self.scales,
+            self.offsets,
+            self.truncated,
+        ) = self.compile(state_layout, OBS_COLUMNS)
+        # Columns normalized at each step by fill(static=False), the others being constant during an episode
+        self.dynamic_ids = np.array(
+            [
+                index
+                for index, column in enumerate(state_layout)
+                if column[1] not in BUILDING_STATIC_OBS_KEYS
+            ],
+            dtype=int,
+        )
+        (
+            self.message_sources,
+            self.message_scales,
+            self.message_offsets,
+            self.message_truncated,
+        ) = self.compile(message_layout, MESSAGE_SOURCE_COLUMNS)
+
+    @staticmethod
+    def compile(layout: list, source_columns: Dict[str, int]) -> tuple:
+        """Convert a list of (name, source, scale, offset, truncate) into index, scale, offset and mask arrays."""
+        sources = np.array([source_columns[column[1]] for column in layout], dtype=int)
+        scales = np.array([column[2] for column in layout])
+        offsets = np.array([column[3] for column in layout])
+        truncated = np.array([column[4] for column in layout], dtype=bool)
+        return sources, scales, offsets, truncated
+
+    def nb_columns(self, nb_messages: int) -> int:
+        """Return the size of the normalized state of an agent receiving nb_messages messages."""
+        return len(self.columns) + nb_messages * len(self.message_columns)
+
+    def fill(
+        self,
+        obs_array: np.ndarray,
+        message_ids: Optional[np.ndarray] = None,
+        static: bool = True,
+    ) -> np.ndarray:
+        """
+        Normalize the observations into the reusable buffer.
+
+        Parameters:
+            obs_array: np.ndarray, the observations, of shape (nb_agents, len(OBS_KEYS)) (see Environment.get_obs_array).
+            message_ids: Optional[np.ndarray], integer array of shape (nb_agents, nb_messages), the ids of the buildings sending a message to each building (see CommunicationGraph.to_matrix). No messages when None.
+            static: bool, whether to normalize the columns which are constant during an episode (BUILDING_STATIC_OBS_KEYS). When False, the buffer keeps their values of the previous call, which must be from the same episode.
+
+        Returns:
+            The buffer, of shape (nb_agents, nb_columns(nb_messages)), overwritten at the next call.
+        """
+        nb_messages = 0 if message_ids is None else message_ids.shape[1]
+        shape = (obs_array.shape[0], self.nb_columns(nb_messages))
+        if self.buffer.shape != shape:
+            self.buffer = np.zeros(shape, dtype=np.float32)
+            static = True
+
+        nb_state_columns = len(self.columns)
+        if static:
+            state = obs_array[:, self.sources] * self.scales + self.offsets
+            state[:, self.truncated] = np.trunc(state[:, self.truncated])
+            self.buffer[:, :nb_state_columns] = state
+        else:
+            ids = self.dynamic_ids
+            state = (
+                obs_array[:, self.sources[ids]] * self.scales[ids] + self.offsets[ids]
+            )
+            truncated = self.truncated[ids]
+            state[:, truncated] = np.trunc(state[:, truncated])
+            self.buffer[:, ids] = state
+
+        if nb_messages:
+            messages = (
+                message_sources(obs_array)[:, self.message_sources]
+                * self.message_scales
+                + self.message_offsets
+            )
+            messages[:, self.message_truncated] = np.trunc(
+                messages[:, self.message_truncated]
+            )
+            self.buffer[:, nb_state_columns:] = messages[message_ids].reshape(
+                obs_array.shape[0], -1
+            )
+        return self.buffer
@@ -1,4 +1,9 @@
-from datetime import datetime
+from functools import lru_cache
+from typing import Tuple, Union
+
+import numpy as np
+
+from app.core.environment.clock import DateTimeLike
 
 
 def deadbandL2(target, deadband, value):
@@ -23,6 +28,29 @@ def deadbandL2(target, deadband, value):
     return deadband_L2
 
 
+def vectorized_deadbandL2(
+    target: np.ndarray, deadband: np.ndarray, value: np.ndarray
+) -> np.ndarray:
+    """
+    Element-wise version of deadbandL2, for arrays of targets, deadbands and values.
+
+    Parameters:
+        target: an array representing the target values.
+        deadband: an array representing the deadbands around the target values.
+        value: an array representing the actual values to check.
+
+    Returns:
+            deadband_L2: an array of the square of the differences between values and targets, 0 where the value is within the deadband.
+    """
+    upper = target + deadband / 2
+    lower = target - deadband / 2
+    return np.where(
+        upper < value,
+        (value - upper) ** 2,
+        np.where(lower > value, (lower - value) ** 2, 0.0),
+    )
+
+
 def sort_dict_keys(point, dict_keys):
     """
     Sort a dictionary by a given set of keys, returning a new dictionary with the same keys as the original but in the order specified by the dict_keys argument.
@@ -39,17 +67,111 @@ def sort_dict_keys(point, dict_keys):
     return sorted_point
 
 
+# Coefficients of the polynomial regression of the solar cooling load, see solar_cooling_load
+SOLAR_COOLING_LOAD_COEFFS = [
+    4.36579418e01,
+    1.58055357e02,
+    8.76635241e01,
+    -4.55944821e01,
+    3.24275366e00,
+    -4.56096472e-01,
+    -1.47795612e01,
+    4.68950855e00,
+    -3.73313090e01,
+    5.78827663e00,
+    1.04354810e00,
+    2.12969604e-02,
+    2.58881400e-03,
+    -5.11397219e-04,
+    1.56398008e-02,
+    -1.18302764e-01,
+    -2.71446436e-01,
+    -3.97855577e-02,
+]
+MINUTES_IN_DAY = 24 * 60
+# Day of a leap year at which each month starts, to index the days of every year in the same table
+LEAP_YEAR_MONTH_STARTS = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+def solar_cooling_load(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Computes the solar cooling load of a window of unit area, with the polynomial regression described in compute_solar_gain.
+
+    Parameters:
+        x: np.ndarray, the hours since 7:30 (sun time).
+        y: np.ndarray, the months since January 1st (a month being 30 days).
+
+    Returns:
+        solar_cooling_load: np.ndarray, the solar cooling load in Watts per square meter, 0 before 7:30 and after 17:30.
+    """
+    coeff = SOLAR_COOLING_LOAD_COEFFS
+    load = (
+        coeff[0]
+        + x * coeff[1]
+        + y * coeff[2]
+        + x**2 * coeff[3]
+        + x**2 * y * coeff[4]
+        + x**2 * y**2 * coeff[5]
+        + y**2 * coeff[6]
+        + x * y**2 * coeff[7]
+        + x * y * coeff[8]
+        + x**3 * coeff[9]
+        + y**3 * coeff[10]
+        + x**3 * y * coeff[11]
+        + x**3 * y**2 * coeff[12]
+        + x**3 * y**3 * coeff[13]
+        + x**2 * y**3 * coeff[14]
+        + x * y**3 * coeff[15]
+        + x**4 * coeff[16]
+        + y**4 * coeff[17]
+    )
+    return np.where((x < 0) | (x > 10), 0.0, load)
+
+
+@lru_cache(maxsize=None)
+def get_solar_cooling_load_table() -> np.ndarray:
+    """
+    Returns the solar cooling load of a window of unit area at every minute of every day of a leap year, computed once per process.
+
+    Returns:
+        table: np.ndarray, read-only array of shape (366, MINUTES_IN_DAY), indexed by get_solar_table_index.
+    """
+    months = np.searchsorted(LEAP_YEAR_MONTH_STARTS, np.arange(366), side="right")
+    days = np.arange(366) - LEAP_YEAR_MONTH_STARTS[months - 1] + 1
+    minutes = np.arange(MINUTES_IN_DAY)
+    x = minutes // 60 + (minutes % 60) / 60 - 7.5
+    y = months + days / 30 - 1
+    table = solar_cooling_load(x[np.newaxis, :], y[:, np.newaxis])
+    table.flags.writeable = False
+    return table
+
+
+def get_solar_table_index(date_time: DateTimeLike) -> Tuple[int, int]:
+    """Returns the (day of a leap year, minute of the day) index of date_time in the solar cooling load table."""
+    return (
+        LEAP_YEAR_MONTH_STARTS[date_time.month - 1] + date_time.day - 1,
+        date_time.hour * 60 + date_time.minute,
+    )
+
+
 def compute_solar_gain(
-    date_time: datetime, window_area: float, shading_coeff: float
-) -> float:
+    date_time: DateTimeLike,
+    window_area: Union[float, np.ndarray],
+    shading_coeff: Union[float, np.ndarray],
+) -> Union[float, np.ndarray]:
     """
     Computes the solar gain, i.e. the heat transfer received from the sun through the windows.
 
+    The solar cooling load only depends on the date and time, and is looked up in get_solar_cooling_load_table: the
+    window areas and shading coefficients can be arrays, to compute the solar gain of every house at once.
+
     Return:
-    solar_gain: float, direct solar radiation passing through the windows at a given moment in Watts
+    solar_gain: float or np.ndarray, direct solar radiation passing through the windows at a given moment in Watts
 
     Parameters
-    date_time: datetime, current date and time
+    date_time: DateTimeLike, current date and time
+    window_area: float or np.ndarray, window area of the houses (m2)
+    shading_coeff: float or np.ndarray, shading coefficient of the windows of the houses
 
     ---
     Source and assumptions:
@@ -65,53 +187,8 @@ def compute_solar_gain(
     - The windows are distributed perfectly evenly around the building.
     - There are no horizontal windows, for example on the roof.
     """
-
-    x = date_time.hour + date_time.minute / 60 - 7.5
-    if x < 0 or x > 10:
-        solar_cooling_load = 0
-    else:
-        y = date_time.month + date_time.day / 30 - 1
-        coeff = [
-            4.36579418e01,
-            1.58055357e02,
-            8.76635241e01,
-            -4.55944821e01,
-            3.24275366e00,
-            -4.56096472e-01,
-            -1.47795612e01,
-            4.68950855e00,
-            -3.73313090e01,
-            5.78827663e00,
-            1.04354810e00,
-            2.12969604e-02,
-            2.58881400e-03,
-            -5.11397219e-04,
-            1.56398008e-02,
-            -1.18302764e-01,
-            -2.71446436e-01,
-            -3.97855577e-02,
-        ]
-
-        solar_cooling_load = (
-            coeff[0]
-            + x * coeff[1]
-            + y * coeff[2]
-            + x**2 * coeff[3]
-            + x**2 * y * coeff[4]
-            + x**2 * y**2 * coeff[5]
-            + y**2 * coeff[6]
-            + x * y**2 * coeff[7]
-            + x * y * coeff[8]
-            + x**3 * coeff[9]
-            + y**3 * coeff[10]
-            + x**3 * y * coeff[11]
-            + x**3 * y**2 * coeff[12]
-            + x**3 * y**3 * coeff[13]
-            + x**2 * y**3 * coeff[14]
-            + x * y**3 * coeff[15]
-            + x**4 * coeff[16]
-            + y**4 * coeff[17]
-        )
-
+    solar_cooling_load = float(
+        get_solar_cooling_load_table()[get_solar_table_index(date_time)]
+    )
     solar_gain = window_area * shading_coeff * solar_cooling_load
     return solar_gain
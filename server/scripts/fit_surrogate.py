@@ -0,0 +1,56 @@
+"""
+Fit the surrogate of the base power on the Monte Carlo grid, and report its accuracy and speed.
+
+Run from the server directory: python -m scripts.fit_surrogate
+"""
+
+import argparse
+
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.power_grid.interpolation import (
+    PowerInterpolator,
+    load_interpolation_grid,
+)
+from app.core.environment.power_grid.surrogate import (
+    PolynomialSurrogate,
+    accuracy_report,
+    benchmark,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit the surrogate of the base power on the Monte Carlo grid, and report its accuracy and speed"
+    )
+    parser.add_argument(
+        "--degree", type=int, default=3, help="Degree of the polynomial"
+    )
+    parser.add_argument(
+        "--ridge", type=float, default=1e-6, help="Ridge regularization"
+    )
+    opt = parser.parse_args()
+
+    env_props = EnvironmentProperties()
+    base_power_props = env_props.power_grid_prop.base_power_props
+    surrogate = PolynomialSurrogate.fit(
+        load_interpolation_grid(base_power_props), opt.degree, opt.ridge
+    )
+    surrogate.save(base_power_props.path_surrogate)
+
+    interpolator = PowerInterpolator(
+        base_power_props, env_props.cluster_prop.house_prop
+    )
+    print(
+        f"Surrogate: {len(surrogate.coefficients)} terms, {surrogate.coefficients.nbytes} bytes"
+    )
+    print(
+        f"Grid: {interpolator.values.size} points, {interpolator.values.nbytes} bytes"
+    )
+    for name, value in accuracy_report(surrogate, interpolator).items():
+        print(f"{name}: {value:.1f} W")
+    timings = benchmark(
+        surrogate, interpolator, nb_points=base_power_props.interp_nb_agents
+    )
+    for name, value in timings.items():
+        print(
+            f"{name}: {value * 1e3:.3f} ms for {base_power_props.interp_nb_agents} houses"
+        )
@@ -0,0 +1,52 @@
+"""
+Generate the Monte Carlo grid of the base power interpolation, with the default environment properties.
+
+Run from the server directory: python -m scripts.generate_monte_carlo_grid
+"""
+
+import argparse
+
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.power_grid.interpolation import NB_TIME_STEPS_BY_SIM
+from app.core.environment.power_grid.monte_carlo import generate_grid, merge_shards
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate the Monte Carlo grid of the base power interpolation"
+    )
+    parser.add_argument(
+        "--output_dir", type=str, default="./monteCarlo/shards", help="Shards directory"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=1,
+        help="Number of (hour, date) combinations of each shard",
+    )
+    parser.add_argument(
+        "--nb_workers", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--nb_time_steps",
+        type=int,
+        default=NB_TIME_STEPS_BY_SIM,
+        help="Number of time steps simulated for each combination",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Root seed of the random streams"
+    )
+    opt = parser.parse_args()
+
+    env_props = EnvironmentProperties()
+    base_power_props = env_props.power_grid_prop.base_power_props
+    generate_grid(
+        base_power_props,
+        env_props.cluster_prop,
+        env_props.time_step,
+        opt.output_dir,
+        opt.chunk_size,
+        opt.nb_workers,
+        opt.nb_time_steps,
+        opt.seed,
+    )
+    merge_shards(base_power_props, opt.output_dir, opt.chunk_size)
@@ -0,0 +1,110 @@
+import random
+import unittest
+
+import numpy as np
+
+from app.core.environment.cluster.agent_communication_builder import (
+    AgentCommunicationBuilder,
+    CommunicationGraph,
+)
+from app.core.environment.cluster.cluster import Cluster
+from app.core.environment.cluster.cluster_properties import (
+    AgentsCommunicationProperties,
+)
+from app.core.environment.environment_properties import ClusterPropreties
+
+
+def building_message(building):
+    """Message sent by a building, with the thermal and HVAC properties"""
+    hvac_props = building.hvac.init_props
+    return {
+        "seconds_since_off": building.hvac.seconds_since_off,
+        "curr_consumption": building.hvac.get_power_consumption(),
+        "max_consumption": hvac_props.max_consumption,
+        "lockout_duration": hvac_props.lockout_duration,
+        "current_temp_diff_to_target": building.indoor_temp
+        - building.init_props.target_temp,
+        "cop": hvac_props.cop,
+        "latent_cooling_fraction": hvac_props.latent_cooling_fraction,
+        "cooling_capacity": hvac_props.cooling_capacity,
+        "Ca": building.init_props.Ca,
+        "Ua": building.init_props.Ua,
+        "Cm": building.init_props.Cm,
+        "Hm": building.init_props.Hm,
+    }
+
+
+class TestCommunicationGraph(unittest.TestCase):
+    def testFromLinkList(self):
+        """Tests the CSR conversion of a link list"""
+        graph = CommunicationGraph.from_link_list({0: [1, 2], 2: [0]}, 3)
+        np.testing.assert_array_equal(graph.indptr, [0, 2, 2, 3])
+        np.testing.assert_array_equal(graph.indices, [1, 2, 0])
+        np.testing.assert_array_equal(graph.senders(2), [0])
+        with self.assertRaises(ValueError):
+            graph.to_matrix()
+
+    def testGatheredMessages(self):
+        """Tests that the gathered messages are the ones sent by the buildings"""
+        for mode in ("neighbours", "closed_groups", "random_sample", "random_fixed"):
+            cluster_props = ClusterPropreties(nb_agents=12)
+            cluster_props.agents_comm_prop.mode = mode
+            cluster_props.message_prop.thermal = True
+            cluster_props.message_prop.hvac = True
+            random.seed(1)
+            cluster = Cluster(cluster_props)
+            cluster.apply_noise()
+            cluster.buildings[3].hvac.turned_on = False
+
+            # The random modes sample the links from the communication stream
+            rng_state = cluster.streams.communication.bit_generator.state
+            graph = cluster.get_comm_graph()
+            cluster.streams.communication.bit_generator.state = rng_state
+            expected = [
+                [
+                    building_message(cluster.buildings[sender])
+                    for sender in graph.senders(building_id)
+                ]
+                for building_id in range(12)
+            ]
+            self.assertEqual(cluster.get_messages(), expected)
+
+    def testMessagesNotShared(self):
+        """Tests that a sender feeding several receivers gives each of them its own message"""
+        graph = CommunicationGraph.from_link_list({0: [2], 1: [2]}, 3)
+        messages = graph.gather_messages({"Ua": np.array([1.0, 2.0, 3.0])})
+        self.assertEqual(messages, [[{"Ua": 3.0}], [{"Ua": 3.0}], []])
+        messages[0][0]["Ua"] = 0.0
+        self.assertEqual(messages[1][0]["Ua"], 3.0)
+
+
+class TestBatchedRandomSample(unittest.TestCase):
+    def get_builder(self, nb_agents, seed=0):
+        comm_props = AgentsCommunicationProperties(
+            mode="random_sample", batched_sampling=True, max_nb_agents_communication=4
+        )
+        return AgentCommunicationBuilder(
+            comm_props, nb_agents, np.random.default_rng(seed)
+        )
+
+    def testSamples(self):
+        """Tests that the samples are distinct and exclude the agent itself"""
+        for nb_agents in (1, 3, 6, 50):
+            samples = self.get_builder(nb_agents).get_random_sample_matrix()
+            nb_comm = min(4, nb_agents - 1)
+            self.assertEqual(samples.shape, (nb_agents, nb_comm))
+            for agent_id, agent_samples in enumerate(samples):
+                self.assertEqual(len(set(agent_samples)), nb_comm)
+                self.assertNotIn(agent_id, agent_samples)
+                self.assertTrue(
+                    np.all((agent_samples >= 0) & (agent_samples < nb_agents))
+                )
+
+    def testSeeding(self):
+        """Tests that the samples follow the seed of the generator"""
+        first = self.get_builder(50, seed=3).get_comm_graph()
+        second = self.get_builder(50, seed=3).get_comm_graph()
+        np.testing.assert_array_equal(first.indices, second.indices)
+        np.testing.assert_array_equal(first.to_matrix()[7], first.senders(7))
+        third = self.get_builder(50, seed=4).get_comm_graph()
+        self.assertFalse(np.array_equal(first.indices, third.indices))
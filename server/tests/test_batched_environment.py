@@ -0,0 +1,154 @@
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.core.environment.batched_environment import BatchedEnvironment
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import EnvironmentProperties
+from tests.test_interpolation import write_grid
+
+
+class TestBatchedEnvironment(unittest.TestCase):
+    def setUp(self):
+        self.nb_agents = 20
+        self.env_props = EnvironmentProperties()
+        self.env_props.cluster_prop.nb_agents = self.nb_agents
+        self.env_props.reward_prop.penalty_props.mode = "mixture"
+        self.env_props.reward_prop.penalty_props.alpha_common_max = 0.5
+
+    def testSingleReplicaMatchesEnvironment(self):
+        """Tests that one replica follows the same trajectory as the Environment"""
+        actions = np.random.default_rng(0).random((50, self.nb_agents)) < 0.5
+
+        random.seed(5)
+        env = Environment(self.env_props)
+        rewards, indoor_temps = [], []
+        for action in actions:
+            obs, reward = env.step({i: bool(a) for i, a in enumerate(action)})
+            rewards.append([reward[i] for i in range(self.nb_agents)])
+            indoor_temps.append([obs[i]["indoor_temp"] for i in range(self.nb_agents)])
+
+        random.seed(5)
+        batched_env = BatchedEnvironment(self.env_props, 1)
+        for step, action in enumerate(actions):
+            obs, reward, dones = batched_env.step(action[np.newaxis])
+            np.testing.assert_allclose(reward[0], rewards[step], rtol=1e-12)
+            np.testing.assert_array_equal(obs["indoor_temp"][0], indoor_temps[step])
+            self.assertFalse(dones[0])
+
+    def testPlannedEpisodeMatchesEnvironment(self):
+        """Tests that the replicas plan their episodes as the Environment"""
+        self.env_props.plan_horizon = 16
+        actions = np.random.default_rng(0).random((40, self.nb_agents)) < 0.5
+
+        random.seed(5)
+        env = Environment(self.env_props)
+        rewards, signals = [], []
+        for action in actions:
+            obs, reward = env.step({i: bool(a) for i, a in enumerate(action)})
+            rewards.append([reward[i] for i in range(self.nb_agents)])
+            signals.append(obs[0]["reg_signal"])
+
+        random.seed(5)
+        batched_env = BatchedEnvironment(self.env_props, 1)
+        for step, action in enumerate(actions):
+            obs, reward, _ = batched_env.step(action[np.newaxis])
+            np.testing.assert_allclose(reward[0], rewards[step], rtol=1e-12)
+            self.assertEqual(obs["reg_signal"][0, 0], signals[step])
+
+    def testShardedReplicasMatchEnvironments(self):
+        """Tests that the replicas follow the Environment with the same seed and environment id"""
+        self.env_props.seed = 11
+        self.env_props.start_datetime_mode = "random"
+        actions = np.random.default_rng(0).random((20, 2, self.nb_agents)) < 0.5
+
+        batched_env = BatchedEnvironment(self.env_props, 2, first_env_id=3)
+        envs = [Environment(self.env_props, env_id) for env_id in (3, 4)]
+        for replica_id, env in enumerate(envs):
+            self.assertEqual(batched_env.date_times[replica_id], env.date_time)
+        for action in actions:
+            _, batched_rewards, _ = batched_env.step(action)
+            for replica_id, env in enumerate(envs):
+                _, reward = env.step(
+                    {i: bool(a) for i, a in enumerate(action[replica_id])}
+                )
+                np.testing.assert_allclose(
+                    batched_rewards[replica_id],
+                    [reward[i] for i in range(self.nb_agents)],
+                    rtol=1e-12,
+                )
+        self.assertNotEqual(batched_env.date_times[0], batched_env.date_times[1])
+
+    def testResetsMatchEnvironment(self):
+        """Tests that the replicas follow the Environment over several episodes"""
+        self.env_props.seed = 4
+        self.env_props.start_datetime_mode = "random"
+        self.env_props.power_grid_prop.artificial_signal_ratio_range = 2
+        self.env_props.power_grid_prop.signal_properties.mode = "perlin"
+        episode_length = 5
+        actions = np.random.default_rng(1).random((18, 2, self.nb_agents)) < 0.5
+
+        batched_env = BatchedEnvironment(
+            self.env_props, 2, episode_length=episode_length
+        )
+        envs = [Environment(self.env_props, env_id) for env_id in range(2)]
+        for step, action in enumerate(actions):
+            obs, batched_rewards, dones = batched_env.step(action)
+            for replica_id, env in enumerate(envs):
+                _, reward = env.step(
+                    {i: bool(a) for i, a in enumerate(action[replica_id])}
+                )
+                np.testing.assert_allclose(
+                    batched_rewards[replica_id],
+                    [reward[i] for i in range(self.nb_agents)],
+                    rtol=1e-12,
+                )
+                if dones[replica_id]:
+                    env.reset()
+                self.assertEqual(batched_env.date_times[replica_id], env.date_time)
+                self.assertEqual(
+                    batched_env.artificial_ratio[replica_id],
+                    env.power_grid.init_props.artificial_ratio,
+                )
+                self.assertAlmostEqual(
+                    obs["reg_signal"][replica_id, 0],
+                    env.power_grid.current_signal,
+                    places=6,
+                )
+        self.assertEqual(env.episode_count, 4)
+
+    def testEpisodeReset(self):
+        """Tests that replicas are reset independently at the end of their episode"""
+        batched_env = BatchedEnvironment(self.env_props, 3, episode_length=4)
+        batched_env.elapsed_steps[1] = 2
+        actions = np.zeros((3, self.nb_agents), dtype=bool)
+        for _ in range(2):
+            obs, rewards, dones = batched_env.step(actions)
+        self.assertEqual(rewards.shape, (3, self.nb_agents))
+        self.assertEqual(obs["OD_temp"].shape, (3, self.nb_agents))
+        np.testing.assert_array_equal(dones, [False, True, False])
+        np.testing.assert_array_equal(batched_env.elapsed_steps, [2, 0, 2])
+
+    def testInterpolationMatchesEnvironment(self):
+        """Tests that the interpolation base power mode follows the same trajectory as the Environment"""
+        with tempfile.TemporaryDirectory() as directory:
+            self.env_props.power_grid_prop.base_power_props = write_grid(directory)
+            self.env_props.power_grid_prop.base_power_props.interp_nb_agents = 5
+            actions = np.random.default_rng(0).random((30, self.nb_agents)) < 0.5
+
+            random.seed(5)
+            env = Environment(self.env_props)
+            base_powers = []
+            for action in actions:
+                env.step({i: bool(a) for i, a in enumerate(action)})
+                base_powers.append(env.power_grid.base_power)
+
+            random.seed(5)
+            batched_env = BatchedEnvironment(self.env_props, 1)
+            for step, action in enumerate(actions):
+                batched_env.step(action[np.newaxis])
+                self.assertAlmostEqual(
+                    batched_env.base_power[0], base_powers[step], places=6
+                )
@@ -0,0 +1,75 @@
+import os
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.environment.clock import (
+    Clock,
+    calendar_fields,
+    get_calendar_fields,
+    get_day_fields,
+)
+
+
+class TestClock(unittest.TestCase):
+    def testCalendarFields(self):
+        """Tests the calendar fields against the datetime attributes"""
+        rng = np.random.default_rng(0)
+        for seconds in rng.integers(0, 3 * 365 * 86400, 200):
+            date_time = datetime(2020, 1, 1) + timedelta(seconds=int(seconds))
+            fields = calendar_fields(date_time)
+            self.assertEqual(fields.to_datetime(), date_time)
+            self.assertEqual(
+                (fields.year, fields.month, fields.day),
+                (date_time.year, date_time.month, date_time.day),
+            )
+            self.assertEqual(
+                (fields.hour, fields.minute, fields.second),
+                (date_time.hour, date_time.minute, date_time.second),
+            )
+            self.assertEqual(fields.day_of_year, date_time.timetuple().tm_yday)
+            self.assertEqual(
+                fields.seconds_of_day,
+                date_time.hour * 3600 + date_time.minute * 60 + date_time.second,
+            )
+            self.assertEqual(
+                fields.local_time_of_day, time.mktime(date_time.timetuple()) % 86400
+            )
+            self.assertEqual(fields.sin_hr, np.sin(date_time.hour * 2 * np.pi / 24))
+
+    @unittest.skipUnless(hasattr(time, "tzset"), "time.tzset is not available")
+    def testDaylightSavingTime(self):
+        """Tests that the local time of day follows time.mktime around daylight saving time changes"""
+        previous_tz = os.environ.get("TZ")
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        get_calendar_fields.cache_clear()
+        get_day_fields.cache_clear()
+        try:
+            for start in (datetime(2021, 3, 14), datetime(2021, 11, 7)):
+                for step in range(0, 6 * 3600, 300):
+                    date_time = start + timedelta(seconds=step)
+                    self.assertEqual(
+                        calendar_fields(date_time).local_time_of_day,
+                        time.mktime(date_time.timetuple()) % 86400,
+                    )
+        finally:
+            if previous_tz is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = previous_tz
+            time.tzset()
+            get_calendar_fields.cache_clear()
+
+    def testAdvance(self):
+        """Tests that the clock advances by time steps and builds the datetime when asked for"""
+        start = datetime(2021, 12, 31, 23, 59, 58)
+        clock = Clock(start, timedelta(seconds=4))
+        self.assertIs(calendar_fields(clock.fields), clock.fields)
+        clock.advance()
+        self.assertEqual(clock.fields.year, 2022)
+        self.assertEqual(clock.fields.day_of_year, 1)
+        self.assertEqual(clock.date_time, start + timedelta(seconds=4))
+        self.assertIs(clock.date_time, clock.date_time)
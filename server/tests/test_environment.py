@@ -0,0 +1,162 @@
+import random
+import tempfile
+import unittest
+from copy import deepcopy
+
+import numpy as np
+
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import (
+    OBS_COLUMNS,
+    OBS_KEYS,
+    EnvironmentProperties,
+)
+from tests.test_interpolation import write_grid
+
+
+class TestEnvironment(unittest.TestCase):
+    def setUp(self):
+        self.nb_agents = 15
+        self.env_props = EnvironmentProperties()
+        self.env_props.cluster_prop.nb_agents = self.nb_agents
+        random.seed(2)
+        self.env = Environment(self.env_props)
+
+    def testObsArrayMatchesObsDict(self):
+        """Tests that the observation array holds the same values as the observation dictionnaries"""
+        obs_dict = self.env.get_obs()
+        obs_array = self.env.get_obs_array()
+        self.assertEqual(obs_array.shape, (self.nb_agents, len(OBS_KEYS)))
+        for building_id, obs in obs_dict.items():
+            for key in OBS_KEYS:
+                self.assertEqual(obs_array[building_id, OBS_COLUMNS[key]], obs[key])
+
+    def testStepArrays(self):
+        """Tests that step_arrays follows the same trajectory as step"""
+        array_env = deepcopy(self.env)
+        actions = np.random.default_rng(0).random((30, self.nb_agents)) < 0.5
+        for action in actions:
+            state = random.getstate()
+            obs_dict, rewards_dict = self.env.step(
+                {i: bool(a) for i, a in enumerate(action)}
+            )
+            random.setstate(state)
+            obs_array, rewards = array_env.step_arrays(action)
+            np.testing.assert_allclose(rewards, list(rewards_dict.values()), rtol=1e-12)
+            for building_id, obs in obs_dict.items():
+                for key in OBS_KEYS:
+                    self.assertEqual(obs_array[building_id, OBS_COLUMNS[key]], obs[key])
+
+    def testSeed(self):
+        """Tests that a seeded environment does not depend on the random module, and that an unseeded one records its seed"""
+        self.env_props.seed = 8
+        observations = []
+        for global_seed in (1, 2):
+            random.seed(global_seed)
+            env = Environment(self.env_props)
+            env.step({i: True for i in range(self.nb_agents)})
+            env.reset()
+            observations.append(env.get_obs_array())
+        np.testing.assert_array_equal(observations[0], observations[1])
+
+        self.env_props.seed = self.env.seed
+        replayed_env = Environment(self.env_props)
+        np.testing.assert_array_equal(
+            replayed_env.get_obs_array(), self.env.get_obs_array()
+        )
+        self.assertEqual(replayed_env.date_time, self.env.date_time)
+
+    def testPlannedEpisode(self):
+        """Tests that the planned outdoor temperature follows the sinusoidal model, by blocks of plan_horizon steps"""
+        self.env_props.plan_horizon = 10
+        self.env_props.temp_prop.temp_std = 0.0
+        random.seed(2)
+        planned_env = Environment(self.env_props)
+        self.assertEqual(len(planned_env.planner.od_temps), 10)
+        self.assertEqual(len(planned_env.planner.signal_shapes), 10)
+
+        self.env_props.plan_horizon = 0
+        random.seed(2)
+        env = Environment(self.env_props)
+        for _ in range(25):
+            action = {i: False for i in range(self.nb_agents)}
+            planned_obs = planned_env.step(action)[0]
+            obs = env.step(action)[0]
+            self.assertAlmostEqual(planned_obs[0]["OD_temp"], obs[0]["OD_temp"])
+        self.assertEqual(len(planned_env.planner.od_temps), 30)
+
+    def testSnapshotRestore(self):
+        """Tests that restoring a snapshot replays the same trajectory, after steps and after a reset"""
+        self.env_props.plan_horizon = 8
+        for env in (self.env, Environment(self.env_props)):
+            actions = np.random.default_rng(1).random((12, self.nb_agents)) < 0.5
+            env.step_arrays(actions[0])
+            snapshot = env.snapshot()
+            date_time = env.date_time
+            trajectory = [env.step_arrays(action)[0].copy() for action in actions]
+            env.restore(snapshot)
+            for action, expected in zip(actions, trajectory):
+                np.testing.assert_array_equal(env.step_arrays(action)[0], expected)
+
+            env.reset()
+            random_state = random.getstate()
+            env.restore(snapshot)
+            # The random module is not part of the snapshot
+            self.assertEqual(random.getstate(), random_state)
+            random.seed(9)
+            self.assertEqual(env.date_time, date_time)
+            for action, expected in zip(actions, trajectory):
+                np.testing.assert_array_equal(env.step_arrays(action)[0], expected)
+
+    def testPooledReset(self):
+        """Tests that the pooled reset recycles the objects and follows the same trajectories as the constructed ones, over several episodes"""
+        with tempfile.TemporaryDirectory() as directory:
+            self.env_props.power_grid_prop.base_power_props = write_grid(directory)
+            self.env_props.power_grid_prop.base_power_props.interp_nb_agents = 5
+            self.env_props.power_grid_prop.artificial_signal_ratio_range = 2
+            self.env_props.power_grid_prop.signal_properties.mode = "perlin"
+            self.assertEqual(
+                self.env_props.power_grid_prop.base_power_props.mode, "interpolation"
+            )
+            actions = np.random.default_rng(3).random((10, self.nb_agents)) < 0.5
+            for comm_mode in ("neighbours", "random_fixed", "random_sample"):
+                self.env_props.cluster_prop.agents_comm_prop.mode = comm_mode
+                trajectories = []
+                for pooled_reset in (False, True):
+                    self.env_props.pooled_reset = pooled_reset
+                    self.env_props.seed = 4
+                    env = Environment(self.env_props)
+                    buildings = env.cluster.buildings
+                    power_interpolator = env.power_grid.power_interpolator
+                    trajectory = []
+                    for _ in range(4):
+                        trajectory.append(
+                            (
+                                env.get_obs_array().copy(),
+                                env.cluster.agent_communicators,
+                                env.power_grid.init_props.artificial_ratio,
+                            )
+                        )
+                        for action in actions:
+                            obs_array, rewards = env.step_arrays(action)
+                            trajectory.append(
+                                (
+                                    obs_array.copy(),
+                                    rewards.copy(),
+                                    env.power_grid.base_power,
+                                )
+                            )
+                        env.reset()
+                    self.assertEqual(env.cluster.buildings is buildings, pooled_reset)
+                    self.assertEqual(
+                        env.power_grid.power_interpolator is power_interpolator,
+                        pooled_reset,
+                    )
+                    trajectories.append(trajectory)
+                for step, pooled_step in zip(*trajectories):
+                    np.testing.assert_array_equal(pooled_step[0], step[0])
+                    if isinstance(step[1], np.ndarray):
+                        np.testing.assert_array_equal(pooled_step[1], step[1])
+                    else:
+                        self.assertEqual(pooled_step[1], step[1])
+                    self.assertEqual(pooled_step[2], step[2])
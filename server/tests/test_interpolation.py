@@ -0,0 +1,199 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from app.core.environment.environment_properties import BuildingProperties
+from app.core.environment.power_grid.interpolation import (
+    InterpolationCache,
+    PowerInterpolator,
+    load_interpolation_grid,
+)
+from app.core.environment.power_grid.power_grid_properties import (
+    BasePowerProperties,
+)
+from app.utils.utils import sort_dict_keys
+
+PARAMETERS_DICT = {
+    "Ua_ratio": [0.9, 1, 1.1],
+    "Cm_ratio": [0.9, 1, 1.1],
+    "Ca_ratio": [0.9, 1, 1.1],
+    "Hm_ratio": [0.9, 1, 1.1],
+    "air_temp": [-4, -1, 0, 1, 4],
+    "mass_temp": [-4, 0, 4],
+    "OD_temp": [1, 5, 9, 13],
+    "HVAC_power": [10000, 15000],
+    "hour": [0.0, 21600.0, 46800.0, 86399.0],
+    "date": [0, 171, 364],
+}
+
+
+def write_grid(
+    directory: str, parameters_dict: dict = PARAMETERS_DICT, seed: int = 0
+) -> BasePowerProperties:
+    """Write a random Monte Carlo grid with the layout of the real one, and return the matching properties."""
+    base_power_props = BasePowerProperties(
+        mode="interpolation",
+        path_datafile=os.path.join(directory, "grid.npy"),
+        path_parameter_dict=os.path.join(directory, "parameters.json"),
+        path_dict_keys=os.path.join(directory, "keys.csv"),
+    )
+    with open(base_power_props.path_parameter_dict, "w") as json_file:
+        json.dump(parameters_dict, json_file)
+    with open(base_power_props.path_dict_keys, "w") as csv_file:
+        csv.writer(csv_file).writerow(list(parameters_dict.keys()))
+    shape = [len(values) for values in parameters_dict.values()]
+    values = np.random.default_rng(seed).uniform(0, 5000, size=int(np.prod(shape)))
+    np.save(base_power_props.path_datafile, values)
+    return base_power_props
+
+
+class TestPowerInterpolator(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.base_power_props = write_grid(self.directory.name)
+        self.interpolator = PowerInterpolator(
+            self.base_power_props, BuildingProperties()
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testInterpolatePoints(self):
+        """Tests the batch interpolation against the per-point interpolation, inside and outside the grid"""
+        rng = np.random.default_rng(1)
+        lower = np.array([min(values) for values in PARAMETERS_DICT.values()])
+        upper = np.array([max(values) for values in PARAMETERS_DICT.values()])
+        points = rng.uniform(
+            lower - 0.2 * (upper - lower), upper + 0.2 * (upper - lower), (200, 10)
+        )
+        # Points exactly on the grid
+        points[:5] = [
+            [values[i % len(values)] for values in PARAMETERS_DICT.values()]
+            for i in range(5)
+        ]
+
+        expected = []
+        for point in points:
+            point_dict = dict(zip(self.interpolator.dict_keys, point))
+            point_dict = self.interpolator.clip_interpolation_point(point_dict)
+            point_dict = sort_dict_keys(point_dict, self.interpolator.dict_keys)
+            expected.append(self.interpolator.interpolate_grid_fast(point_dict))
+
+        np.testing.assert_allclose(
+            self.interpolator.interpolate_points(points), expected, rtol=1e-10
+        )
+
+    def testGetPoints(self):
+        """Tests the interpolation points built from house properties"""
+        date_time = datetime(2021, 7, 1, 6, 30)
+        points = self.interpolator.get_points(
+            date_time,
+            30.0,
+            Ua=np.array([218.0, 239.8]),
+            Cm=np.array([3450000.0, 3450000.0]),
+            Ca=np.array([908000.0, 908000.0]),
+            Hm=np.array([2840.0, 2840.0]),
+            indoor_temp=np.array([21.0, 19.0]),
+            mass_temp=np.array([20.0, 20.5]),
+            target_temp=np.array([20.0, 20.0]),
+            cooling_capacity=np.array([15000.0, 10000.0]),
+        )
+        self.assertEqual(points.shape, (2, 10))
+        np.testing.assert_allclose(points[1, :8], [1.1, 1, 1, 1, -1, 0.5, 10, 10000])
+        np.testing.assert_allclose(points[:, 8:], [[23400.0, 182]] * 2)
+
+    def testSharedGrid(self):
+        """Tests that the grid is memory-mapped once and reloaded when its files change"""
+        other = PowerInterpolator(self.base_power_props, BuildingProperties())
+        self.assertIs(other.values, self.interpolator.values)
+        self.assertIsInstance(self.interpolator.values.base, np.memmap)
+        self.assertFalse(self.interpolator.values.flags.writeable)
+
+        write_grid(self.directory.name, seed=1)
+        stat = os.stat(self.base_power_props.path_datafile)
+        os.utime(
+            self.base_power_props.path_datafile,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+        )
+        reloaded = load_interpolation_grid(self.base_power_props)
+        self.assertIsNot(reloaded.values, self.interpolator.values)
+        self.assertIs(load_interpolation_grid(self.base_power_props), reloaded)
+
+    def testBuildingTables(self):
+        """Tests the interpolation in the reduced tables of the buildings"""
+        rng = np.random.default_rng(2)
+        nb_buildings = 50
+        default = BuildingProperties()
+        Ua, Cm, Ca, Hm = (
+            getattr(default, key) * rng.uniform(0.85, 1.15, nb_buildings)
+            for key in ("Ua", "Cm", "Ca", "Hm")
+        )
+        cooling_capacity = rng.uniform(8000, 17000, nb_buildings)
+        building_tables = self.interpolator.build_tables(
+            Ua, Cm, Ca, Hm, cooling_capacity
+        )
+        self.assertEqual(building_tables.table_ids.shape, (nb_buildings,))
+        self.assertEqual(building_tables.tables.shape[1:], (5, 3, 4, 4, 3))
+        self.assertLess(building_tables.tables.shape[0], nb_buildings)
+
+        building_ids = rng.integers(0, nb_buildings, 100)
+        points = self.interpolator.get_points(
+            datetime(2021, 7, 1, 13, 30),
+            32.0,
+            Ua[building_ids],
+            Cm[building_ids],
+            Ca[building_ids],
+            Hm[building_ids],
+            rng.uniform(15, 25, 100),
+            rng.uniform(15, 25, 100),
+            np.full(100, 20.0),
+            cooling_capacity[building_ids],
+        )
+        np.testing.assert_array_equal(
+            self.interpolator.interpolate_points(points, building_tables, building_ids),
+            self.interpolator.interpolate_points(points),
+        )
+
+    def testCachedInterpolation(self):
+        """Tests the quantized cache of the interpolator"""
+        self.base_power_props.interp_cache_size = 1000
+        self.base_power_props.interp_cache_resolution = 0.01
+        interpolator = PowerInterpolator(self.base_power_props, BuildingProperties())
+        rng = np.random.default_rng(3)
+        lower = np.array([min(values) for values in PARAMETERS_DICT.values()])
+        upper = np.array([max(values) for values in PARAMETERS_DICT.values()])
+        points = rng.uniform(lower, upper, (100, 10))
+
+        cached = interpolator.interpolate_points_cached(points)
+        self.assertEqual((interpolator.cache.hits, interpolator.cache.misses), (0, 100))
+        np.testing.assert_allclose(
+            cached, interpolator.interpolate_points(points), rtol=0.05
+        )
+        np.testing.assert_array_equal(
+            interpolator.interpolate_points_cached(points), cached
+        )
+        self.assertEqual(interpolator.cache.hit_rate, 0.5)
+
+        # Without cache, the points are interpolated exactly
+        self.assertIsNone(self.interpolator.cache)
+        np.testing.assert_array_equal(
+            self.interpolator.interpolate_points_cached(points),
+            self.interpolator.interpolate_points(points),
+        )
+
+    def testCacheEviction(self):
+        """Tests that the least recently used entries are evicted"""
+        cache = InterpolationCache(2)
+        cache.put((0,), 1.0)
+        cache.put((1,), 2.0)
+        self.assertEqual(cache.get((0,)), 1.0)
+        cache.put((2,), 3.0)
+        self.assertIsNone(cache.get((1,)))
+        self.assertEqual(cache.get((2,)), 3.0)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+import numpy as np
+
+from app.core.environment.cluster.cluster import Cluster
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.power_grid.monte_carlo import (
+    NB_TIME_STEPS_AVG,
+    START_DATE,
+    generate_grid,
+    merge_shards,
+    simulate_combinations,
+)
+from tests.test_interpolation import write_grid
+
+PARAMETERS_DICT = {
+    "Ua_ratio": [0.9, 1.1],
+    "Cm_ratio": [1],
+    "Ca_ratio": [1],
+    "Hm_ratio": [0.9, 1.1],
+    "air_temp": [-1, 0, 2],
+    "mass_temp": [0, 2],
+    "OD_temp": [5, 13],
+    "HVAC_power": [10000, 15000],
+    "hour": [0.0, 46800.0],
+    "date": [0, 171, 364],
+}
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.base_power_props = write_grid(self.directory.name, PARAMETERS_DICT)
+        self.env_props = EnvironmentProperties()
+        self.dict_keys = list(PARAMETERS_DICT.keys())
+        self.nb_time_steps = 50
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def simulate(self, parameters_dict, date_time_ids):
+        return simulate_combinations(
+            parameters_dict,
+            self.dict_keys,
+            date_time_ids,
+            self.env_props.cluster_prop,
+            self.env_props.time_step,
+            self.nb_time_steps,
+        )
+
+    def testSimulateCombinations(self):
+        """Tests that a combination simulated with the others matches the same combination simulated alone"""
+        powers = self.simulate(PARAMETERS_DICT, range(6))
+        self.assertEqual(powers.shape, (6, 96))
+        self.assertTrue(np.all(powers >= 0))
+
+        # Ua_ratio=1.1, Hm_ratio=0.9, air_temp=2, mass_temp=0, OD_temp=13, HVAC_power=10000, hour=46800, date=171
+        single_dict = {key: [values[-1]] for key, values in PARAMETERS_DICT.items()}
+        single_dict.update(
+            Hm_ratio=[0.9], mass_temp=[0], HVAC_power=[10000], date=[171]
+        )
+        house_id = np.ravel_multi_index(
+            (1, 0, 0, 0, 2, 0, 1, 0), (2, 1, 1, 2, 3, 2, 2, 2)
+        )
+        np.testing.assert_allclose(
+            self.simulate(single_dict, [0])[0, 0], powers[4, house_id], rtol=1e-12
+        )
+
+    def simulate_house(self, combination):
+        """Average power of a single bang-bang controlled house simulated with a Cluster, as in the v0 Monte Carlo"""
+        cluster_props = self.env_props.cluster_prop.copy(deep=True)
+        cluster_props.nb_agents = 1
+        house_prop = cluster_props.house_prop
+        house_prop.Ua *= combination["Ua_ratio"]
+        house_prop.Cm *= combination["Cm_ratio"]
+        house_prop.Ca *= combination["Ca_ratio"]
+        house_prop.Hm *= combination["Hm_ratio"]
+        house_prop.init_air_temp = house_prop.target_temp + combination["air_temp"]
+        house_prop.init_mass_temp = house_prop.target_temp + combination["mass_temp"]
+        house_prop.hvac_prop.cooling_capacity = combination["HVAC_power"]
+        house_prop.hvac_prop.lockout_duration = 1
+        od_temp = house_prop.target_temp + combination["OD_temp"]
+        date_time = START_DATE + timedelta(
+            days=combination["date"], seconds=combination["hour"]
+        )
+
+        cluster = Cluster(cluster_props)
+        building = cluster.buildings[0]
+        total_power = 0.0
+        average_power = 0.0
+        for step in range(self.nb_time_steps):
+            # BangBangController: cools when hotter than the target
+            action = building.indoor_temp > building.init_props.target_temp
+            date_time += self.env_props.time_step
+            cluster.step(od_temp, {0: action}, date_time, self.env_props.time_step)
+            total_power += cluster.current_power_consumption
+            if step >= self.nb_time_steps - NB_TIME_STEPS_AVG:
+                average_power += total_power / ((step + 1) * NB_TIME_STEPS_AVG)
+        return average_power
+
+    def testMatchesSingleHouse(self):
+        """Tests the vectorized simulation against single houses simulated with the object path"""
+        powers = self.simulate(PARAMETERS_DICT, range(6))
+        shape = [len(values) for values in PARAMETERS_DICT.values()]
+        # Combinations whose HVAC cycles, and whose power depends on the date and time through the solar gain
+        for grid_ids in (
+            (1, 0, 0, 0, 1, 1, 0, 0, 1, 2),
+            (1, 0, 0, 1, 1, 0, 1, 1, 1, 1),
+            (0, 0, 0, 0, 0, 1, 0, 0, 1, 1),
+        ):
+            combination = {
+                key: values[grid_id]
+                for (key, values), grid_id in zip(PARAMETERS_DICT.items(), grid_ids)
+            }
+            house_id = np.ravel_multi_index(grid_ids[:-2], shape[:-2])
+            date_time_id = np.ravel_multi_index(grid_ids[-2:], shape[-2:])
+            self.assertTrue(
+                np.allclose(
+                    powers[date_time_id, house_id], self.simulate_house(combination)
+                )
+            )
+
+    def testSeed(self):
+        """Tests that a combination gives the same result in any shard"""
+        powers = self.simulate(PARAMETERS_DICT, range(6))
+        np.testing.assert_array_equal(
+            self.simulate(PARAMETERS_DICT, [4, 5]), powers[4:]
+        )
+
+    def testGenerateAndMerge(self):
+        """Tests that the sharded grid is resumable and merges into the flat layout of the interpolator"""
+        output_dir = os.path.join(self.directory.name, "shards")
+        shard_paths = generate_grid(
+            self.base_power_props,
+            self.env_props.cluster_prop,
+            self.env_props.time_step,
+            output_dir,
+            chunk_size=4,
+            nb_workers=2,
+            nb_time_steps=self.nb_time_steps,
+        )
+        self.assertEqual(len(shard_paths), 2)
+
+        # Only the missing shard is simulated again
+        mtime = os.path.getmtime(shard_paths[0])
+        os.remove(shard_paths[1])
+        generate_grid(
+            self.base_power_props,
+            self.env_props.cluster_prop,
+            self.env_props.time_step,
+            output_dir,
+            chunk_size=4,
+            nb_workers=2,
+            nb_time_steps=self.nb_time_steps,
+        )
+        self.assertEqual(os.path.getmtime(shard_paths[0]), mtime)
+        self.assertTrue(os.path.exists(shard_paths[1]))
+
+        merge_shards(self.base_power_props, output_dir, chunk_size=4)
+        merged = np.load(self.base_power_props.path_datafile)
+        expected = self.simulate(PARAMETERS_DICT, range(6)).T.reshape(-1)
+        np.testing.assert_allclose(merged, expected, rtol=1e-12)
@@ -0,0 +1,50 @@
+import random
+import unittest
+
+import numpy as np
+
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.utils.norm import ObservationLayout, norm_state_dict, norm_static_dicts
+
+
+class TestObservationLayout(unittest.TestCase):
+    def setUp(self):
+        self.env_props = EnvironmentProperties()
+        self.env_props.cluster_prop.nb_agents = 12
+
+    def check_layout(self):
+        random.seed(4)
+        env = Environment(self.env_props)
+        layout = ObservationLayout(env.init_props)
+        message_ids = env.cluster.comm_graph.to_matrix()
+        static_dicts = norm_static_dicts(env.get_obs(), env.init_props)
+        for step in range(20):
+            obs_dict = env.step({i: step % 3 != 0 for i in range(12)})[0]
+            expected = np.array(norm_state_dict(obs_dict, env.init_props))
+            # Only the dynamic fields are normalized after the first step
+            np.testing.assert_array_equal(
+                norm_state_dict(obs_dict, env.init_props, static_dicts), expected
+            )
+            normalized = layout.fill(env.get_obs_array(), message_ids, static=step == 0)
+            self.assertEqual(normalized.dtype, np.float32)
+            np.testing.assert_allclose(normalized, expected, rtol=1e-6, atol=1e-6)
+
+    def testDefaultLayout(self):
+        """Tests that the layout matches norm_state_dict with the default properties"""
+        self.check_layout()
+
+    def testFullLayout(self):
+        """Tests that the layout matches norm_state_dict with every optional field"""
+        for state_field in ("hour", "day", "solar_gain", "thermal", "hvac"):
+            setattr(self.env_props.state_prop, state_field, True)
+        self.env_props.cluster_prop.message_prop.thermal = True
+        self.env_props.cluster_prop.message_prop.hvac = True
+        self.check_layout()
+
+    def testWithoutMessages(self):
+        """Tests the layout when no messages are given"""
+        env = Environment(self.env_props)
+        layout = ObservationLayout(env.init_props)
+        normalized = layout.fill(env.get_obs_array())
+        self.assertEqual(normalized.shape, (12, len(layout.columns)))
@@ -0,0 +1,57 @@
+import random
+import unittest
+
+import numpy as np
+
+from app.core.environment.cluster.cluster import Cluster
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.rewards_calculator import RewardsCalculator
+from app.utils.utils import deadbandL2
+
+
+class TestRewardsCalculator(unittest.TestCase):
+    def setUp(self):
+        self.env_props = EnvironmentProperties()
+        self.env_props.cluster_prop.nb_agents = 25
+        random.seed(6)
+        self.cluster = Cluster(self.env_props.cluster_prop)
+        self.cluster.apply_noise()
+        for building in self.cluster.buildings:
+            building.indoor_temp += random.uniform(-3, 3)
+
+    def testPenaltyModes(self):
+        """Tests the vectorized rewards against the per-building penalties of every mode"""
+        for mode in ("individual_L2", "common_L2", "common_max_error", "mixture"):
+            self.env_props.reward_prop.penalty_props.mode = mode
+            calculator = RewardsCalculator(
+                self.env_props.reward_prop, self.env_props.cluster_prop.house_prop
+            )
+            rewards = calculator.compute_rewards(self.cluster.buildings, 3.0e5, 2.5e5)
+
+            norm_temp_penalty = deadbandL2(
+                self.env_props.cluster_prop.house_prop.target_temp,
+                0,
+                self.env_props.cluster_prop.house_prop.target_temp + 1,
+            )
+            norm_sig_penalty = deadbandL2(
+                self.env_props.reward_prop.norm_reg_sig,
+                0,
+                0.75 * self.env_props.reward_prop.norm_reg_sig,
+            )
+            signal_penalty = calculator.reg_signal_penalty(3.0e5, 2.5e5, 25)
+            expected = [
+                -1
+                * (
+                    self.env_props.reward_prop.alpha_temp
+                    * calculator.compute_temp_penalty(
+                        building_id, self.cluster.buildings
+                    )
+                    / norm_temp_penalty
+                    + self.env_props.reward_prop.alpha_sig
+                    * signal_penalty
+                    / norm_sig_penalty
+                )
+                for building_id in range(25)
+            ]
+            self.assertEqual(list(rewards.keys()), list(range(25)))
+            np.testing.assert_allclose(list(rewards.values()), expected, rtol=1e-12)
@@ -0,0 +1,65 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.environment.power_grid.perlin import Perlin
+from app.core.environment.power_grid.power_grid_properties import SignalProperties
+from app.core.environment.power_grid.signal_calculator import SignalCalculator
+
+
+class TestSignalCalculator(unittest.TestCase):
+    def testNoiseArray(self):
+        """Tests the vectorized Perlin noise against the per-value noise"""
+        perlin = Perlin(1, 5, 5, 300, 0.42)
+        x = np.random.default_rng(0).uniform(0, 86400, 300)
+        state = random.getstate()
+        noise = perlin.calculate_noise_array(x)
+        self.assertEqual(random.getstate(), state)
+        np.testing.assert_allclose(
+            noise, [perlin.calculate_noise(value) for value in x], atol=1e-12
+        )
+
+    def testPerlinTable(self):
+        """Tests that the perlin_table mode follows the perlin mode"""
+        perlin_calculator = SignalCalculator(
+            SignalProperties(mode="perlin"), 10, np.random.default_rng(3)
+        )
+        table_calculator = SignalCalculator(
+            SignalProperties(mode="perlin_table"), 10, np.random.default_rng(3)
+        )
+
+        date_time = datetime(2021, 7, 1, 23, 50)
+        for step in range(400):
+            date_time += timedelta(seconds=4)
+            self.assertAlmostEqual(
+                table_calculator.compute_signal(40000, date_time),
+                perlin_calculator.compute_signal(40000, date_time),
+                places=8,
+            )
+
+        # Between the samples of the table, the noise is linearly interpolated
+        table = table_calculator.perlin_table[0]
+        self.assertAlmostEqual(
+            table_calculator.lookup_perlin(4 * 2.25), 0.75 * table[2] + 0.25 * table[3]
+        )
+
+    def testSignalShapes(self):
+        """Tests that the signal computed from the shapes matches the signal computed at each step"""
+        date_times = [
+            datetime(2021, 7, 1, 23, 50) + step * timedelta(seconds=4)
+            for step in range(300)
+        ]
+        for mode in ("flat", "sinusoidals", "regular_steps", "perlin"):
+            calculator = SignalCalculator(
+                SignalProperties(mode=mode), 10, np.random.default_rng(0)
+            )
+            shapes = calculator.get_signal_shapes(date_times)
+            self.assertEqual(shapes.shape, (len(date_times),))
+            for date_time, shape in zip(date_times, shapes):
+                self.assertAlmostEqual(
+                    calculator.apply_signal_shape(40000, shape),
+                    calculator.compute_signal(40000, date_time),
+                    places=6,
+                )
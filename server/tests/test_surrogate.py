@@ -0,0 +1,102 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.core.environment.batched_environment import BatchedEnvironment
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.power_grid.interpolation import (
+    BasePowerInterpolator,
+    PowerInterpolator,
+    load_interpolation_grid,
+)
+from app.core.environment.power_grid.surrogate import (
+    PolynomialSurrogate,
+    accuracy_report,
+)
+from tests.test_interpolation import PARAMETERS_DICT, write_grid
+
+
+class TestPolynomialSurrogate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.base_power_props = write_grid(self.directory.name)
+        self.base_power_props.path_surrogate = os.path.join(
+            self.directory.name, "surrogate.npz"
+        )
+        # Replace the random grid by a quadratic function of the parameters
+        grid = load_interpolation_grid(self.base_power_props)
+        coords = np.meshgrid(
+            *[np.array(values, dtype=float) for values in PARAMETERS_DICT.values()],
+            indexing="ij",
+        )
+        values = (
+            3000
+            + 500 * coords[0] * coords[7] / 10000
+            + 100 * coords[4]
+            - 10 * coords[6] ** 2
+            + 0.01 * coords[8]
+        )
+        np.save(self.base_power_props.path_datafile, values.reshape(-1))
+        self.grid = load_interpolation_grid(self.base_power_props)
+        self.assertIsNot(self.grid, grid)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testFitPolynomial(self):
+        """Tests that a polynomial grid is fitted exactly, and that the surrogate is saved and loaded"""
+        surrogate = PolynomialSurrogate.fit(
+            self.grid, degree=2, ridge=0.0, chunk_size=5000
+        )
+        self.assertEqual(len(surrogate.coefficients), 65)
+        surrogate.save(self.base_power_props.path_surrogate)
+        loaded = PolynomialSurrogate.load(self.base_power_props.path_surrogate)
+        self.assertEqual(loaded.dict_keys, surrogate.dict_keys)
+
+        points = np.random.default_rng(0).uniform(
+            loaded.lower_bounds, loaded.upper_bounds, (100, 10)
+        )
+        expected = (
+            3000
+            + 500 * points[:, 0] * points[:, 7] / 10000
+            + 100 * points[:, 4]
+            - 10 * points[:, 6] ** 2
+            + 0.01 * points[:, 8]
+        )
+        np.testing.assert_allclose(loaded.predict(points), expected, rtol=1e-6)
+
+    def testSurrogateMode(self):
+        """Tests the surrogate base power mode of the environments"""
+        surrogate = PolynomialSurrogate.fit(self.grid, degree=2)
+        surrogate.save(self.base_power_props.path_surrogate)
+        env_props = EnvironmentProperties()
+        env_props.cluster_prop.nb_agents = 10
+        env_props.power_grid_prop.base_power_props = self.base_power_props
+        env_props.power_grid_prop.base_power_props.mode = "surrogate"
+
+        random.seed(1)
+        env = Environment(env_props)
+        random.seed(1)
+        batched_env = BatchedEnvironment(env_props, 1)
+        self.assertAlmostEqual(env.power_grid.base_power, batched_env.base_power[0])
+        self.assertGreater(env.power_grid.base_power, 0)
+
+        # The surrogate interpolator does not hold the Monte Carlo grid
+        interpolator = env.power_grid.power_interpolator
+        self.assertIsInstance(interpolator, BasePowerInterpolator)
+        self.assertNotIsInstance(interpolator, PowerInterpolator)
+        points = np.array([[1.0] * 4 + [0.5, 0.5, 12.0, 12000.0, 3600.0, 10.0]])
+        np.testing.assert_array_equal(
+            interpolator.get_powers(points), surrogate.predict(points)
+        )
+
+        report = accuracy_report(
+            surrogate,
+            PowerInterpolator(self.base_power_props, env_props.cluster_prop.house_prop),
+            nb_points=200,
+        )
+        self.assertLess(report["surrogate_mae"], report["mean_power"])
@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.utils.utils import (
+    compute_solar_gain,
+    get_solar_cooling_load_table,
+    solar_cooling_load,
+)
+
+try:
+    # The v0 utilities need the training dependencies (torch, wandb, ...)
+    from v0.utils import house_solar_gain
+except ImportError:
+    house_solar_gain = None
+
+
+class TestSolarGain(unittest.TestCase):
+    def testSolarCoolingLoadTable(self):
+        """Tests that the tabulated solar gain follows the polynomial regression"""
+        table = get_solar_cooling_load_table()
+        self.assertIs(get_solar_cooling_load_table(), table)
+        self.assertFalse(table.flags.writeable)
+        for date_time in (
+            datetime(2021, 1, 1, 7, 29),
+            datetime(2021, 3, 1, 12, 0, 59),
+            datetime(2020, 2, 29, 13, 45),
+            datetime(2021, 7, 14, 17, 30),
+            datetime(2021, 12, 31, 17, 31),
+        ):
+            x = date_time.hour + date_time.minute / 60 - 7.5
+            y = date_time.month + date_time.day / 30 - 1
+            self.assertAlmostEqual(
+                compute_solar_gain(date_time, 7.175, 0.67),
+                7.175 * 0.67 * float(solar_cooling_load(x, y)),
+                places=8,
+            )
+
+    def testArraySolarGain(self):
+        """Tests the solar gain of several houses at once"""
+        window_area = np.array([5.0, 7.175, 10.0])
+        shading_coeff = np.array([0.5, 0.67, 1.0])
+        date_time = datetime(2021, 7, 1, 12, 30)
+        np.testing.assert_allclose(
+            compute_solar_gain(date_time, window_area, shading_coeff),
+            [
+                compute_solar_gain(date_time, a, s)
+                for a, s in zip(window_area, shading_coeff)
+            ],
+        )
+
+    @unittest.skipIf(house_solar_gain is None, "v0 dependencies are not installed")
+    def testMatchesV0SolarGain(self):
+        """Tests that the tabulated solar gain matches the v0 regression used by the MPC controller before"""
+        for day in range(0, 366, 5):
+            for minute in range(0, 24 * 60, 13):
+                date_time = datetime(2020, 1, 1) + timedelta(days=day, minutes=minute)
+                for window_area, shading_coeff in (
+                    (7.175, 0.67),
+                    (3.0, 0.5),
+                    (12.0, 1.0),
+                ):
+                    self.assertAlmostEqual(
+                        compute_solar_gain(date_time, window_area, shading_coeff),
+                        house_solar_gain(date_time, window_area, shading_coeff),
+                        places=8,
+                    )
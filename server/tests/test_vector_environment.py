@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from app.core.environment.environment import Environment
+from app.core.environment.environment_properties import EnvironmentProperties
+from app.core.environment.vector_environment import SubprocVectorEnvironment
+
+
+class TestSubprocVectorEnvironment(unittest.TestCase):
+    def setUp(self):
+        self.nb_agents = 10
+        self.env_props = EnvironmentProperties()
+        self.env_props.cluster_prop.nb_agents = self.nb_agents
+        self.actions = np.random.default_rng(0).random((20, 4, self.nb_agents)) < 0.5
+
+    def run_steps(self, vector_env):
+        vector_env.reset()
+        trajectory = []
+        for actions in self.actions:
+            vector_env.step_async(actions)
+            obs, rewards, dones = vector_env.step_wait()
+            trajectory.append((obs["indoor_temp"], rewards, dones))
+        return trajectory
+
+    def testMatchesEnvironment(self):
+        """Tests that a single worker reproduces an Environment with the same seed and id"""
+        env_props = self.env_props.copy(deep=True)
+        env_props.seed = 3
+        env = Environment(env_props, env_id=0)
+        env.reset()
+        rewards = []
+        for actions in self.actions[:, 0]:
+            _, reward = env.step({i: bool(a) for i, a in enumerate(actions)})
+            rewards.append(list(reward.values()))
+
+        # The seed of the properties is used when none is given
+        with SubprocVectorEnvironment(env_props, 1) as vector_env:
+            trajectory = self.run_steps(vector_env)
+        np.testing.assert_allclose(
+            [vector_rewards[0] for _, vector_rewards, _ in trajectory],
+            rewards,
+            rtol=1e-12,
+        )
+
+    def testDeterministicSeeding(self):
+        """Tests that runs with the same seed and number of workers are identical, and that episodes end"""
+        trajectories = []
+        for _ in range(2):
+            with SubprocVectorEnvironment(
+                self.env_props, 4, nb_workers=2, seed=7, episode_length=8
+            ) as vector_env:
+                trajectories.append(self.run_steps(vector_env))
+        for step, (first, second) in enumerate(zip(*trajectories)):
+            for first_array, second_array in zip(first, second):
+                np.testing.assert_array_equal(first_array, second_array)
+            self.assertEqual(first[2].all(), (step + 1) % 8 == 0)
+        # Environments of different workers are seeded differently
+        self.assertFalse(np.array_equal(first[0][0], first[0][2]))
+
+    def testIndependentOfWorkers(self):
+        """Tests that runs with the same seed are identical whatever the number of workers"""
+        trajectories = []
+        for nb_workers in (1, 2):
+            with SubprocVectorEnvironment(
+                self.env_props, 4, nb_workers=nb_workers, seed=5, episode_length=8
+            ) as vector_env:
+                trajectories.append(self.run_steps(vector_env))
+        for first, second in zip(*trajectories):
+            for first_array, second_array in zip(first, second):
+                np.testing.assert_array_equal(first_array, second_array)
+
+    def testWorkerError(self):
+        """Tests that an environment which cannot be built raises in the main process"""
+        base_power_props = self.env_props.power_grid_prop.base_power_props
+        base_power_props.mode = "interpolation"
+        base_power_props.path_datafile = "missing.npy"
+        with self.assertRaises(RuntimeError) as context:
+            SubprocVectorEnvironment(self.env_props, 2, nb_workers=2, seed=0)
+        self.assertIn("missing.npy", str(context.exception))
@@ -0,0 +1,186 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.environment.cluster.cluster import PARAM_KEYS, Cluster
+from app.core.environment.cluster.vectorized_cluster import VectorizedCluster
+from app.core.environment.environment_properties import ClusterPropreties
+
+
+class TestVectorizedCluster(unittest.TestCase):
+    def setUp(self):
+        self.nb_agents = 30
+        self.cluster_props = ClusterPropreties(nb_agents=self.nb_agents)
+        self.cluster_props.message_prop.thermal = True
+        self.cluster_props.message_prop.hvac = True
+        self.time_step = timedelta(seconds=4)
+        self.date_time = datetime(2021, 7, 1, 8, 0, 0)
+
+        random.seed(1)
+        self.cluster = Cluster(self.cluster_props)
+        self.cluster.apply_noise()
+        random.seed(1)
+        self.vectorized_cluster = VectorizedCluster(self.cluster_props)
+        self.vectorized_cluster.apply_noise()
+
+    def testSameNoise(self):
+        """Tests that both backends draw the same building properties"""
+        for building_id, building in enumerate(self.cluster.buildings):
+            self.assertEqual(
+                building.init_props.Ua, self.vectorized_cluster.Ua[building_id]
+            )
+            self.assertEqual(
+                building.init_props.target_temp,
+                self.vectorized_cluster.target_temp[building_id],
+            )
+            self.assertEqual(
+                building.hvac.init_props.cooling_capacity,
+                self.vectorized_cluster.cooling_capacity[building_id],
+            )
+
+    def testIdenticalTrajectories(self):
+        """Tests that both backends produce the same observations"""
+        rng = np.random.default_rng(0)
+        date_time = self.date_time
+        for step in range(200):
+            date_time += self.time_step
+            actions = rng.random(self.nb_agents) < 0.4
+            action_dict = {i: bool(action) for i, action in enumerate(actions)}
+            od_temp = 25.0 + 0.01 * step
+            obs = self.cluster.step(od_temp, action_dict, date_time, self.time_step)
+            vectorized_obs = self.vectorized_cluster.step(
+                od_temp, action_dict, date_time, self.time_step
+            )
+            self.assertEqual(obs, vectorized_obs)
+            self.assertEqual(
+                self.cluster.current_power_consumption,
+                self.vectorized_cluster.current_power_consumption,
+            )
+
+    def testThermalCoefficientsCache(self):
+        """Tests that the thermal coefficients are cached and follow the building properties"""
+        building = self.cluster.buildings[0]
+        coeffs = building.get_thermal_coefficients(self.time_step)
+        self.assertIs(building.get_thermal_coefficients(self.time_step), coeffs)
+
+        building.init_props.Ua *= 2
+        self.assertIsNot(building.get_thermal_coefficients(self.time_step), coeffs)
+        self.assertNotEqual(
+            building.get_thermal_coefficients(timedelta(seconds=8)).time_step_sec,
+            coeffs.time_step_sec,
+        )
+
+        # Building 0 was modified above, the others match the vectorized backend
+        stacked = self.cluster.get_thermal_coefficients(self.time_step)
+        vectorized = self.vectorized_cluster.get_thermal_coefficients(self.time_step)
+        self.assertEqual(stacked.exp_r1.shape, (self.nb_agents,))
+        np.testing.assert_array_equal(stacked.exp_r1[1:], vectorized.exp_r1[1:])
+        np.testing.assert_array_equal(stacked.A4[1:], vectorized.A4[1:])
+
+    def testThermalCoefficientsBuiltWithProperties(self):
+        """Tests that the thermal coefficients are built when the properties are set, if the time step is known"""
+        cluster = Cluster(self.cluster_props, time_step=self.time_step)
+        vectorized_cluster = VectorizedCluster(
+            self.cluster_props, time_step=self.time_step
+        )
+        for step in ("reset", "apply_noise"):
+            getattr(cluster, step)()
+            getattr(vectorized_cluster, step)()
+            for building in cluster.buildings:
+                self.assertTrue(
+                    building.thermal_coeffs.matches(
+                        building.init_props.Ua,
+                        building.init_props.Ca,
+                        building.init_props.Cm,
+                        building.init_props.Hm,
+                        self.time_step.seconds,
+                    )
+                )
+            coeffs = vectorized_cluster.thermal_coeffs
+            self.assertEqual(coeffs.time_step_sec, self.time_step.seconds)
+            np.testing.assert_array_equal(coeffs.Ua, vectorized_cluster.Ua)
+            np.testing.assert_array_equal(coeffs.Hm, vectorized_cluster.Hm)
+
+        # Without a time step, the coefficients are built at the first step
+        self.assertIsNone(self.cluster.buildings[0].thermal_coeffs)
+        self.assertIsNone(self.vectorized_cluster.thermal_coeffs)
+
+    def testStateSpaceModel(self):
+        """Tests the state-space thermal model against the GridLAB-D formulas"""
+        state_space_props = self.cluster_props.copy(deep=True)
+        state_space_props.thermal_model = "state_space"
+        random.seed(1)
+        state_space_cluster = VectorizedCluster(state_space_props)
+        state_space_cluster.apply_noise()
+
+        rng = np.random.default_rng(0)
+        date_time = self.date_time
+        for step in range(500):
+            date_time += self.time_step
+            actions = rng.random(self.nb_agents) < 0.4
+            od_temp = 25.0 + 0.01 * step
+            self.vectorized_cluster.step(od_temp, actions, date_time, self.time_step)
+            state_space_cluster.step(od_temp, actions, date_time, self.time_step)
+        np.testing.assert_allclose(
+            state_space_cluster.indoor_temp,
+            self.vectorized_cluster.indoor_temp,
+            atol=1e-8,
+        )
+        np.testing.assert_allclose(
+            state_space_cluster.mass_temp, self.vectorized_cluster.mass_temp, atol=1e-8
+        )
+
+    def testBatchedNoise(self):
+        """Tests that the bulk noise draws the same properties in both backends, within the noise bounds"""
+        random.seed(2)
+        cluster = Cluster(self.cluster_props)
+        cluster.apply_noise()
+        random.seed(2)
+        vectorized_cluster = VectorizedCluster(self.cluster_props)
+        vectorized_cluster.apply_noise()
+
+        params = cluster.get_params()
+        for column, key in enumerate(PARAM_KEYS):
+            np.testing.assert_array_equal(
+                params[:, column], getattr(vectorized_cluster, key)
+            )
+        house_prop = self.cluster_props.house_prop
+        noise_prop = house_prop.noise_prop
+        self.assertTrue(
+            np.all(vectorized_cluster.target_temp >= house_prop.target_temp)
+        )
+        self.assertTrue(np.all(vectorized_cluster.Ua >= noise_prop.factor_thermo_low))
+        self.assertTrue(np.all(vectorized_cluster.Ua <= noise_prop.factor_thermo_high))
+        self.assertTrue(
+            set(vectorized_cluster.cooling_capacity).issubset(
+                house_prop.hvac_prop.noise_prop.cooling_capacity_list
+            )
+        )
+        # The static observations of the buildings follow their new properties
+        building = cluster.buildings[0]
+        self.assertEqual(building.static_obs["Cm"], params[0, PARAM_KEYS.index("Cm")])
+
+    def testNoiseBoundsOnOneSide(self):
+        """Tests that the thermal factors stay within bounds which do not contain 1"""
+        for low, high in ((1.2, 1.5), (0.5, 0.8), (0.8, 0.5)):
+            cluster_props = self.cluster_props.copy(deep=True)
+            cluster_props.house_prop.noise_prop.factor_thermo_low = low
+            cluster_props.house_prop.noise_prop.factor_thermo_high = high
+            vectorized_cluster = VectorizedCluster(cluster_props)
+            vectorized_cluster.apply_noise()
+            self.assertTrue(np.all(vectorized_cluster.Ua >= min(low, high)))
+            self.assertTrue(np.all(vectorized_cluster.Ua <= max(low, high)))
+
+    def testBatchedNoiseReplicas(self):
+        """Tests that the noise of some replicas leaves the other replicas unchanged"""
+        vectorized_cluster = VectorizedCluster(self.cluster_props, nb_replicas=3)
+        vectorized_cluster.apply_noise()
+        target_temp = vectorized_cluster.target_temp.copy()
+        vectorized_cluster.reset_buildings([0, 2])
+        vectorized_cluster.apply_noise([0, 2])
+        np.testing.assert_array_equal(vectorized_cluster.target_temp[1], target_temp[1])
+        self.assertFalse(
+            np.array_equal(vectorized_cluster.target_temp[0], target_temp[0])
+        )